@@ -7,8 +7,17 @@ It handles user authentication, registration, and profile management operations.
 
 # Authors: Joshua, Rich, , , , ,
 
-from flask import Flask, jsonify, request, session
-from flask_mail import Mail, Message
+from flask import (
+    Flask,
+    Request,
+    jsonify,
+    request,
+    session,
+    g,
+    has_app_context,
+    Response,
+    stream_with_context,
+)
 from flask_cors import CORS
 from flask_login import (
     LoginManager,
@@ -22,24 +31,107 @@ from twilio.rest import Client
 from twilio.base.exceptions import TwilioRestException
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename  #
+from werkzeug.exceptions import BadRequest
 import os
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2 import extensions
+from psycopg2.extras import RealDictCursor, Json
+import hashlib
+import hmac
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+import time
 import boto3
-import mimetypes
-import uuid
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config as BotoConfig
 import requests
-from datetime import datetime
+from datetime import date, datetime
 from dotenv import load_dotenv
 import stripe
 from decimal import Decimal
 from functools import wraps
+from db_pool import ConnectionPool, pool_settings_from_env
+from user_cache import user_cache_from_env
+from reviews_cache import reviews_cache_from_env
+from s3_cleanup import delete_keys
+from s3_uploads import (
+    BLOB_CACHE_CONTROL,
+    BLOB_PREFIX,
+    SHA256_PATTERN,
+    InvalidUpload,
+    blob_key,
+    blob_sha256,
+    claim_blob,
+    content_type_for,
+    direct_uploads_from_env,
+    sniff_upload,
+)
+from outbound import configure_stripe, outbound_stats, twilio_http_client, upstream_session
+from mail_queue import enqueue_mail, mail_sender_from_env
+from media_variants import media_variant_worker_from_env
+from notification_stream import (
+    MISSED_ROWS_SQL,
+    NOTIFICATION_COLUMNS,
+    REPLAY_LOOKBACK,
+    notification_hub_from_env,
+)
+from sms_dispatch import (
+    TEMPLATE_FIELDS,
+    InvalidTemplate,
+    check_template,
+    render_template,
+    sms_dispatcher_from_env,
+)
+from pagination import MAX_PAGE_LIMIT, InvalidPageRequest, keyset_after, page_params, paginate
+from json_pages import PG_JSON_RESPONSES, json_page, render_json
+from exports import EXPORT_DATASETS, EXPORT_FORMATS, stream_export
+from query_stats import (
+    InstrumentedConnection,
+    QueryStats,
+    RouteQueryAggregates,
+    log_slow_queries,
+    server_timing_header,
+    set_statement_observer,
+)
+from metrics import (
+    observe_request,
+    observe_sql_statement,
+    render_metrics,
+    track_dependency,
+)
 
 load_dotenv()
 
 
+MB = 1024 * 1024
+UPLOAD_SPOOL_BYTES = int(os.getenv("UPLOAD_SPOOL_BYTES", 1 * MB))
+
+
+class HashingSpooledFile(tempfile.SpooledTemporaryFile):
+    """Spooled temp file that SHA-256s the upload as Werkzeug writes it"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data):
+        self.sha256.update(data)
+        self.size += len(data)
+        return super().write(data)
+
+
+class UploadRequest(Request):
+    """Keeps each uploaded file in memory up to UPLOAD_SPOOL_BYTES, then spills it to a temp file"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return HashingSpooledFile(max_size=UPLOAD_SPOOL_BYTES, mode="rb+")
+
+
 # Initialize Flask application
 app = Flask(__name__)
+app.request_class = UploadRequest
 
 # CONFIGURATION SETTINGS
 
@@ -61,6 +153,8 @@ app.config["SESSION_COOKIE_HTTPONLY"] = (
     True  # Prevents JavaScript from accessing cookies
 )
 app.config["SESSION_COOKIE_SAMESITE"] = "Lax"  # Provides CSRF protection
+# Larger request bodies get a 413 before any of them is read
+app.config["MAX_CONTENT_LENGTH"] = int(os.getenv("MAX_UPLOAD_BYTES", 25 * MB))
 
 # CORS Configuration for React frontend
 CORS(app, supports_credentials=True, origins=["http://localhost:5173"])
@@ -70,6 +164,7 @@ AWS_ACCESS_KEY = os.getenv("AWS_ACCESS_KEY", "paste-here")
 AWS_SECRET_KEY = os.getenv("AWS_SECRET_KEY", "paste-here")
 AWS_REGION = os.getenv("AWS_REGION", "paste-here")
 S3_BUCKET_NAME = os.getenv("S3_BUCKET_NAME", "paste-here")
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")  # Only set to point at a local S3 stand-in
 
 
 s3_client = boto3.client(
@@ -77,14 +172,131 @@ s3_client = boto3.client(
     aws_access_key_id=AWS_ACCESS_KEY,
     aws_secret_access_key=AWS_SECRET_KEY,
     region_name=AWS_REGION,
+    endpoint_url=S3_ENDPOINT_URL or None,
+    # Local stand-ins don't resolve bucket subdomains
+    config=BotoConfig(s3={"addressing_style": "path"}) if S3_ENDPOINT_URL else None,
+)
+# Files above the threshold go up as parallel multipart chunks. Each in-flight
+# chunk is buffered, so chunk size * concurrency bounds the memory per upload.
+s3_transfer_config = TransferConfig(
+    multipart_threshold=int(os.getenv("S3_MULTIPART_THRESHOLD_MB", "16")) * MB,
+    multipart_chunksize=int(os.getenv("S3_MULTIPART_CHUNK_MB", "8")) * MB,
+    max_concurrency=int(os.getenv("S3_MAX_CONCURRENCY", "4")),
 )
+direct_uploads = direct_uploads_from_env(s3_client, S3_BUCKET_NAME)
+
+
+def s3_object_url(key):
+    """Public URL for an object in the uploads bucket"""
+    if S3_ENDPOINT_URL:
+        return f"{S3_ENDPOINT_URL.rstrip('/')}/{S3_BUCKET_NAME}/{key}"
+    return f"https://{S3_BUCKET_NAME}.s3.{AWS_REGION}.amazonaws.com/{key}"
+
+
+def s3_key_from_url(file_url):
+    return file_url.split(s3_object_url(""))[-1]
+
+
+def media_object_urls(row):
+    """The original plus every rendered variant of one media row"""
+    variants = row.get("variants") or {}
+    return [row["file_url"], row.get("thumbnail_url")] + [
+        w["url"] for w in variants.get("widths", [])
+    ]
+
+
+def delete_s3_objects(urls):
+    """Deletes our objects behind urls after a commit; failures are left to s3_cleanup.py"""
+    prefix = s3_object_url("")
+    keys = [s3_key_from_url(url) for url in urls if url and url.startswith(prefix)]
+    # Blobs are shared; s3_cleanup.py removes them once nothing references them
+    keys = [key for key in keys if not key.startswith(BLOB_PREFIX)]
+    if not keys:
+        return 0
+    try:
+        deleted, errors = delete_keys(s3_client, S3_BUCKET_NAME, keys)
+    except Exception as e:
+        app.logger.warning(f"Could not delete {len(keys)} S3 objects: {e}")
+        return 0
+    for key, error in errors:
+        app.logger.warning(f"Could not delete S3 object {key}: {error}")
+    return deleted
+
+
+def store_upload(cursor, file, content_type):
+    """Stores a multipart upload as a content-addressed blob on the caller's transaction; returns its URL
+
+    The PUT is skipped when the blob already exists. The blob's row stays
+    locked until the caller commits or rolls back.
+    """
+    sha256 = file.stream.sha256.hexdigest()  # computed while the upload was spooled
+    key = blob_key(sha256, content_type)
+    file_url = s3_object_url(key)
+    if claim_blob(cursor, sha256, file_url, content_type, file.stream.size):
+        file.stream.seek(0)
+        with track_dependency("s3", "upload_fileobj"):
+            s3_client.upload_fileobj(
+                file.stream,
+                S3_BUCKET_NAME,
+                key,
+                ExtraArgs={
+                    "CacheControl": BLOB_CACHE_CONTROL,
+                    "ContentType": content_type,
+                    "ACL": "public-read",
+                },
+                Config=s3_transfer_config,
+            )
+    return file_url
+
+
+# The old URL comes back so the replaced object can be deleted after commit
+REPLACE_VEHICLE_IMAGE_SQL = """
+    UPDATE vehicles v SET vehicle_image_url = %s
+    FROM (
+        SELECT vehicle_id, vehicle_image_url FROM vehicles
+        WHERE vehicle_id = %s AND user_id = %s
+        FOR UPDATE
+    ) old
+    WHERE v.vehicle_id = old.vehicle_id
+    RETURNING v.vehicle_id, old.vehicle_image_url AS old_url
+"""
+
+REPLACE_PROFILE_PICTURE_SQL = """
+    UPDATE users u SET profile_picture_url = %s
+    FROM (
+        SELECT user_id, profile_picture_url FROM users WHERE user_id = %s FOR UPDATE
+    ) old
+    WHERE u.user_id = old.user_id
+    RETURNING u.profile_picture_url, old.profile_picture_url AS old_url
+"""
 
 # Stripe
 stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
+stripe.api_base = os.getenv("STRIPE_API_BASE", stripe.api_base)
+configure_stripe(stripe)  # Pooled session, timeouts and circuit breaker from outbound.py
 STRIPE_WEBHOOK_SECRET = os.getenv(
     "STRIPE_WEBHOOK_SECRET"
 )  # For webhook verification later need to pull this from stripe cli tool
 
+# Other external services (overridable so benchmarks can use local stand-ins)
+GOOGLE_PLACES_DETAILS_URL = os.getenv(
+    "GOOGLE_PLACES_DETAILS_URL",
+    "https://maps.googleapis.com/maps/api/place/details/json",
+)
+HCAPTCHA_VERIFY_URL = os.getenv(
+    "HCAPTCHA_VERIFY_URL", "https://api.hcaptcha.com/siteverify"
+)
+TWILIO_API_BASE = os.getenv("TWILIO_API_BASE")  # Defaults to https://api.twilio.com
+TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID")
+TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
+TWILIO_PHONE_NUMBER = os.getenv("TWILIO_PHONE_NUMBER")
+MAIL_SERVER = os.getenv("MAIL_SERVER", "smtp.gmail.com")
+MAIL_PORT = int(os.getenv("MAIL_PORT", "587"))
+MAIL_USE_TLS = os.getenv("MAIL_USE_TLS", "true").lower() == "true"
+MAIL_USERNAME = os.getenv("MAIL_USERNAME")
+MAIL_PASSWORD = os.getenv("MAIL_PASSWORD")
+MAIL_RECIPIENT = os.getenv("MAIL_RECIPIENT")
+
 # LOGIN MANAGEMENT
 # Initialize Flask-Login
 login_manager = LoginManager()
@@ -92,8 +304,8 @@ login_manager.init_app(app)
 
 
 # DATABASE CONNECTION
-def get_db_connection():
-    """Establishes and returns a connection to the PostgreSQL database"""
+def open_db_connection():
+    """Opens a new, unpooled connection to the PostgreSQL database"""
     return psycopg2.connect(
         dbname=DB_NAME,
         user=DB_USER,
@@ -101,9 +313,112 @@ def get_db_connection():
         host=DB_HOST,
         port=DB_PORT,
         cursor_factory=RealDictCursor,  # Returns results as dictionaries
+        connection_factory=InstrumentedConnection,  # Times every statement
     )
 
 
+_db_pool = None
+_db_pool_pid = None
+_db_pool_lock = threading.Lock()
+
+
+def get_db_pool():
+    """Returns this worker process's connection pool, creating it on first use"""
+    global _db_pool, _db_pool_pid
+    # Pools must not be shared across a gunicorn fork, so key them by pid
+    if _db_pool is None or _db_pool_pid != os.getpid():
+        with _db_pool_lock:
+            if _db_pool is None or _db_pool_pid != os.getpid():
+                _db_pool = ConnectionPool(open_db_connection, **pool_settings_from_env())
+                _db_pool_pid = os.getpid()
+    return _db_pool
+
+
+class RequestConnection:
+    """Request-scoped handle on a pooled connection; the real release happens on teardown"""
+
+    def __init__(self, conn):
+        object.__setattr__(self, "_conn", conn)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._conn, name, value)
+
+    def close(self):
+        # Like psycopg2's close(), drop uncommitted work, but keep the connection
+        # borrowed so later code in the same request can reuse it
+        conn = self._conn
+        if (
+            not conn.closed
+            and conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE
+        ):
+            conn.rollback()
+
+
+def get_db_connection():
+    """Returns the current request's pooled connection to the PostgreSQL database"""
+    if not has_app_context():
+        return open_db_connection()
+    if "db_conn" not in g:
+        g.db_conn = RequestConnection(get_db_pool().getconn())
+        g.db_conn.recorder = request_query_stats()
+    return g.db_conn
+
+
+def request_query_stats():
+    """Returns the statement counters for the current request"""
+    if "query_stats" not in g:
+        g.query_stats = QueryStats()
+    return g.query_stats
+
+
+@app.teardown_appcontext
+def release_db_connection(exception=None):
+    """Rolls back anything uncommitted and returns the request's connection to the pool"""
+    conn = g.pop("db_conn", None)
+    if conn is None:
+        return
+    broken = isinstance(exception, (psycopg2.OperationalError, psycopg2.InterfaceError))
+    conn.recorder = None
+    get_db_pool().putconn(conn._conn, discard=broken)
+
+
+# QUERY INSTRUMENTATION
+route_query_stats = RouteQueryAggregates()
+set_statement_observer(observe_sql_statement)  # Postgres timings for /metrics
+
+
+@app.errorhandler(413)
+def request_too_large(e):
+    limit = app.config["MAX_CONTENT_LENGTH"] // MB
+    return jsonify({"status": "error", "message": f"Upload is larger than {limit}MB"}), 413
+
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def record_request_queries(response):
+    """Adds Server-Timing, logs slow statements and updates the per-route aggregates"""
+    started = g.get("request_started")
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    stats = request_query_stats()
+    endpoint = request.endpoint or "unmatched"
+
+    response.headers["Server-Timing"] = server_timing_header(stats, elapsed)
+    route_query_stats.add(endpoint, stats, elapsed)
+    observe_request(endpoint, request.method, response.status_code, elapsed)
+    if stats.slow:
+        log_slow_queries(endpoint, request.method, request.path, stats)
+    return response
+
+
 # USER MODEL
 
 
@@ -130,9 +445,18 @@ class User(UserMixin):
         self.isAdmin = isAdmin
 
 
+user_cache = user_cache_from_env(open_db_connection)
+
+
 @login_manager.user_loader
 def load_user(user_id):
-    """Loads a user from the database based on user_id"""
+    """Loads a user from the cache, falling back to the database on a miss"""
+    cached = user_cache.get(user_id)
+    if cached is not None:
+        return cached
+
+    # Taken before the read, so an invalidation that lands in between isn't overwritten
+    generation = user_cache.generation()
     conn = get_db_connection()
     cursor = conn.cursor()
     cursor.execute(
@@ -143,7 +467,9 @@ def load_user(user_id):
     conn.close()
 
     if user_data:
-        return User(user_data["user_id"], user_data["email"], user_data["is_admin"])
+        user = User(user_data["user_id"], user_data["email"], user_data["is_admin"])
+        user_cache.set(user_id, user, generation)
+        return user
     return None
 
 
@@ -173,6 +499,83 @@ def test_db():
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
+@app.route("/api/db-pool-stats", methods=["GET"])
+@login_required
+@admin_required
+def db_pool_stats():
+    """Returns connection pool size, saturation and recycle counters for this worker"""
+    return (
+        jsonify({"status": "success", "pid": os.getpid(), "pool": get_db_pool().stats()}),
+        200,
+    )
+
+
+@app.route("/api/query-stats", methods=["GET"])
+@login_required
+@admin_required
+def query_stats():
+    """Returns per-route statement counts and DB time for this worker"""
+    return (
+        jsonify(
+            {"status": "success", "pid": os.getpid(), "routes": route_query_stats.snapshot()}
+        ),
+        200,
+    )
+
+
+@app.route("/api/user-cache-stats", methods=["GET"])
+@login_required
+@admin_required
+def user_cache_stats():
+    """Returns load_user cache hit, miss and eviction counters for this worker"""
+    return (
+        jsonify({"status": "success", "pid": os.getpid(), "cache": user_cache.stats()}),
+        200,
+    )
+
+
+@app.route("/api/reviews-cache-stats", methods=["GET"])
+@login_required
+@admin_required
+def reviews_cache_stats():
+    """Returns reviews cache hit, stale and refresh counters for this worker"""
+    return (
+        jsonify({"status": "success", "pid": os.getpid(), "cache": reviews_cache.stats()}),
+        200,
+    )
+
+
+@app.route("/api/outbound-stats", methods=["GET"])
+@login_required
+@admin_required
+def outbound_client_stats():
+    """Returns connection pool usage and circuit breaker state per upstream for this worker"""
+    return (
+        jsonify({"status": "success", "pid": os.getpid(), "upstreams": outbound_stats()}),
+        200,
+    )
+
+
+# Bearer token the Prometheus scrape job sends; /metrics is off until it is set
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    """Prometheus scrape endpoint: request and dependency latency histograms"""
+    if not METRICS_TOKEN:
+        return jsonify({"status": "error", "message": "Not found"}), 404
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.encode(), METRICS_TOKEN.encode()):
+        return (
+            jsonify({"status": "error", "message": "Unauthorized"}),
+            401,
+            {"WWW-Authenticate": 'Bearer realm="metrics"'},
+        )
+    body, content_type = render_metrics()
+    return Response(body, content_type=content_type)
+
+
 # API ROUTES - AUTHENTICATION
 
 
@@ -229,6 +632,36 @@ def logout():
     return jsonify({"status": "success"}), 200
 
 
+def user_section(cursor, args):
+    """The current user's details, as /api/user returns them"""
+    # Fetch is_admin along with other details
+    cursor.execute(
+        "SELECT first_name, last_name, profile_picture_url, is_admin FROM users WHERE user_id = %s",
+        (current_user.id,),
+    )
+    user_details = cursor.fetchone() or {}
+    first_name = user_details.get("first_name", "")
+    last_name = user_details.get("last_name", "")
+    profile_photo = user_details.get("profile_picture_url", "")
+    # Get the is_admin status from the database fetch
+    is_admin = user_details.get("is_admin", False)
+
+    name = (
+        f"{first_name} {last_name}".strip()
+        if (first_name or last_name)
+        else current_user.email
+    )
+    return {
+        "id": current_user.id,
+        "email": current_user.email,
+        "first_name": first_name,
+        "last_name": last_name,
+        "name": name,
+        "profile_picture_url": profile_photo,
+        "is_admin": is_admin,  # Include is_admin in the response
+    }
+
+
 @app.route("/api/user", methods=["GET"])
 @login_required
 def get_user():
@@ -236,37 +669,7 @@ def get_user():
     conn = get_db_connection()
     cursor = conn.cursor()
     try:
-        # Fetch is_admin along with other details
-        cursor.execute(
-            "SELECT first_name, last_name, profile_picture_url, is_admin FROM users WHERE user_id = %s",
-            (current_user.id,),
-        )
-        user_details = cursor.fetchone() or {}
-        first_name = user_details.get("first_name", "")
-        last_name = user_details.get("last_name", "")
-        profile_photo = user_details.get("profile_picture_url", "")
-        # Get the is_admin status from the database fetch
-        is_admin = user_details.get("is_admin", False)
-
-        name = (
-            f"{first_name} {last_name}".strip()
-            if (first_name or last_name)
-            else current_user.email
-        )
-        return (
-            jsonify(
-                {
-                    "id": current_user.id,
-                    "email": current_user.email,
-                    "first_name": first_name,
-                    "last_name": last_name,
-                    "name": name,
-                    "profile_picture_url": profile_photo,
-                    "is_admin": is_admin,  # Include is_admin in the response
-                }
-            ),
-            200,
-        )
+        return jsonify(user_section(cursor, request.args)), 200
     except Exception as e:
         return jsonify({"success": False, "message": str(e)}), 500
     finally:
@@ -354,6 +757,7 @@ def make_admin():
             )
 
         conn.commit()  # Commit the transaction
+        user_cache.invalidate(target_user_id)  # Admin rights change takes effect now
 
         status_message = "promoted to admin" if new_status else "demoted from admin"
         app.logger.info(
@@ -452,38 +856,73 @@ def add_user():
         conn.close()
 
 
+# Display name as the row path builds it: "First Last", or the email if both are empty
+FULL_NAME_SQL = "COALESCE(NULLIF(btrim(concat_ws(' ', first_name, last_name)), ''), email)"
+
+
+def json_response(payload, status=200):
+    """Like jsonify, but passes Postgres-rendered RawJSON sections through untouched"""
+    return Response(render_json(payload, app.json.dumps), status, mimetype="application/json")
+
+
+def users_section(cursor, args):
+    """One page of users ordered by user_id"""
+    limit, after = page_params(args, ("id",))
+    page_sql = (
+        "SELECT user_id, email, first_name, last_name, phone FROM users "
+        "WHERE user_id > %s ORDER BY user_id LIMIT %s"
+    )  # Added phone field
+    params = (after[0] if after else 0, limit + 1)
+    if PG_JSON_RESPONSES:
+        users, next_cursor = json_page(
+            cursor,
+            page_sql,
+            params,
+            limit,
+            order_by="user_id",
+            key="user_id",
+            doc=f"""json_build_object(
+                'user_id', user_id, 'email', email, 'full_name', {FULL_NAME_SQL}, 'phone', phone
+            )""",
+        )
+        return {"users": users, "next_cursor": next_cursor}
+
+    cursor.execute(page_sql, params)
+    users, next_cursor = paginate(
+        cursor.fetchall(), limit, lambda u: [u["user_id"]]
+    )
+
+    # Format users for display
+    formatted_users = []
+    for u in users:
+        full_name = f"{u.get('first_name', '')} {u.get('last_name', '')}".strip()
+        formatted_users.append(
+            {
+                "user_id": u["user_id"],
+                "email": u["email"],
+                "full_name": full_name or u["email"],
+                "phone": u.get("phone", ""),  # Include phone in the response
+            }
+        )
+    return {"users": formatted_users, "next_cursor": next_cursor}
+
+
 @app.route("/api/get-users", methods=["GET"])
 @login_required
 @admin_required
 def get_users():
-    """Retrieves a list of all users"""
+    """Retrieves a page of users ordered by user_id"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT user_id, email, first_name, last_name, phone FROM users;"
-        )  # Added phone field
-        users = cursor.fetchall()
-        cursor.close()
-        conn.close()
-
-        # Format users for display
-        formatted_users = []
-        for u in users:
-            full_name = f"{u.get('first_name', '')} {u.get('last_name', '')}".strip()
-            formatted_users.append(
-                {
-                    "user_id": u["user_id"],
-                    "email": u["email"],
-                    "full_name": full_name or u["email"],
-                    "phone": u.get("phone", ""),  # Include phone in the response
-                }
-            )
-
-        return jsonify({"status": "success", "users": formatted_users}), 200
-
+        return json_response({"status": "success", **users_section(cursor, request.args)})
+    except InvalidPageRequest as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
+    finally:
+        cursor.close()
+        conn.close()
 
 
 @app.route("/api/profile", methods=["PUT"])
@@ -505,6 +944,7 @@ def update_profile():
             return jsonify({"status": "error", "message": "User not found"}), 404
 
         conn.commit()
+        user_cache.invalidate(user_id)
         return (
             jsonify({"status": "success", "message": "User updated successfully"}),
             200,
@@ -526,6 +966,17 @@ def delete_user(user_id):
     cursor = conn.cursor()
 
     try:
+        # Collect the user's S3 URLs first; the delete cascades to their vehicles.
+        # (media rows reference users without a cascade, so they block the delete.)
+        cursor.execute(
+            """
+            SELECT profile_picture_url AS url FROM users WHERE user_id = %(id)s
+            UNION ALL SELECT vehicle_image_url FROM vehicles WHERE user_id = %(id)s
+            """,
+            {"id": user_id},
+        )
+        urls = [row["url"] for row in cursor.fetchall()]
+
         # Delete user from database
         cursor.execute(
             "DELETE FROM users WHERE user_id = %s RETURNING user_id", (user_id,)
@@ -535,6 +986,8 @@ def delete_user(user_id):
             return jsonify({"status": "error", "message": "User not found"}), 404
 
         conn.commit()
+        user_cache.invalidate(user_id)  # Deleted users must stop authenticating
+        delete_s3_objects(urls)
         return (
             jsonify({"status": "success", "message": "User deleted successfully"}),
             200,
@@ -582,8 +1035,15 @@ def update_vehicle_status(vehicle_id):
 
 
 def allowed_file(filename):
-    ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "gif", "webp"}
-    return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
+    return content_type_for(filename) is not None
+
+
+def sniffed_content_type(file):
+    """The upload's real image type, or None unless its magic bytes agree with its extension"""
+    content_type = sniff_upload(file.stream)
+    if content_type is None or content_type != content_type_for(file.filename):
+        return None
+    return content_type
 
 
 @app.route("/api/add-vehicle", methods=["POST"])
@@ -705,6 +1165,11 @@ def add_vehicle():
 
 
 # Get all vehicles for the logged-in user
+def vehicles_section(cursor, args):
+    cursor.execute("SELECT * FROM vehicles WHERE user_id = %s", (current_user.id,))
+    return {"vehicles": cursor.fetchall()}
+
+
 @app.route("/api/get-vehicles", methods=["GET"])
 @login_required
 def get_vehicles():
@@ -712,9 +1177,7 @@ def get_vehicles():
     cursor = conn.cursor()
 
     try:
-        cursor.execute("SELECT * FROM vehicles WHERE user_id = %s", (current_user.id,))
-        vehicles = cursor.fetchall()
-        return jsonify({"status": "success", "vehicles": vehicles}), 200
+        return jsonify({"status": "success", **vehicles_section(cursor, request.args)}), 200
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
     finally:
@@ -766,9 +1229,6 @@ def update_vehicle(vehicle_id):
         conn.close()
 
 
-ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "gif", "pdf", "webp"}
-
-
 # Vehicle Photo:
 @app.route("/api/upload-vehicle-photo", methods=["POST"])
 @login_required
@@ -791,11 +1251,12 @@ def upload_vehicle_photo():
         print(f"File type not allowed: {file.filename}")
         return jsonify({"status": "error", "message": "File type not allowed"}), 400
 
-    # Create unique filename
-    filename = f"vehicle_{uuid.uuid4().hex}_{secure_filename(file.filename)}"
-    content_type = mimetypes.guess_type(filename)[0] or "image/jpeg"
+    # Checked before any bytes go to S3
+    content_type = sniffed_content_type(file)
+    if not content_type:
+        return jsonify({"status": "error", "message": "File content does not match its type"}), 400
 
-    print(f"Processing upload for file: {filename}, content_type: {content_type}")
+    print(f"Processing upload for file: {file.filename}, content_type: {content_type}")
     print(f"S3 bucket name: {S3_BUCKET_NAME}, AWS region: {AWS_REGION}")
 
     # Verify AWS credentials are available
@@ -806,64 +1267,42 @@ def upload_vehicle_photo():
             500,
         )
 
+    conn = get_db_connection()
+    cursor = conn.cursor()
     try:
-        print("Attempting to upload file to S3...")
-        # Upload to S3
-        s3_client.upload_fileobj(
-            file,
-            S3_BUCKET_NAME,
-            filename,
-            ExtraArgs={
-                "CacheControl": "max-age=86400",  # Cache for 1 day
-                "ContentType": content_type,
-                "ACL": "public-read",  # Make it publicly accessible
-            },
-        )
-
-        print("File uploaded successfully to S3")
-
-        # Construct the URL to the uploaded file
-        file_url = f"https://{S3_BUCKET_NAME}.s3.{AWS_REGION}.amazonaws.com/{filename}"
-        print(f"Generated S3 URL: {file_url}")
+        # Content-addressed; skips the S3 PUT if this image is already stored
+        file_url = store_upload(cursor, file, content_type)
+        print(f"Stored at S3 URL: {file_url}")
 
         # If vehicle_id is provided, update the existing vehicle
+        updated = None
         if vehicle_id and vehicle_id.isdigit():
             print(f"Updating existing vehicle with ID: {vehicle_id}")
-            conn = get_db_connection()
-            cursor = conn.cursor()
+            # Update the vehicle record with the new image URL
+            cursor.execute(
+                REPLACE_VEHICLE_IMAGE_SQL, (file_url, vehicle_id, current_user.id)
+            )
 
-            try:
-                # Update the vehicle record with the new image URL
-                cursor.execute(
-                    "UPDATE vehicles SET vehicle_image_url = %s WHERE vehicle_id = %s AND user_id = %s RETURNING vehicle_id",
-                    (file_url, vehicle_id, current_user.id),
+            updated = cursor.fetchone()
+            if not updated:
+                # If no rows were updated, either the vehicle doesn't exist or doesn't belong to this user
+                print(
+                    f"Vehicle not found or permission denied for update: {vehicle_id}"
                 )
-
-                updated = cursor.fetchone()
-                if not updated:
-                    # If no rows were updated, either the vehicle doesn't exist or doesn't belong to this user
-                    print(
-                        f"Vehicle not found or permission denied for update: {vehicle_id}"
-                    )
-                    return (
-                        jsonify(
-                            {
-                                "status": "error",
-                                "message": "Vehicle not found or you don't have permission to update it",
-                            }
-                        ),
-                        404,
-                    )
-
-                conn.commit()
-                print(f"Vehicle {vehicle_id} updated with image URL")
-            except Exception as db_error:
                 conn.rollback()
-                print(f"Database error during vehicle update: {str(db_error)}")
-                raise db_error  # Re-raise to be caught by the outer try/except
-            finally:
-                cursor.close()
-                conn.close()
+                return (
+                    jsonify(
+                        {
+                            "status": "error",
+                            "message": "Vehicle not found or you don't have permission to update it",
+                        }
+                    ),
+                    404,
+                )
+
+        conn.commit()
+        if updated and updated["old_url"] != file_url:
+            delete_s3_objects([updated["old_url"]])
 
         # Return success response with the URL
         print(f"Upload successful, returning URL: {file_url}")
@@ -879,6 +1318,7 @@ def upload_vehicle_photo():
         )
 
     except Exception as e:
+        conn.rollback()
         print(f"ERROR uploading vehicle photo: {str(e)}")
         import traceback
 
@@ -887,25 +1327,9 @@ def upload_vehicle_photo():
             jsonify({"status": "error", "message": f"Error uploading file: {str(e)}"}),
             500,
         )
-
-        # Return success response with the URL
-        return (
-            jsonify(
-                {
-                    "status": "success",
-                    "message": "Vehicle photo uploaded successfully",
-                    "vehicle_image_url": file_url,
-                }
-            ),
-            200,
-        )
-
-    except Exception as e:
-        print(f"Error uploading vehicle photo: {str(e)}")
-        return (
-            jsonify({"status": "error", "message": f"Error uploading file: {str(e)}"}),
-            500,
-        )
+    finally:
+        cursor.close()
+        conn.close()
 
 
 # Get vehicle image
@@ -971,58 +1395,68 @@ def get_vehicles_for_user(user_id):
 
 
 # Fetch Google reviews for a business using its place_id.
-@app.route("/api/reviews", methods=["GET"])
-def get_reviews():
-    try:
-        place_id = "ChIJv55qw2fuwIkReDtLLJcfUYk"
+REVIEWS_PLACE_ID = "ChIJv55qw2fuwIkReDtLLJcfUYk"
 
-        # First, get the place details which include reviews
-        url = "https://maps.googleapis.com/maps/api/place/details/json"
+reviews_cache = reviews_cache_from_env()
 
-        params = {
-            "reviews_sort": "highest",  # Get highest reviews first
-            "place_id": place_id,
-            "fields": "name,formatted_address,reviews",
-            "key": os.getenv("GOOGLE_MAPS_API_KEY"),  # make a env file and add api key
-        }
 
-        # Make the request to Google Places API
-        response = requests.get(url, params=params)
-        response.raise_for_status()  # Raise exception for HTTP errors
+class GooglePlacesError(Exception):
+    """Google answered the Place Details call with a non-OK status"""
 
-        # Parse the response
-        data = response.json()
+    def __init__(self, status, details):
+        super().__init__(f"Google API returned error: {status}")
+        self.status = status
+        self.details = details
 
-        # Check if the request was successful
-        if data["status"] != "OK":
-            return (
-                jsonify(
-                    {
-                        "error": f"Google API returned error: {data['status']}",
-                        "details": data.get("error_message", "No details provided"),
-                    }
-                ),
-                400,
-            )
 
-        # Extract business name and reviews
-        business_name = data["result"].get("name", "Unknown Business")
-        reviews = data["result"].get("reviews", [])
+def fetch_reviews(place_id):
+    """Fetches place details from Google and keeps only reviews rated 4 or higher"""
+    params = {
+        "reviews_sort": "highest",  # Get highest reviews first
+        "place_id": place_id,
+        "fields": "name,formatted_address,reviews",
+        "key": os.getenv("GOOGLE_MAPS_API_KEY"),  # make a env file and add api key
+    }
 
-        # Filter reviews to only include those with a rating of 4 or higher
-        filtered_reviews = [
-            review for review in reviews if review.get("rating", 0) >= 4
-        ]
+    # Make the request to Google Places API
+    with track_dependency("google_places", "place_details"):
+        response = upstream_session("google_places").get(
+            GOOGLE_PLACES_DETAILS_URL, params=params
+        )
+    response.raise_for_status()  # Raise exception for HTTP errors
 
-        # Format the response using filtered reviews
-        result = {
-            "business_name": business_name,
-            "place_id": place_id,
-            "reviews_count": len(filtered_reviews),
-            "reviews": filtered_reviews,
-        }
+    data = response.json()
+    if data["status"] != "OK":
+        raise GooglePlacesError(
+            data["status"], data.get("error_message", "No details provided")
+        )
 
-        return jsonify(result)
+    # Extract business name and reviews
+    business_name = data["result"].get("name", "Unknown Business")
+    reviews = data["result"].get("reviews", [])
+
+    # Filter reviews to only include those with a rating of 4 or higher
+    filtered_reviews = [review for review in reviews if review.get("rating", 0) >= 4]
+
+    return {
+        "business_name": business_name,
+        "place_id": place_id,
+        "reviews_count": len(filtered_reviews),
+        "reviews": filtered_reviews,
+    }
+
+
+@app.route("/api/reviews", methods=["GET"])
+def get_reviews():
+    """Returns Google reviews from the server-side cache; Google is only called on a cold cache"""
+    try:
+        result, age, state = reviews_cache.get(REVIEWS_PLACE_ID, fetch_reviews)
+
+    except GooglePlacesError as e:
+        return (
+            jsonify({"error": f"Google API returned error: {e.status}", "details": e.details}),
+            400,
+        )
 
     # Handle request-related errors (network issues, invalid responses, etc.)
     except requests.exceptions.RequestException as e:
@@ -1032,9 +1466,51 @@ def get_reviews():
     except Exception as e:
         return jsonify({"error": f"Unexpected error: {str(e)}"}), 500
 
+    response = jsonify(dict(result, cache_age_seconds=round(age, 1), cache_state=state))
+    response.headers["Age"] = str(int(age))
+    response.headers["X-Cache"] = state.upper()
+    response.headers["Cache-Control"] = "public, max-age=%d" % max(0, reviews_cache.ttl - age)
+    return response
+
 
 # INVOICES
 
+# Creates the invoice and every line item in a single round trip. The invoice row is
+# only produced when both the user and the vehicle exist, and the items are unpacked
+# from one JSON parameter so the statement count does not grow with the item count.
+# invoice_year is NULL for real invoices; benchmarks pass a far-future year so
+# they don't use up (nextval isn't rolled back) this year's invoice numbers
+CREATE_INVOICE_SQL = """
+    WITH new_invoice AS (
+        INSERT INTO invoices (user_id, vehicle_id, invoice_number, subtotal, tax_amount,
+                              discount_amount, total_amount, status, due_date, notes)
+        SELECT u.user_id, v.vehicle_id,
+               next_invoice_number(
+                   COALESCE(%(invoice_year)s, EXTRACT(YEAR FROM CURRENT_TIMESTAMP)::INTEGER)
+               ),
+               %(subtotal)s, %(tax_amount)s, %(discount_amount)s, %(total_amount)s,
+               %(status)s, %(due_date)s, %(notes)s
+        FROM users u
+        JOIN vehicles v ON v.vehicle_id = %(vehicle_id)s
+        WHERE u.user_id = %(user_id)s
+        RETURNING invoice_id, invoice_number
+    ),
+    new_items AS (
+        INSERT INTO invoice_items (invoice_id, service_id, history_id, description,
+                                   quantity, unit_price, discount_amount, total_price)
+        SELECT n.invoice_id, i.service_id, i.history_id, i.description,
+               i.quantity, i.unit_price, COALESCE(i.discount_amount, 0), i.total_price
+        FROM new_invoice n
+        CROSS JOIN json_to_recordset(%(items)s) AS i(
+            service_id INTEGER, history_id INTEGER, description TEXT, quantity INTEGER,
+            unit_price NUMERIC, discount_amount NUMERIC, total_price NUMERIC
+        )
+        RETURNING item_id
+    )
+    SELECT invoice_id, invoice_number, (SELECT COUNT(*) FROM new_items) AS item_count
+    FROM new_invoice;
+"""
+
 
 @app.route("/api/create-invoice", methods=["POST"])
 @login_required
@@ -1065,7 +1541,7 @@ def create_invoice():
         status = data["status"]
         due_date = data["due_date"]
         notes = data.get("notes", None)  # Use .get for optional fields
-        invoice_items = data.get("items", [])  # Expect items if needed
+        invoice_items = data.get("items") or []  # Expect items if needed
     except KeyError as e:
         # Handle missing required fields
         return (
@@ -1073,87 +1549,58 @@ def create_invoice():
             400,
         )
 
+    # Validate item structure before touching the database
+    required_keys = [
+        "description",
+        "quantity",
+        "unit_price",
+    ]  # Add other required keys like service_id/history_id if mandatory
+    if not isinstance(invoice_items, list) or not all(isinstance(item, dict) for item in invoice_items):
+        return (
+            jsonify({"status": "error", "message": "'items' must be a list of objects."}),
+            400,
+        )
+    if not all(key in item for item in invoice_items for key in required_keys):
+        return (
+            jsonify(
+                {"status": "error", "message": "Missing required key in invoice item."}
+            ),
+            400,
+        )
+
     conn = None  # Initialize conn to None
     cursor = None  # Initialize cursor to None
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
 
-        # --- Optional: Validate user_id and vehicle_id exist ---
-        cursor.execute("SELECT 1 FROM users WHERE user_id = %s", (user_id,))
-        if not cursor.fetchone():
-            return jsonify({"status": "error", "message": "User not found"}), 404
-
-        cursor.execute("SELECT 1 FROM vehicles WHERE vehicle_id = %s", (vehicle_id,))
-        if not cursor.fetchone():
-            return jsonify({"status": "error", "message": "Vehicle not found"}), 404
-        # --- End Optional Validation ---
-
-        # --- Generate Invoice Number ---
-        current_year = datetime.now().year
-        cursor.execute(
-            "SELECT COUNT(*) as count FROM invoices WHERE EXTRACT(YEAR FROM issue_date) = %s",
-            (current_year,),
-        )
-        # Ensure fetchone() didn't return None before accessing 'count'
-        count_result = cursor.fetchone()
-        count = (count_result["count"] + 1) if count_result else 1
-        invoice_number = f"INV-{current_year}-{count:04d}"
-
-        # --- Insert Invoice ---
+        # --- Insert invoice and all items in one statement ---
+        # Joining users and vehicles validates both ids; no row back means one is missing
         cursor.execute(
-            """
-            INSERT INTO invoices (user_id, vehicle_id, invoice_number, subtotal, tax_amount, discount_amount, total_amount, status, due_date, notes)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s) RETURNING invoice_id;
-            """,
-            (
-                user_id,  # Use the user_id from the payload
-                vehicle_id,
-                invoice_number,
-                subtotal,
-                tax_amount,
-                discount_amount,
-                total_amount,
-                status,
-                due_date,
-                notes,
-            ),
+            CREATE_INVOICE_SQL,
+            {
+                "user_id": user_id,
+                "vehicle_id": vehicle_id,
+                "subtotal": subtotal,
+                "tax_amount": tax_amount,
+                "discount_amount": discount_amount,
+                "total_amount": total_amount,
+                "status": status,
+                "due_date": due_date,
+                "notes": notes,
+                "items": Json(invoice_items),
+                "invoice_year": None,
+            },
         )
-        # Ensure fetchone() didn't return None before accessing 'invoice_id'
         invoice_result = cursor.fetchone()
         if not invoice_result:
-            raise Exception(
-                "Failed to insert invoice or retrieve invoice_id."
-            )  # Or a more specific exception
+            conn.rollback()
+            cursor.execute("SELECT 1 FROM users WHERE user_id = %s", (user_id,))
+            if not cursor.fetchone():
+                return jsonify({"status": "error", "message": "User not found"}), 404
+            return jsonify({"status": "error", "message": "Vehicle not found"}), 404
         invoice_id = invoice_result["invoice_id"]
-
-        # --- Insert Invoice Items (if any) ---
-        for item in invoice_items:
-            # Validate item structure before accessing keys
-            required_keys = [
-                "description",
-                "quantity",
-                "unit_price",
-            ]  # Add other required keys like service_id/history_id if mandatory
-            if not all(key in item for key in required_keys):
-                raise ValueError("Missing required key in invoice item.")
-
-            cursor.execute(
-                """
-                INSERT INTO invoice_items (invoice_id, service_id, history_id, description, quantity, unit_price, discount_amount, total_price)
-                VALUES (%s,%s,%s,%s,%s,%s,%s,%s);
-                """,
-                (
-                    invoice_id,
-                    item.get("service_id"),  # Use .get() if optional
-                    item.get("history_id"),  # Use .get() if optional
-                    item["description"],
-                    item["quantity"],
-                    item["unit_price"],
-                    item.get("discount_amount", 0),  # Use .get() if optional
-                    item.get("total_price"),  # Use .get() if optional or calculate
-                ),
-            )
+        invoice_number = invoice_result["invoice_number"]
 
         # --- Commit and Respond ---
         conn.commit()
@@ -1247,13 +1694,14 @@ def create_payment_intent():
         amount_in_cents = int(total_amount_decimal * 100)
 
         # 5. Create Payment Intent with Stripe
-        payment_intent = stripe.PaymentIntent.create(
-            amount=amount_in_cents,
-            currency=currency,
-            # Add metadata to link back to your system - ESSENTIAL for webhook
-            metadata={"invoice_id": invoice_id, "user_id": current_user.id},
-            description=f"Payment for Invoice ID {invoice_id}",  # Optional but helpful
-        )
+        with track_dependency("stripe", "PaymentIntent.create"):
+            payment_intent = stripe.PaymentIntent.create(
+                amount=amount_in_cents,
+                currency=currency,
+                # Add metadata to link back to your system - ESSENTIAL for webhook
+                metadata={"invoice_id": invoice_id, "user_id": current_user.id},
+                description=f"Payment for Invoice ID {invoice_id}",  # Optional but helpful
+            )
 
         # 6. Send client_secret back to the frontend
         return jsonify(clientSecret=payment_intent.client_secret)
@@ -1583,6 +2031,32 @@ def stripe_webhook():
 
 
 # Get Invoice
+def invoices_section(cursor, args):
+    """One page of the user's invoices; raises InvalidPageRequest for a bad ?limit= or ?cursor="""
+    limit, after = page_params(args, ("datetime", "id"))
+    after_sql, after_params = keyset_after(
+        "i.issue_date", "i.invoice_id", after, descending=True
+    )
+    cursor.execute(
+        f"""
+        SELECT invoice_id, invoice_number, subtotal, tax_amount, discount_amount, 
+               total_amount, status, issue_date, due_date, notes,
+               v.make, v.model, v.year
+        FROM invoices i
+        LEFT JOIN vehicles v ON i.vehicle_id = v.vehicle_id
+        WHERE i.user_id = %s AND {after_sql}
+        ORDER BY i.issue_date DESC, i.invoice_id DESC
+        LIMIT %s;
+    """,
+        (current_user.id, *after_params, limit + 1),
+    )
+
+    invoices, next_cursor = paginate(
+        cursor.fetchall(), limit, lambda i: [i["issue_date"], i["invoice_id"]]
+    )
+    return {"invoices": invoices, "next_cursor": next_cursor}
+
+
 @app.route("/api/get-user-invoices", methods=["GET"])
 @login_required
 def get_user_invoices():
@@ -1590,22 +2064,9 @@ def get_user_invoices():
     cursor = conn.cursor()
 
     try:
-        cursor.execute(
-            """
-            SELECT invoice_id, invoice_number, subtotal, tax_amount, discount_amount, 
-                   total_amount, status, issue_date, due_date, notes,
-                   v.make, v.model, v.year
-            FROM invoices i
-            LEFT JOIN vehicles v ON i.vehicle_id = v.vehicle_id
-            WHERE i.user_id = %s
-            ORDER BY i.issue_date DESC;
-        """,
-            (current_user.id,),
-        )
-
-        invoices = cursor.fetchall()
-
-        return jsonify({"status": "success", "invoices": invoices}), 200
+        return jsonify({"status": "success", **invoices_section(cursor, request.args)}), 200
+    except InvalidPageRequest as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
     finally:
@@ -1617,18 +2078,34 @@ def get_user_invoices():
 
 
 ## Get user notifications
+def notifications_section(cursor, args):
+    """One page of the user's unread notifications"""
+    limit, after = page_params(args, ("datetime", "id"))
+    after_sql, after_params = keyset_after(
+        "created_at", "notification_id", after, descending=True
+    )
+    cursor.execute(
+        f"SELECT * FROM notifications WHERE user_id = %s AND is_read = FALSE AND {after_sql} "
+        "ORDER BY created_at DESC, notification_id DESC LIMIT %s",
+        (current_user.id, *after_params, limit + 1),
+    )
+    notifications, next_cursor = paginate(
+        cursor.fetchall(),
+        limit,
+        lambda n: [n["created_at"], n["notification_id"]],
+    )
+    return {"notifications": notifications, "next_cursor": next_cursor}
+
+
 @app.route("/api/get-notifications", methods=["GET"])
 @login_required
 def get_notifications():
     conn = get_db_connection()
     cursor = conn.cursor()
     try:
-        cursor.execute(
-            "SELECT * FROM notifications WHERE user_id = %s AND is_read = FALSE ORDER BY created_at DESC",
-            (current_user.id,),
-        )
-        notifications = cursor.fetchall()
-        return jsonify({"status": "success", "notifications": notifications}), 200
+        return jsonify({"status": "success", **notifications_section(cursor, request.args)}), 200
+    except InvalidPageRequest as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
     finally:
@@ -1636,6 +2113,72 @@ def get_notifications():
         conn.close()
 
 
+notification_hub = notification_hub_from_env(open_db_connection)
+SSE_REPLAY_LIMIT = 500
+
+
+@app.route("/api/notifications/stream", methods=["GET"])
+@login_required
+def notification_stream():
+    """Server-Sent Events feed of the current user's new notifications"""
+    last_event_id = request.headers.get("Last-Event-ID") or request.args.get("last_event_id")
+    try:
+        last_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        return jsonify({"status": "error", "message": "Invalid Last-Event-ID"}), 400
+
+    # Subscribe before replaying so nothing inserted in between is missed;
+    # the stream skips ids the replay already sent. Replay also covers recent
+    # rows below last_id, which may have committed after it was sent.
+    subscription = notification_hub.subscribe(current_user.id)
+    if subscription is None:
+        response = jsonify(
+            {"status": "error", "message": "Too many open streams, retry shortly"}
+        )
+        response.headers["Retry-After"] = "5"
+        return response, 503
+
+    replay = []
+    if last_id is not None:
+        try:
+            conn = get_db_connection()
+            cursor = conn.cursor()
+            cursor.execute(
+                f"{MISSED_ROWS_SQL} LIMIT %(limit)s",
+                {
+                    "user_ids": [current_user.id],
+                    "after_id": last_id,
+                    "lookback": REPLAY_LOOKBACK,
+                    "limit": SSE_REPLAY_LIMIT,
+                },
+            )
+            replay = cursor.fetchall()
+            cursor.close()
+            conn.close()
+        except Exception as e:
+            notification_hub.unsubscribe(subscription)
+            return jsonify({"status": "error", "message": str(e)}), 500
+
+    # The stream can stay open for minutes; it must not hold a pooled connection
+    release_db_connection()
+    return Response(
+        notification_hub.stream(subscription, replay),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.route("/api/notification-stream-stats", methods=["GET"])
+@login_required
+@admin_required
+def notification_stream_stats():
+    """Returns open SSE streams and listener counters for this worker"""
+    return (
+        jsonify({"status": "success", "pid": os.getpid(), "hub": notification_hub.stats()}),
+        200,
+    )
+
+
 @app.route("/api/send-notification", methods=["POST"])
 @login_required
 @admin_required
@@ -1668,6 +2211,123 @@ def send_notification():
         conn.close()
 
 
+# Recipient sets for broadcast_notification; each selects user_id from users
+BROADCAST_SEGMENTS = {
+    "all": "SELECT u.user_id FROM users u",
+    "user_ids": "SELECT u.user_id FROM users u WHERE u.user_id = ANY(%(user_ids)s)",
+    "vehicles_on_lot": """
+        SELECT u.user_id FROM users u
+        WHERE EXISTS (
+            SELECT 1 FROM vehicles v
+            WHERE v.user_id = u.user_id AND v.vehicle_status IN ('Waiting', 'Active')
+        )
+    """,
+    "unpaid_invoices": """
+        SELECT u.user_id FROM users u
+        WHERE EXISTS (
+            SELECT 1 FROM invoices i
+            WHERE i.user_id = u.user_id AND i.status IN ('unpaid', 'overdue')
+        )
+    """,
+}
+
+
+def broadcast_notification_sql(segment):
+    """One INSERT ... SELECT that writes the notification for every user in the segment"""
+    return f"""
+        INSERT INTO notifications (user_id, title, message, type, related_id)
+        SELECT r.user_id, %(title)s, %(message)s, %(type)s, %(related_id)s
+        FROM ({BROADCAST_SEGMENTS[segment]}) AS r
+    """
+
+
+@app.route("/api/notifications/broadcast", methods=["POST"])
+@login_required
+@admin_required
+def broadcast_notification():
+    """Sends one notification to all users, a list of user_ids, or a segment, in one statement"""
+    data = request.get_json(silent=True) or {}
+    target = data.get("target")
+    title = data.get("title", "Notification")
+    message = data.get("message", "")
+    user_ids = data.get("user_ids")
+    notification_type = data.get("type", "info")
+    related_id = data.get("related_id")
+
+    if target not in BROADCAST_SEGMENTS:
+        return (
+            jsonify(
+                {
+                    "status": "error",
+                    "message": f"'target' must be one of: {', '.join(BROADCAST_SEGMENTS)}",
+                }
+            ),
+            400,
+        )
+    if target == "user_ids" and (
+        not isinstance(user_ids, list)
+        or not user_ids
+        or not all(isinstance(u, int) and not isinstance(u, bool) for u in user_ids)
+    ):
+        return (
+            jsonify({"status": "error", "message": "'user_ids' must be a list of integers"}),
+            400,
+        )
+    if (
+        not isinstance(message, str)
+        or not message
+        or not isinstance(title, str)
+        or len(title) > 100
+    ):
+        return (
+            jsonify(
+                {
+                    "status": "error",
+                    "message": "'message' is required and 'title' is limited to 100 characters",
+                }
+            ),
+            400,
+        )
+    if not isinstance(notification_type, str) or not notification_type or len(notification_type) > 30:
+        return (
+            jsonify(
+                {"status": "error", "message": "'type' must be a string of at most 30 characters"}
+            ),
+            400,
+        )
+    if related_id is not None and (not isinstance(related_id, int) or isinstance(related_id, bool)):
+        return (
+            jsonify({"status": "error", "message": "'related_id' must be an integer"}),
+            400,
+        )
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            broadcast_notification_sql(target),
+            {
+                "title": title,
+                "message": message,
+                "type": notification_type,
+                "related_id": related_id,
+                "user_ids": user_ids,
+            },
+        )
+        recipients = cursor.rowcount
+        conn.commit()
+        return (
+            jsonify({"status": "success", "target": target, "recipients": recipients}),
+            201,
+        )
+    except Exception as e:
+        conn.rollback()
+        return jsonify({"status": "error", "message": str(e)}), 500
+    finally:
+        cursor.close()
+        conn.close()
+
+
 @app.route("/api/mark-notification-read/<int:notification_id>", methods=["PUT"])
 @login_required
 def mark_notification_read(notification_id):
@@ -1703,27 +2363,156 @@ def mark_notification_read(notification_id):
         conn.close()
 
 
+def unread_notification_count(cursor, user_id):
+    """Reads the trigger-maintained unread counter (migration 0009)"""
+    cursor.execute(
+        "SELECT unread_count FROM notification_counters WHERE user_id = %s", (user_id,)
+    )
+    row = cursor.fetchone()
+    return row["unread_count"] if row else 0
+
+
+@app.route("/api/notifications/unread-count", methods=["GET"])
+@login_required
+def get_unread_notification_count():
+    """Returns the current user's unread notification count for the header badge"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        unread = unread_notification_count(cursor, current_user.id)
+        return jsonify({"status": "success", "unread_count": unread}), 200
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+    finally:
+        cursor.close()
+        conn.close()
+
+
+@app.route("/api/notifications/mark-read", methods=["POST"])
+@login_required
+def mark_notifications_read():
+    """Marks the given ids, everything created before a timestamp, or everything as read"""
+    data = request.get_json(silent=True) or {}
+    ids = data.get("ids")
+    before = data.get("before")
+
+    if ids is not None:
+        if not isinstance(ids, list) or not all(
+            isinstance(i, int) and not isinstance(i, bool) for i in ids
+        ):
+            return (
+                jsonify({"status": "error", "message": "'ids' must be a list of integers"}),
+                400,
+            )
+        condition, params = "notification_id = ANY(%s)", (ids,)
+    elif before is not None:
+        try:
+            before = datetime.fromisoformat(str(before).replace("Z", "+00:00"))
+        except ValueError:
+            return (
+                jsonify({"status": "error", "message": "'before' must be an ISO timestamp"}),
+                400,
+            )
+        condition, params = "created_at <= %s", (before,)
+    elif data.get("all") is True:
+        condition, params = "TRUE", ()
+    else:
+        return (
+            jsonify(
+                {"status": "error", "message": "Provide 'ids', 'before' or 'all': true"}
+            ),
+            400,
+        )
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            f"UPDATE notifications SET is_read = TRUE "
+            f"WHERE user_id = %s AND is_read = FALSE AND {condition}",
+            (current_user.id, *params),
+        )
+        updated = cursor.rowcount
+        unread = unread_notification_count(cursor, current_user.id)
+        conn.commit()
+        return (
+            jsonify({"status": "success", "updated": updated, "unread_count": unread}),
+            200,
+        )
+    except Exception as e:
+        conn.rollback()
+        return jsonify({"status": "error", "message": str(e)}), 500
+    finally:
+        cursor.close()
+        conn.close()
+
+
+@app.route("/api/notifications/history", methods=["GET"])
+@login_required
+def get_notification_history():
+    """Returns a page of the current user's notifications, read and unread, newest first"""
+    try:
+        limit, after = page_params(request.args, ("id",))
+    except InvalidPageRequest as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        after_sql, after_params = (
+            ("notification_id < %s", (after[0],)) if after else ("TRUE", ())
+        )
+        cursor.execute(
+            f"SELECT {NOTIFICATION_COLUMNS} FROM notifications "
+            f"WHERE user_id = %s AND {after_sql} "
+            "ORDER BY notification_id DESC LIMIT %s",
+            (current_user.id, *after_params, limit + 1),
+        )
+        notifications, next_cursor = paginate(
+            cursor.fetchall(), limit, lambda n: [n["notification_id"]]
+        )
+        return (
+            jsonify(
+                {
+                    "status": "success",
+                    "notifications": notifications,
+                    "next_cursor": next_cursor,
+                }
+            ),
+            200,
+        )
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+    finally:
+        cursor.close()
+        conn.close()
+
+
 # LOYALTY POINTS
 # # Get user loyalty points
+def loyalty_points_section(cursor, args):
+    cursor.execute(
+        "SELECT points_balance, total_points_earned, last_updated FROM loyalty_points WHERE user_id = %s",
+        (current_user.id,),
+    )
+    points = cursor.fetchone()
+    if not points:
+        # Return default loyalty points values if record is missing
+        points = {
+            "points_balance": 0,
+            "total_points_earned": 0,
+            "last_updated": None,
+        }
+    return {"points": points}
+
+
 @app.route("/api/get-loyalty-points", methods=["GET"])
 @login_required
 def get_loyalty_points():
     conn = get_db_connection()
     cursor = conn.cursor()
     try:
-        cursor.execute(
-            "SELECT points_balance, total_points_earned, last_updated FROM loyalty_points WHERE user_id = %s",
-            (current_user.id,),
-        )
-        points = cursor.fetchone()
-        if not points:
-            # Return default loyalty points values if record is missing
-            points = {
-                "points_balance": 0,
-                "total_points_earned": 0,
-                "last_updated": None,
-            }
-        return jsonify({"status": "success", "points": points}), 200
+        return jsonify({"status": "success", **loyalty_points_section(cursor, request.args)}), 200
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
     finally:
@@ -1792,33 +2581,25 @@ def upload_media():
     if file.filename == "":
         return jsonify({"status": "error", "message": "No file selected"}), 400
 
+    if not allowed_file(file.filename):
+        return jsonify({"status": "error", "message": "File type not allowed"}), 400
+
+    content_type = sniffed_content_type(file)
+    if not content_type:
+        return jsonify({"status": "error", "message": "File content does not match its type"}), 400
+
     vehicle_id = request.form.get("vehicle_id")
     description = request.form.get("description", "")
     title = secure_filename(file.filename)  # using filename as title by default
     media_type = "image"
 
-    filename = f"media_{uuid.uuid4().hex}_{secure_filename(file.filename)}"
-    content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
-
+    conn = get_db_connection()
+    cursor = conn.cursor()
     try:
-        # Upload file to S3
-        s3_client.upload_fileobj(
-            file,
-            S3_BUCKET_NAME,
-            filename,
-            ExtraArgs={
-                "ContentType": content_type,
-                "CacheControl": "max-age=86400",
-                "ACL": "public-read",
-            },
-        )
-
-        file_url = f"https://{S3_BUCKET_NAME}.s3.{AWS_REGION}.amazonaws.com/{filename}"
+        # Content-addressed; skips the S3 PUT if this image is already stored
+        file_url = store_upload(cursor, file, content_type)
 
         # Insert into database
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
         cursor.execute(
             """
             INSERT INTO media (
@@ -1839,6 +2620,7 @@ def upload_media():
 
         media_id = cursor.fetchone()["media_id"]
         conn.commit()
+        media_variant_worker.wake()
 
         return (
             jsonify(
@@ -1853,6 +2635,7 @@ def upload_media():
         )
 
     except Exception as e:
+        conn.rollback()
         print(f"Error uploading media: {e}")
         return jsonify({"status": "error", "message": str(e)}), 500
 
@@ -1861,66 +2644,164 @@ def upload_media():
         conn.close()
 
 
+def media_section(cursor, args):
+    """One page of the user's media, grouped by vehicle"""
+    limit, after = page_params(args, ("datetime", "id"))
+    # Retrieve a page of media linked to the user's ID, along with associated vehicle info
+    after_sql, after_params = keyset_after(
+        "m.upload_date", "m.media_id", after, descending=True
+    )
+    page_sql = f"""
+        SELECT 
+            m.media_id, m.vehicle_id, m.file_url, m.thumbnail_url, m.variants, m.title, m.description, m.upload_date, m.media_type,
+            v.make, v.model, v.year, v.license_plate
+        FROM media m
+        LEFT JOIN vehicles v ON m.vehicle_id = v.vehicle_id
+        WHERE m.user_id = %s AND {after_sql}
+        ORDER BY m.upload_date DESC, m.media_id DESC
+        LIMIT %s
+    """
+    params = (current_user.id, *after_params, limit + 1)
+    if PG_JSON_RESPONSES:
+        # One document per vehicle, in the order its first photo appears on the page
+        vehicles_media, next_cursor = json_page(
+            cursor,
+            page_sql,
+            params,
+            limit,
+            order_by="upload_date DESC, media_id DESC",
+            key="upload_date, media_id",
+            group_by="vehicle_id, make, model, year, license_plate",
+            doc="""json_build_object(
+                'vehicle_info', json_build_object(
+                    'vehicle_id', COALESCE(to_json(vehicle_id), '"unassigned"'::json),
+                    'make', make, 'model', model, 'year', year, 'license_plate', license_plate
+                ),
+                'media', json_agg(json_build_object(
+                    'media_id', media_id, 'file_url', file_url, 'thumbnail_url', thumbnail_url,
+                    'variants', variants, 'title', title, 'description', description,
+                    'upload_date', upload_date, 'media_type', media_type
+                ) ORDER BY n)
+            )""",
+        )
+        return {"vehicles_media": vehicles_media, "next_cursor": next_cursor}
+
+    cursor.execute(page_sql, params)
+    media_records, next_cursor = paginate(
+        cursor.fetchall(), limit, lambda m: [m["upload_date"], m["media_id"]]
+    )
+
+    # Organize media by vehicle (per page; a vehicle can appear on several pages)
+    vehicles_media = {}
+    for media in media_records:
+        vehicle_id = media["vehicle_id"] or "unassigned"
+
+        vehicle_info = {
+            "vehicle_id": vehicle_id,
+            "make": media.get("make", "Unassigned"),
+            "model": media.get("model", ""),
+            "year": media.get("year", ""),
+            "license_plate": media.get("license_plate", ""),
+        }
+
+        if vehicle_id not in vehicles_media:
+            vehicles_media[vehicle_id] = {"vehicle_info": vehicle_info, "media": []}
+
+        vehicles_media[vehicle_id]["media"].append(
+            {
+                "media_id": media["media_id"],
+                "file_url": media["file_url"],
+                "thumbnail_url": media["thumbnail_url"],
+                "variants": media["variants"],
+                "title": media["title"],
+                "description": media["description"],
+                "upload_date": media["upload_date"],
+                "media_type": media["media_type"],
+            }
+        )
+
+    # Convert the dictionary to a list for easier frontend handling
+    organized_media = list(vehicles_media.values())
+    return {"vehicles_media": organized_media, "next_cursor": next_cursor}
+
+
 @app.route("/api/get-user-media", methods=["GET"])
 @login_required
 def get_user_media():
     conn = get_db_connection()
     cursor = conn.cursor()
     try:
-        # Retrieve all media linked to the user's ID, along with associated vehicle info
-        cursor.execute(
-            """
-            SELECT 
-                m.media_id, m.vehicle_id, m.file_url, m.thumbnail_url, m.title, m.description, m.upload_date, m.media_type,
-                v.make, v.model, v.year, v.license_plate
-            FROM media m
-            LEFT JOIN vehicles v ON m.vehicle_id = v.vehicle_id
-            WHERE m.user_id = %s
-            ORDER BY m.upload_date DESC;
-        """,
-            (current_user.id,),
-        )
+        return json_response({"status": "success", **media_section(cursor, request.args)})
+
+    except InvalidPageRequest as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    except Exception as e:
+        conn.rollback()
+        print(f"Error fetching user media: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
 
-        media_records = cursor.fetchall()
+    finally:
+        cursor.close()
+        conn.close()
 
-        # Organize media by vehicle
-        vehicles_media = {}
-        for media in media_records:
-            vehicle_id = media["vehicle_id"] or "unassigned"
 
-            vehicle_info = {
-                "vehicle_id": vehicle_id,
-                "make": media.get("make", "Unassigned"),
-                "model": media.get("model", ""),
-                "year": media.get("year", ""),
-                "license_plate": media.get("license_plate", ""),
-            }
+# DASHBOARD
+def requested_sections(available):
+    """Reads ?sections= and ?limit=; returns (section names, None) or (None, error response)"""
+    requested = request.args.get("sections")
+    names = [n.strip() for n in (requested or "").split(",") if n.strip()] or list(available)
+    unknown = [n for n in names if n not in available]
+    if unknown:
+        message = f"Unknown sections: {', '.join(unknown)}; expected any of: {', '.join(available)}"
+        return None, (jsonify({"status": "error", "message": message}), 400)
+    try:
+        page_params({"limit": request.args.get("limit")}, ("id",))
+    except InvalidPageRequest as e:
+        return None, (jsonify({"status": "error", "message": str(e)}), 400)
+    return list(dict.fromkeys(names)), None
 
-            if vehicle_id not in vehicles_media:
-                vehicles_media[vehicle_id] = {"vehicle_info": vehicle_info, "media": []}
 
-            vehicles_media[vehicle_id]["media"].append(
-                {
-                    "media_id": media["media_id"],
-                    "file_url": media["file_url"],
-                    "thumbnail_url": media["thumbnail_url"],
-                    "title": media["title"],
-                    "description": media["description"],
-                    "upload_date": media["upload_date"],
-                    "media_type": media["media_type"],
-                }
-            )
+# section name -> loader(cursor, args) returning that endpoint's payload without "status"
+DASHBOARD_SECTIONS = {
+    "user": user_section,
+    "vehicles": vehicles_section,
+    "invoices": invoices_section,
+    "notifications": notifications_section,
+    "loyalty_points": loyalty_points_section,
+    "media": media_section,
+}
+
 
-        # Convert the dictionary to a list for easier frontend handling
-        organized_media = list(vehicles_media.values())
+@app.route("/api/dashboard", methods=["GET"])
+@login_required
+def get_dashboard():
+    """
+    Everything the dashboard loads on mount, in one request.
 
-        return jsonify({"status": "success", "vehicles_media": organized_media}), 200
+    ?sections=vehicles,notifications picks sections (default: all of
+    DASHBOARD_SECTIONS); ?limit= sizes the paged ones, which return their
+    first page and a next_cursor for the per-section endpoints. All sections
+    are read on one connection from one snapshot.
+    """
+    names, error = requested_sections(DASHBOARD_SECTIONS)
+    if error:
+        return error
+    section_args = {"limit": request.args.get("limit")}
 
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        conn.rollback()  # SET TRANSACTION must come first in its transaction
+        cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY")
+        payload = {"status": "success"}
+        for name in names:
+            payload[name] = DASHBOARD_SECTIONS[name](cursor, section_args)
+        conn.rollback()
+        return json_response(payload)
     except Exception as e:
         conn.rollback()
-        print(f"Error fetching user media: {e}")
         return jsonify({"status": "error", "message": str(e)}), 500
-
     finally:
         cursor.close()
         conn.close()
@@ -1933,11 +2814,11 @@ def delete_media(media_id):
     cursor = conn.cursor()
 
     try:
-        # First, verify media ownership and retrieve URL for deletion from S3
+        # Ownership check and delete in one statement; the URLs come back for S3
         cursor.execute(
             """
-            SELECT file_url FROM media
-            WHERE media_id = %s AND user_id = %s
+            DELETE FROM media WHERE media_id = %s AND user_id = %s
+            RETURNING file_url, thumbnail_url, variants
         """,
             (media_id, current_user.id),
         )
@@ -1952,24 +2833,10 @@ def delete_media(media_id):
                 404,
             )
 
-        file_url = media["file_url"]
-
-        # Delete media record from database
-        cursor.execute(
-            """
-            DELETE FROM media WHERE media_id = %s AND user_id = %s
-        """,
-            (media_id, current_user.id),
-        )
         conn.commit()
 
-        # Extract S3 object key from file_url
-        file_key = file_url.split(
-            f"https://{S3_BUCKET_NAME}.s3.{AWS_REGION}.amazonaws.com/"
-        )[-1]
-
-        # Delete from S3
-        s3_client.delete_object(Bucket=S3_BUCKET_NAME, Key=file_key)
+        # Original and variants in one DeleteObjects call
+        delete_s3_objects(media_object_urls(media))
 
         return (
             jsonify({"status": "success", "message": "Media deleted successfully"}),
@@ -1986,8 +2853,65 @@ def delete_media(media_id):
         conn.close()
 
 
-# USER PROFILE TEST POINT
-@app.route("/api/upload-profile-photo", methods=["POST"])
+MEDIA_BULK_DELETE_MAX = 1000
+
+
+@app.route("/api/media/bulk-delete", methods=["POST"])
+@login_required
+def bulk_delete_media():
+    """Deletes up to MEDIA_BULK_DELETE_MAX of the user's media rows and their S3 objects"""
+    media_ids = (request.get_json() or {}).get("media_ids")
+    if (
+        not isinstance(media_ids, list)
+        or not media_ids
+        or not all(isinstance(i, int) for i in media_ids)
+    ):
+        return jsonify({"status": "error", "message": "media_ids must be a non-empty list of ids"}), 400
+    if len(media_ids) > MEDIA_BULK_DELETE_MAX:
+        return (
+            jsonify(
+                {"status": "error", "message": f"At most {MEDIA_BULK_DELETE_MAX} media_ids per request"}
+            ),
+            400,
+        )
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            """
+            DELETE FROM media WHERE media_id = ANY(%s) AND user_id = %s
+            RETURNING media_id, file_url, thumbnail_url, variants
+            """,
+            (media_ids, current_user.id),
+        )
+        rows = cursor.fetchall()
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        return jsonify({"status": "error", "message": str(e)}), 500
+    finally:
+        cursor.close()
+        conn.close()
+
+    urls = [url for row in rows for url in media_object_urls(row)]
+    objects_deleted = delete_s3_objects(urls)
+    deleted_ids = {row["media_id"] for row in rows}
+    return (
+        jsonify(
+            {
+                "status": "success",
+                "deleted": sorted(deleted_ids),
+                "not_found": [i for i in media_ids if i not in deleted_ids],
+                "objects_deleted": objects_deleted,
+            }
+        ),
+        200,
+    )
+
+
+# USER PROFILE TEST POINT
+@app.route("/api/upload-profile-photo", methods=["POST"])
 @login_required
 def upload_profile_photo():
     if "file" not in request.files:
@@ -2001,60 +2925,317 @@ def upload_profile_photo():
     if not allowed_file(file.filename):
         return jsonify({"success": False, "message": "File type not allowed"}), 400
 
-    filename = f"{uuid.uuid4().hex}_{secure_filename(file.filename)}"
-    content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    content_type = sniffed_content_type(file)
+    if not content_type:
+        return jsonify({"success": False, "message": "File content does not match its type"}), 400
 
+    conn = get_db_connection()
+    cursor = conn.cursor(cursor_factory=RealDictCursor)
     try:
-        s3_client.upload_fileobj(
-            file,
-            S3_BUCKET_NAME,
-            filename,
-            ExtraArgs={
-                "CacheControl": "public, max-age=86400",
-                "ContentType": content_type,
-                "ACL": "public-read",  # Include ACL: public-read to make the object accessible
-            },
+        # Content-addressed; skips the S3 PUT if this image is already stored
+        file_url = store_upload(cursor, file, content_type)
+        cursor.execute(REPLACE_PROFILE_PICTURE_SQL, (file_url, current_user.id))
+        updated = cursor.fetchone()
+        conn.commit()
+        user_cache.invalidate(current_user.id)
+        if updated["old_url"] != file_url:
+            delete_s3_objects([updated["old_url"]])
+
+        return (
+            jsonify(
+                {
+                    "success": True,
+                    "message": "Profile photo updated",
+                    "profile_picture_url": updated["profile_picture_url"],
+                }
+            ),
+            200,
         )
-        file_url = f"https://{S3_BUCKET_NAME}.s3.{AWS_REGION}.amazonaws.com/{filename}"
 
+    except Exception as e:
+        conn.rollback()
+        return jsonify({"success": False, "message": str(e)}), 500
+    finally:
+        cursor.close()
+        conn.close()
+
+
+# MEDIA VARIANTS
+media_variant_worker = media_variant_worker_from_env(
+    open_db_connection, s3_client, S3_BUCKET_NAME, s3_object_url, s3_key_from_url
+)
+
+
+@app.before_request
+def start_media_variant_worker():
+    # Started lazily so each gunicorn worker renders in its own pool after the fork
+    media_variant_worker.ensure_running()
+
+
+@app.route("/api/media-variants-stats", methods=["GET"])
+@login_required
+@admin_required
+def media_variants_stats():
+    """Returns media counts by variants_status and this worker's renderer counters"""
+    try:
         conn = get_db_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        cursor = conn.cursor()
         cursor.execute(
-            "UPDATE users SET profile_picture_url = %s WHERE user_id = %s RETURNING profile_picture_url",
-            (file_url, current_user.id),
+            "SELECT COALESCE(variants_status, 'none') AS status, COUNT(*) AS count FROM media GROUP BY 1"
         )
-        updated = cursor.fetchone()
+        media = {row["status"]: row["count"] for row in cursor.fetchall()}
+        cursor.close()
+        conn.close()
+        return (
+            jsonify(
+                {
+                    "status": "success",
+                    "pid": os.getpid(),
+                    "media": media,
+                    "worker": media_variant_worker.stats(),
+                }
+            ),
+            200,
+        )
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+# DIRECT UPLOADS
+# The browser POSTs the file to S3 itself; these routes only sign and record.
+
+
+@app.route("/api/uploads/presign", methods=["POST"])
+@login_required
+def presign_upload():
+    """Returns a short-lived presigned POST for uploading one file straight to S3
+
+    With a sha256 that is already stored, returns {"exists": true, "key": ...}
+    instead; the browser skips the upload and goes straight to confirm.
+    """
+    data = request.get_json() or {}
+    sha256 = (data.get("sha256") or "").lower() or None
+    if sha256 and not SHA256_PATTERN.match(sha256):
+        return jsonify({"status": "error", "message": "sha256 must be 64 hex digits"}), 400
+    if sha256:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT url FROM media_blobs WHERE sha256 = %s", (sha256,))
+            blob = cursor.fetchone()
+        finally:
+            cursor.close()
+            conn.close()
+        if blob:
+            return jsonify({"status": "success", "exists": True, "key": s3_key_from_url(blob["url"])}), 200
+    try:
+        upload = direct_uploads.presign(data.get("kind"), current_user.id, data.get("filename"), sha256)
+    except InvalidUpload as e:
+        return jsonify({"status": "error", "message": str(e)}), e.status
+    return jsonify({"status": "success", "exists": False, **upload}), 200
+
+
+def confirmed_upload(kind):
+    """Checks the key in the request body; returns (upload, None) or (None, error response)"""
+    key = (request.get_json() or {}).get("key")
+    try:
+        with track_dependency("s3", "get_object"):
+            size, content_type = direct_uploads.verify(kind, current_user.id, key)
+    except InvalidUpload as e:
+        return None, (jsonify({"status": "error", "message": str(e)}), e.status)
+    upload = {"kind": kind, "key": key, "url": s3_object_url(key), "size": size, "content_type": content_type}
+    return upload, None
+
+
+def claim_confirmed_blob(cursor, upload):
+    """Registers a confirmed blob upload on the caller's transaction, before the row that uses it"""
+    sha256 = blob_sha256(upload["key"])
+    if sha256 is None:
+        return
+    if claim_blob(cursor, sha256, upload["url"], upload["content_type"], upload["size"]):
+        # New row: either a fresh upload, or s3_cleanup collected the blob
+        # since verify(); the object must still be there
+        with track_dependency("s3", "get_object"):
+            direct_uploads.verify(upload["kind"], current_user.id, upload["key"])
+
+
+@app.route("/api/uploads/vehicle-photo/confirm", methods=["POST"])
+@login_required
+def confirm_vehicle_photo():
+    """Attaches an uploaded photo to one of the user's vehicles"""
+    upload, error = confirmed_upload("vehicle_photo")
+    if error:
+        return error
+    file_url = upload["url"]
+    vehicle_id = (request.get_json() or {}).get("vehicle_id")
+    updated = None
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        # Registered even without a vehicle, since add-vehicle may use the URL later
+        claim_confirmed_blob(cursor, upload)
+        if vehicle_id and str(vehicle_id).isdigit():
+            cursor.execute(REPLACE_VEHICLE_IMAGE_SQL, (file_url, vehicle_id, current_user.id))
+            updated = cursor.fetchone()
+            if not updated:
+                conn.rollback()
+                return (
+                    jsonify(
+                        {
+                            "status": "error",
+                            "message": "Vehicle not found or you don't have permission to update it",
+                        }
+                    ),
+                    404,
+                )
         conn.commit()
+    except InvalidUpload as e:
+        conn.rollback()
+        return jsonify({"status": "error", "message": str(e)}), e.status
+    except Exception as e:
+        conn.rollback()
+        return jsonify({"status": "error", "message": str(e)}), 500
+    finally:
         cursor.close()
         conn.close()
+    if updated and updated["old_url"] != file_url:
+        delete_s3_objects([updated["old_url"]])
+    return (
+        jsonify(
+            {
+                "status": "success",
+                "message": "Vehicle photo uploaded successfully",
+                "vehicle_image_url": file_url,
+            }
+        ),
+        200,
+    )
+
 
+@app.route("/api/uploads/media/confirm", methods=["POST"])
+@login_required
+def confirm_media():
+    """Records an uploaded file as a media row; confirming the same file twice returns the first row"""
+    upload, error = confirmed_upload("media")
+    if error:
+        return error
+    file_url = upload["url"]
+    data = request.get_json() or {}
+    vehicle_id = data.get("vehicle_id")
+    title = (
+        data.get("title")
+        or secure_filename(data.get("filename") or "")
+        or file_url.rsplit("/", 1)[-1].split("_", 1)[-1]
+    )
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        claim_confirmed_blob(cursor, upload)
+        cursor.execute(
+            """
+            WITH inserted AS (
+                INSERT INTO media (
+                    user_id, vehicle_id, media_type, file_url, title, description, is_public
+                )
+                SELECT %(user_id)s, %(vehicle_id)s, 'image', %(file_url)s, %(title)s, %(description)s, TRUE
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM media WHERE user_id = %(user_id)s AND file_url = %(file_url)s
+                )
+                RETURNING media_id
+            )
+            SELECT media_id FROM inserted
+            UNION ALL
+            SELECT media_id FROM media WHERE user_id = %(user_id)s AND file_url = %(file_url)s
+            LIMIT 1
+            """,
+            {
+                "user_id": current_user.id,
+                "vehicle_id": vehicle_id or None,
+                "file_url": file_url,
+                "title": title,
+                "description": data.get("description") or None,
+            },
+        )
+        media_id = cursor.fetchone()["media_id"]
+        conn.commit()
+        media_variant_worker.wake()
         return (
             jsonify(
                 {
-                    "success": True,
-                    "message": "Profile photo updated",
-                    "profile_picture_url": updated["profile_picture_url"],
+                    "status": "success",
+                    "message": "Media uploaded successfully!",
+                    "media_id": media_id,
+                    "file_url": file_url,
                 }
             ),
-            200,
+            201,
         )
+    except InvalidUpload as e:
+        conn.rollback()
+        return jsonify({"status": "error", "message": str(e)}), e.status
+    except Exception as e:
+        conn.rollback()
+        print(f"Error confirming media upload: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+    finally:
+        cursor.close()
+        conn.close()
+
 
+@app.route("/api/uploads/profile-photo/confirm", methods=["POST"])
+@login_required
+def confirm_profile_photo():
+    """Points the user's profile picture at an uploaded photo"""
+    upload, error = confirmed_upload("profile_photo")
+    if error:
+        return error
+    file_url = upload["url"]
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        claim_confirmed_blob(cursor, upload)
+        cursor.execute(REPLACE_PROFILE_PICTURE_SQL, (file_url, current_user.id))
+        updated = cursor.fetchone()
+        conn.commit()
+    except InvalidUpload as e:
+        conn.rollback()
+        return jsonify({"success": False, "message": str(e)}), e.status
     except Exception as e:
+        conn.rollback()
         return jsonify({"success": False, "message": str(e)}), 500
+    finally:
+        cursor.close()
+        conn.close()
+    user_cache.invalidate(current_user.id)
+    if updated["old_url"] != file_url:
+        delete_s3_objects([updated["old_url"]])
+    return (
+        jsonify(
+            {
+                "success": True,
+                "message": "Profile photo updated",
+                "profile_picture_url": updated["profile_picture_url"],
+            }
+        ),
+        200,
+    )
 
 
 # EMAIL
+mail_sender = mail_sender_from_env(
+    open_db_connection, MAIL_SERVER, MAIL_PORT, MAIL_USE_TLS, MAIL_USERNAME, MAIL_PASSWORD
+)
+
+
+@app.before_request
+def start_mail_sender():
+    # Started lazily so each gunicorn worker runs its own sender after the fork
+    mail_sender.ensure_running()
+
+
 @app.route("/api/contact", methods=["POST"])
 def contact():
-    app.config["MAIL_SERVER"] = "smtp.gmail.com"
-    app.config["MAIL_PORT"] = 587
-    app.config["MAIL_USERNAME"] = os.environ.get("MAIL_USERNAME")
-    app.config["MAIL_PASSWORD"] = os.environ.get("MAIL_PASSWORD")
-    app.config["MAIL_RECIPIENT"] = os.environ.get("MAIL_RECIPIENT")
-    app.config["MAIL_USE_TLS"] = True
-    app.config["MAIL_USE_SSL"] = False
-    mail = Mail(app)
-
+    """Verifies the captcha and queues the message; the mail sender delivers it"""
     data = request.json
     captcha_token = data.get("captchaToken")
 
@@ -2065,10 +3246,15 @@ def contact():
         "sitekey": "939e59b0-e52e-48d0-a2a2-0aa4d41a5cde",
     }
 
-    response = requests.post(
-        "https://api.hcaptcha.com/siteverify", data=verification_data
-    )
-    result = response.json()
+    try:
+        with track_dependency("hcaptcha", "siteverify"):
+            response = upstream_session("hcaptcha").post(
+                HCAPTCHA_VERIFY_URL, data=verification_data
+            )
+        result = response.json()
+    except (requests.exceptions.RequestException, ValueError) as e:
+        app.logger.error(f"hCaptcha verification unavailable: {e}")
+        return jsonify({"error": "Captcha verification is unavailable, try again later"}), 503
 
     # Check if verification was successful
     if not result.get("success", False):
@@ -2076,7 +3262,6 @@ def contact():
 
     try:
         # Get form data from request
-        data = request.json
         name = data.get("name", "")
         email = data.get("email", "")
         message_body = data.get("message", "")
@@ -2084,17 +3269,8 @@ def contact():
         # Create email subject with sender's name
         subject = f"Contact Form Submission from {name}"
 
-        # Create email message
-        msg = Message(
-            subject=subject,
-            sender=app.config["MAIL_USERNAME"],
-            recipients=[
-                app.config["MAIL_RECIPIENT"]
-            ],  # replace with env with client's email on deployment or demo user
-        )
-
         # Format email body with sender's information
-        msg.body = f"""
+        body = f"""
         Name: {name}
         Email: {email}
         
@@ -2102,28 +3278,104 @@ def contact():
         {message_body}
         """
 
-        # Send email
-        mail.send(msg)
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        mail_id = enqueue_mail(
+            cursor,
+            "contact",
+            [MAIL_RECIPIENT],  # replace with env with client's email on deployment or demo user
+            subject,
+            body,
+            sender=MAIL_USERNAME,
+            reply_to=email or None,
+        )
+        conn.commit()
+        cursor.close()
+        conn.close()
+        mail_sender.wake()
+
+        return (
+            jsonify(
+                {"status": "success", "message": "Message received!", "mail_id": mail_id}
+            ),
+            202,
+        )
 
+    except Exception as e:
+        app.logger.error(f"Error queueing contact email: {str(e)}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@app.route("/api/mail-queue-stats", methods=["GET"])
+@login_required
+@admin_required
+def mail_queue_stats():
+    """Returns mail_outbox counts by status and this worker's sender counters"""
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            SELECT status, COUNT(*) AS count,
+                   EXTRACT(EPOCH FROM CURRENT_TIMESTAMP - MIN(created_at)) AS oldest_seconds
+            FROM mail_outbox
+            GROUP BY status
+            """
+        )
+        outbox = {
+            row["status"]: {
+                "count": row["count"],
+                "oldest_seconds": round(float(row["oldest_seconds"]), 1),
+            }
+            for row in cursor.fetchall()
+        }
+        cursor.close()
+        conn.close()
         return (
-            jsonify({"status": "success", "message": "Email sent successfully!"}),
+            jsonify(
+                {
+                    "status": "success",
+                    "pid": os.getpid(),
+                    "outbox": outbox,
+                    "sender": mail_sender.stats(),
+                }
+            ),
             200,
         )
-
     except Exception as e:
-        # Log the error (in a production environment, use a proper logging system)
-        print(f"Error sending email: {str(e)}")
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
+_twilio_client = None
+_twilio_client_pid = None
+
+
+def get_twilio_client():
+    """Returns this worker's Twilio client, which sends through the pooled outbound session"""
+    global _twilio_client, _twilio_client_pid
+    if _twilio_client is None or _twilio_client_pid != os.getpid():
+        client = Client(
+            TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, http_client=twilio_http_client()
+        )
+        if TWILIO_API_BASE:
+            client.api.base_url = TWILIO_API_BASE
+        _twilio_client, _twilio_client_pid = client, os.getpid()
+    return _twilio_client
+
+
+def send_twilio_sms(to_number, body):
+    """Sends one SMS from the shop's number and returns the Twilio message SID"""
+    with track_dependency("twilio", "messages.create"):
+        message = get_twilio_client().messages.create(
+            body=body, from_=TWILIO_PHONE_NUMBER, to=to_number
+        )
+    return message.sid
+
+
 @app.route("/api/send-sms", methods=["POST"])
 @login_required
 @admin_required
 def send_sms():
-    TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID")
-    TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
-    TWILIO_PHONE_NUMBER = os.getenv("TWILIO_PHONE_NUMBER")
-
     # Get JSON data from request
     data = request.get_json()
 
@@ -2143,17 +3395,11 @@ def send_sms():
     to_number = data["to"]
     message_body = data["message"]
 
-    # Initialize Twilio client
     try:
-        client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
-
-        # Send message
-        message = client.messages.create(
-            body=message_body, from_=TWILIO_PHONE_NUMBER, to=to_number
-        )
+        message_sid = send_twilio_sms(to_number, message_body)
 
         # Return success response with message SID
-        return jsonify({"success": True, "message_sid": message.sid}), 200
+        return jsonify({"success": True, "message_sid": message_sid}), 200
 
     except TwilioRestException as e:
         # Handle Twilio-specific errors
@@ -2168,6 +3414,283 @@ def send_sms():
         )
 
 
+sms_dispatcher = sms_dispatcher_from_env(open_db_connection, send_twilio_sms)
+
+SMS_BULK_MAX_RECIPIENTS = int(os.getenv("SMS_BULK_MAX_RECIPIENTS", "5000"))
+SMS_INVOICE_STATUSES = ("unpaid", "overdue", "paid")
+
+# Stores a bulk SMS job and all of its rendered messages in one statement
+CREATE_SMS_JOB_SQL = """
+    WITH new_job AS (
+        INSERT INTO sms_jobs (created_by, template, total)
+        VALUES (%(created_by)s, %(template)s, %(total)s)
+        RETURNING job_id
+    ),
+    new_messages AS (
+        INSERT INTO sms_messages (job_id, user_id, invoice_id, to_number, body)
+        SELECT j.job_id, m.user_id, m.invoice_id, m.to_number, m.body
+        FROM new_job j
+        CROSS JOIN json_to_recordset(%(messages)s) AS m(
+            user_id INTEGER, invoice_id INTEGER, to_number TEXT, body TEXT
+        )
+        RETURNING message_id
+    )
+    SELECT job_id, (SELECT COUNT(*) FROM new_messages) AS total FROM new_job;
+"""
+
+
+def parse_invoice_filter(invoice_filter):
+    """Checks a bulk SMS invoice_filter; returns ((statuses, invoice_ids, due_before), None) or (None, message)"""
+    statuses = invoice_filter.get("statuses") or ["unpaid", "overdue"]
+    if not isinstance(statuses, list) or not all(s in SMS_INVOICE_STATUSES for s in statuses):
+        return None, f"'statuses' must be a list of: {', '.join(SMS_INVOICE_STATUSES)}"
+    invoice_ids = invoice_filter.get("invoice_ids")
+    if invoice_ids is not None and (
+        not isinstance(invoice_ids, list)
+        or not all(isinstance(i, int) and not isinstance(i, bool) for i in invoice_ids)
+    ):
+        return None, "'invoice_ids' must be a list of integers"
+    due_before = invoice_filter.get("due_before")
+    if due_before is not None:
+        try:
+            due_before = date.fromisoformat(due_before)
+        except (TypeError, ValueError):
+            return None, "'due_before' must be an ISO date (YYYY-MM-DD)"
+    return (statuses, invoice_ids, due_before), None
+
+
+def unpaid_invoice_recipients(cursor, statuses, invoice_ids, due_before):
+    """Returns template values for every invoice matching the admin's (checked) filter"""
+    cursor.execute(
+        """
+        SELECT u.user_id, u.first_name, u.last_name, u.phone,
+               i.invoice_id, i.invoice_number, i.total_amount, i.due_date
+        FROM invoices i
+        JOIN users u ON u.user_id = i.user_id
+        WHERE i.status = ANY(%s)
+          AND COALESCE(u.phone, '') <> ''
+          AND (%s::date IS NULL OR i.due_date < %s::date)
+          AND (%s::int[] IS NULL OR i.invoice_id = ANY(%s::int[]))
+        ORDER BY i.due_date, i.invoice_id
+        LIMIT %s
+        """,
+        (statuses, due_before, due_before, invoice_ids, invoice_ids, SMS_BULK_MAX_RECIPIENTS + 1),
+    )
+    recipients = []
+    for row in cursor.fetchall():
+        recipients.append(
+            {
+                "to": row["phone"],
+                "user_id": row["user_id"],
+                "invoice_id": row["invoice_id"],
+                "first_name": row["first_name"],
+                "last_name": row["last_name"],
+                "name": f"{row['first_name'] or ''} {row['last_name'] or ''}".strip(),
+                "invoice_number": row["invoice_number"],
+                "total_amount": f"{row['total_amount']:.2f}",
+                "due_date": row["due_date"].strftime("%b %d, %Y") if row["due_date"] else "",
+            }
+        )
+    return recipients
+
+
+@app.route("/api/send-sms/bulk", methods=["POST"])
+@login_required
+@admin_required
+def send_bulk_sms():
+    """Queues one templated SMS per recipient and returns a job id to poll"""
+    data = request.get_json(silent=True) or {}
+    template = data.get("template")
+    if not isinstance(template, str) or not template.strip():
+        return jsonify({"status": "error", "message": "'template' is required"}), 400
+    if ("recipients" in data) == ("invoice_filter" in data):
+        return (
+            jsonify(
+                {
+                    "status": "error",
+                    "message": "Provide exactly one of 'recipients' or 'invoice_filter'",
+                }
+            ),
+            400,
+        )
+    try:
+        check_template(template)
+    except InvalidTemplate as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    recipients = data.get("recipients")
+    if recipients is not None and (
+        not isinstance(recipients, list)
+        or not all(
+            isinstance(r, dict) and isinstance(r.get("to"), str) and r["to"].strip()
+            for r in recipients
+        )
+    ):
+        return (
+            jsonify(
+                {
+                    "status": "error",
+                    "message": "'recipients' must be a list of objects with a 'to' number",
+                }
+            ),
+            400,
+        )
+    if recipients is None and not isinstance(data.get("invoice_filter"), dict):
+        return (
+            jsonify({"status": "error", "message": "'invoice_filter' must be an object"}),
+            400,
+        )
+    if recipients is None:
+        invoice_filter, message = parse_invoice_filter(data["invoice_filter"])
+        if message:
+            return jsonify({"status": "error", "message": message}), 400
+
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        if recipients is None:
+            recipients = unpaid_invoice_recipients(cursor, *invoice_filter)
+
+        if not recipients:
+            return jsonify({"status": "error", "message": "No recipients matched"}), 400
+        if len(recipients) > SMS_BULK_MAX_RECIPIENTS:
+            return (
+                jsonify(
+                    {
+                        "status": "error",
+                        "message": f"At most {SMS_BULK_MAX_RECIPIENTS} recipients per job",
+                    }
+                ),
+                400,
+            )
+
+        messages = [
+            {
+                "user_id": r.get("user_id"),
+                "invoice_id": r.get("invoice_id"),
+                "to_number": r["to"].strip(),
+                "body": render_template(
+                    template, {k: r.get(k) for k in TEMPLATE_FIELDS}
+                ),
+            }
+            for r in recipients
+        ]
+        cursor.execute(
+            CREATE_SMS_JOB_SQL,
+            {
+                "created_by": current_user.id,
+                "template": template,
+                "total": len(messages),
+                "messages": Json(messages),
+            },
+        )
+        job = cursor.fetchone()
+        conn.commit()
+        cursor.close()
+        conn.close()
+
+        sms_dispatcher.start(job["job_id"])
+        return (
+            jsonify({"status": "success", "job_id": job["job_id"], "total": job["total"]}),
+            202,
+        )
+
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@app.route("/api/sms-jobs/<int:job_id>", methods=["GET"])
+@login_required
+@admin_required
+def get_sms_job(job_id):
+    """Returns a bulk SMS job's progress and a page of its messages (?status= filters)"""
+    try:
+        limit, after = page_params(request.args, ("id",))
+    except InvalidPageRequest as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    status_filter = request.args.get("status")
+    if status_filter not in (None, "queued", "sent", "failed"):
+        return jsonify({"status": "error", "message": "Invalid status filter"}), 400
+
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            SELECT job_id, created_by, template, status, total,
+                   created_at, started_at, heartbeat_at, finished_at
+            FROM sms_jobs WHERE job_id = %s
+            """,
+            (job_id,),
+        )
+        job = cursor.fetchone()
+        if not job:
+            cursor.close()
+            conn.close()
+            return jsonify({"status": "error", "message": "Job not found"}), 404
+
+        cursor.execute(
+            "SELECT status, COUNT(*) AS count FROM sms_messages WHERE job_id = %s GROUP BY status",
+            (job_id,),
+        )
+        counts = {"queued": 0, "sent": 0, "failed": 0}
+        counts.update({row["status"]: row["count"] for row in cursor.fetchall()})
+
+        cursor.execute(
+            """
+            SELECT message_id, user_id, invoice_id, to_number, body, status,
+                   attempts, twilio_sid, error, sent_at
+            FROM sms_messages
+            WHERE job_id = %s AND (%s::text IS NULL OR status = %s) AND message_id > %s
+            ORDER BY message_id
+            LIMIT %s
+            """,
+            (job_id, status_filter, status_filter, after[0] if after else 0, limit + 1),
+        )
+        messages, next_cursor = paginate(
+            cursor.fetchall(), limit, lambda m: [m["message_id"]]
+        )
+        cursor.close()
+        conn.close()
+
+        job["counts"] = counts
+        job["done"] = job["status"] == "completed"
+        return (
+            jsonify(
+                {
+                    "status": "success",
+                    "job": job,
+                    "messages": messages,
+                    "next_cursor": next_cursor,
+                }
+            ),
+            200,
+        )
+
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@app.route("/api/sms-jobs/<int:job_id>/resume", methods=["POST"])
+@login_required
+@admin_required
+def resume_sms_job(job_id):
+    """Restarts a job whose worker stopped heartbeating; sent messages are not resent"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT 1 FROM sms_jobs WHERE job_id = %s", (job_id,))
+        if cursor.fetchone() is None:
+            return jsonify({"status": "error", "message": "SMS job not found"}), 404
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+    finally:
+        cursor.close()
+        conn.close()
+    sms_dispatcher.start(job_id)
+    return jsonify({"status": "success", "job_id": job_id}), 202
+
+
 @app.route("/api/get-vehicles/<int:user_id>", methods=["GET"])
 def get_user_vehicles(user_id):
     try:
@@ -2192,7 +3715,7 @@ def get_vehicle_photos(vehicle_id):
         cursor = conn.cursor()
         cursor.execute(
             """
-            SELECT media_id, file_url, title, description 
+            SELECT media_id, file_url, thumbnail_url, variants, title, description
             FROM media 
             WHERE vehicle_id = %s
             ORDER BY upload_date DESC
@@ -2207,20 +3730,13 @@ def get_vehicle_photos(vehicle_id):
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
-# Active jobs endpoint
-@app.route("/api/active-jobs", methods=["GET"])
-@login_required
-@admin_required
-def get_active_jobs():
-    """
-    Returns all vehicles marked as Waiting or Active,
-    along with their owner’s info.
-    """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    cursor.execute(
-        """
+def active_jobs_section(cursor, args):
+    """One page of vehicles marked as Waiting or Active, with their owner's info"""
+    limit, after = page_params(args, ("text", "id"))
+    after_sql, after_params = keyset_after(
+        "v.license_plate", "v.vehicle_id", after, nullable=True
+    )
+    page_sql = f"""
         SELECT
           v.vehicle_id,
           v.license_plate,
@@ -2233,14 +3749,31 @@ def get_active_jobs():
           u.email
         FROM vehicles v
         JOIN users u ON v.user_id = u.user_id
-        WHERE v.vehicle_status IN ('Waiting', 'Active')
-        ORDER BY v.license_plate;
+        WHERE v.vehicle_status IN ('Waiting', 'Active') AND {after_sql}
+        ORDER BY v.license_plate, v.vehicle_id
+        LIMIT %s
     """
-    )
+    params = (*after_params, limit + 1)
+    if PG_JSON_RESPONSES:
+        active_jobs, next_cursor = json_page(
+            cursor,
+            page_sql,
+            params,
+            limit,
+            order_by="license_plate, vehicle_id",
+            key="license_plate, vehicle_id",
+            doc=f"""json_build_object(
+                'vehicle_id', vehicle_id, 'license_plate', license_plate,
+                'make', make, 'model', model, 'year', year,
+                'owner', json_build_object('user_id', user_id, 'full_name', {FULL_NAME_SQL}, 'email', email)
+            )""",
+        )
+        return {"active_jobs": active_jobs, "next_cursor": next_cursor}
 
-    rows = cursor.fetchall()
-    cursor.close()
-    conn.close()
+    cursor.execute(page_sql, params)
+    rows, next_cursor = paginate(
+        cursor.fetchall(), limit, lambda r: [r["license_plate"], r["vehicle_id"]]
+    )
 
     active_jobs = []
     for r in rows:
@@ -2260,8 +3793,119 @@ def get_active_jobs():
                 },
             }
         )
+    return {"active_jobs": active_jobs, "next_cursor": next_cursor}
 
-    return jsonify({"status": "success", "active_jobs": active_jobs}), 200
+
+# Active jobs endpoint
+@app.route("/api/active-jobs", methods=["GET"])
+@login_required
+@admin_required
+def get_active_jobs():
+    """
+    Returns a page of vehicles marked as Waiting or Active,
+    along with their owner’s info.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        return json_response({"status": "success", **active_jobs_section(cursor, request.args)})
+    except InvalidPageRequest as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def unpaid_invoices_section(cursor, args):
+    """One page of invoices with 'unpaid' or 'overdue' status, including user details"""
+    limit, after = page_params(args, ("datetime", "id"))
+    after_sql, after_params = keyset_after(
+        "i.due_date", "i.invoice_id", after, nullable=True
+    )
+    page_sql = f"""
+        SELECT
+            i.invoice_id,
+            i.invoice_number,
+            i.total_amount,
+            i.status,
+            i.due_date,
+            i.issue_date,
+            u.user_id,
+            u.first_name,
+            u.last_name,
+            u.email,
+            u.phone,
+            v.make,
+            v.model,
+            v.year,
+            v.license_plate
+        FROM invoices i
+        JOIN users u ON i.user_id = u.user_id
+        LEFT JOIN vehicles v ON i.vehicle_id = v.vehicle_id  -- Optional: Join vehicle info if needed for context
+        WHERE i.status IN ('unpaid', 'overdue') AND {after_sql}
+        ORDER BY i.due_date ASC, i.invoice_id
+        LIMIT %s
+    """
+    params = (*after_params, limit + 1)
+    if PG_JSON_RESPONSES:
+        unpaid_invoices, next_cursor = json_page(
+            cursor,
+            page_sql,
+            params,
+            limit,
+            order_by="due_date, invoice_id",
+            key="due_date, invoice_id",
+            doc=f"""json_build_object(
+                'invoice_id', invoice_id, 'invoice_number', invoice_number,
+                'total_amount', total_amount, 'status', status,
+                'due_date', due_date, 'issue_date', issue_date,
+                'user_id', user_id, 'user_full_name', {FULL_NAME_SQL},
+                'user_email', email, 'user_phone', phone,
+                'vehicle_description', CASE WHEN make IS NULL THEN 'N/A' ELSE
+                    btrim(concat(year, ' ', make, ' ', model, ' (', COALESCE(license_plate, 'N/A'), ')'))
+                END
+            )""",
+        )
+        return {"unpaid_invoices": unpaid_invoices, "next_cursor": next_cursor}
+
+    cursor.execute(page_sql, params)
+    invoices_data, next_cursor = paginate(
+        cursor.fetchall(), limit, lambda i: [i["due_date"], i["invoice_id"]]
+    )
+
+    # Format data slightly for easier frontend use
+    unpaid_invoices = []
+    for inv in invoices_data:
+        full_name = (
+            f"{inv.get('first_name', '')} {inv.get('last_name', '')}".strip()
+        )
+        vehicle_desc = (
+            f"{inv.get('year', '')} {inv.get('make', '')} {inv.get('model', '')} ({inv.get('license_plate', 'N/A')})".strip()
+            if inv.get("make")
+            else "N/A"
+        )
+        unpaid_invoices.append(
+            {
+                "invoice_id": inv["invoice_id"],
+                "invoice_number": inv["invoice_number"],
+                "total_amount": float(
+                    inv["total_amount"]
+                ),  # Ensure it's float for display
+                "status": inv["status"],
+                "due_date": (
+                    inv["due_date"].isoformat() if inv["due_date"] else None
+                ),  # Format date
+                "issue_date": (
+                    inv["issue_date"].isoformat() if inv["issue_date"] else None
+                ),
+                "user_id": inv["user_id"],
+                "user_full_name": full_name or inv["email"],
+                "user_email": inv["email"],
+                "user_phone": inv["phone"],  # Crucial for SMS
+                "vehicle_description": vehicle_desc,
+            }
+        )
+    return {"unpaid_invoices": unpaid_invoices, "next_cursor": next_cursor}
 
 
 # Unpaid Invoices Endpoint
@@ -2269,75 +3913,16 @@ def get_active_jobs():
 @login_required
 @admin_required
 def get_unpaid_invoices():
-    """Retrieves all invoices with 'unpaid' or 'overdue' status, including user details."""
+    """Retrieves a page of invoices with 'unpaid' or 'overdue' status, including user details."""
     conn = None
     cursor = None
     try:
         conn = get_db_connection()
         cursor = conn.cursor()  # Assumes RealDictCursor
+        return json_response({"status": "success", **unpaid_invoices_section(cursor, request.args)})
 
-        cursor.execute(
-            """
-            SELECT
-                i.invoice_id,
-                i.invoice_number,
-                i.total_amount,
-                i.status,
-                i.due_date,
-                i.issue_date,
-                u.user_id,
-                u.first_name,
-                u.last_name,
-                u.email,
-                u.phone,
-                v.make,
-                v.model,
-                v.year,
-                v.license_plate
-            FROM invoices i
-            JOIN users u ON i.user_id = u.user_id
-            LEFT JOIN vehicles v ON i.vehicle_id = v.vehicle_id  -- Optional: Join vehicle info if needed for context
-            WHERE i.status IN ('unpaid', 'overdue')
-            ORDER BY i.due_date ASC, i.user_id;
-        """
-        )
-        invoices_data = cursor.fetchall()
-
-        # Format data slightly for easier frontend use
-        unpaid_invoices = []
-        for inv in invoices_data:
-            full_name = (
-                f"{inv.get('first_name', '')} {inv.get('last_name', '')}".strip()
-            )
-            vehicle_desc = (
-                f"{inv.get('year', '')} {inv.get('make', '')} {inv.get('model', '')} ({inv.get('license_plate', 'N/A')})".strip()
-                if inv.get("make")
-                else "N/A"
-            )
-            unpaid_invoices.append(
-                {
-                    "invoice_id": inv["invoice_id"],
-                    "invoice_number": inv["invoice_number"],
-                    "total_amount": float(
-                        inv["total_amount"]
-                    ),  # Ensure it's float for display
-                    "status": inv["status"],
-                    "due_date": (
-                        inv["due_date"].isoformat() if inv["due_date"] else None
-                    ),  # Format date
-                    "issue_date": (
-                        inv["issue_date"].isoformat() if inv["issue_date"] else None
-                    ),
-                    "user_id": inv["user_id"],
-                    "user_full_name": full_name or inv["email"],
-                    "user_email": inv["email"],
-                    "user_phone": inv["phone"],  # Crucial for SMS
-                    "vehicle_description": vehicle_desc,
-                }
-            )
-
-        return jsonify({"status": "success", "unpaid_invoices": unpaid_invoices}), 200
-
+    except InvalidPageRequest as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
     except psycopg2.Error as db_err:
         app.logger.error(f"Database error fetching unpaid invoices: {db_err}")
         return jsonify({"status": "error", "message": "Database error occurred."}), 500
@@ -2351,6 +3936,216 @@ def get_unpaid_invoices():
             conn.close()
 
 
+# ADMIN BOOTSTRAP
+# Section threads per worker process; each holds one pooled connection while it
+# runs, so the pool is capped at half the DB pool to leave room for other requests
+ADMIN_BOOTSTRAP_WORKERS = int(os.getenv("ADMIN_BOOTSTRAP_WORKERS", "4"))
+_admin_bootstrap_pool = None
+_admin_bootstrap_pool_pid = None
+_admin_bootstrap_pool_lock = threading.Lock()
+
+
+def vehicles_by_user_section(cursor, args):
+    """
+    Vehicles grouped by owner: for args["user_ids"] if given, otherwise for
+    the page of users that users_section returns with the same ?limit= and ?cursor=.
+    """
+    user_ids = args.get("user_ids")
+    if user_ids:
+        cursor.execute(
+            "SELECT * FROM vehicles WHERE user_id = ANY(%s) ORDER BY user_id, vehicle_id",
+            (user_ids,),
+        )
+    else:
+        limit, after = page_params(args, ("id",))
+        cursor.execute(
+            """
+            SELECT v.* FROM vehicles v
+            WHERE v.user_id IN (
+                SELECT user_id FROM users WHERE user_id > %s ORDER BY user_id LIMIT %s
+            )
+            ORDER BY v.user_id, v.vehicle_id
+            """,
+            (after[0] if after else 0, limit),
+        )
+    vehicles_by_user = {user_id: [] for user_id in user_ids or ()}
+    for vehicle in cursor.fetchall():
+        vehicles_by_user.setdefault(vehicle["user_id"], []).append(vehicle)
+    return {"vehicles_by_user": vehicles_by_user}
+
+
+# section name -> loader(cursor, args); each runs on its own pooled connection
+ADMIN_BOOTSTRAP_SECTIONS = {
+    "users": users_section,
+    "active_jobs": active_jobs_section,
+    "unpaid_invoices": unpaid_invoices_section,
+    "vehicles": vehicles_by_user_section,
+}
+
+
+def admin_bootstrap_executor():
+    """Returns this worker process's section thread pool, creating it on first use"""
+    global _admin_bootstrap_pool, _admin_bootstrap_pool_pid
+    # Threads don't survive a gunicorn fork, so key the pool by pid like the DB pool
+    if _admin_bootstrap_pool is None or _admin_bootstrap_pool_pid != os.getpid():
+        with _admin_bootstrap_pool_lock:
+            if _admin_bootstrap_pool is None or _admin_bootstrap_pool_pid != os.getpid():
+                workers = min(ADMIN_BOOTSTRAP_WORKERS, max(1, get_db_pool().max_size // 2))
+                _admin_bootstrap_pool = ThreadPoolExecutor(workers, thread_name_prefix="admin-bootstrap")
+                _admin_bootstrap_pool_pid = os.getpid()
+    return _admin_bootstrap_pool
+
+
+def load_section_on_pooled_connection(loader, args, stats):
+    """Runs one section loader on a connection borrowed for just this call, recording into stats"""
+    pool = get_db_pool()
+    conn = pool.getconn()
+    conn.recorder = stats
+    broken = False
+    try:
+        with conn.cursor() as cursor:
+            return loader(cursor, args)
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        broken = True
+        raise
+    finally:
+        conn.recorder = None
+        pool.putconn(conn, discard=broken)
+
+
+@app.route("/api/admin/bootstrap", methods=["GET"])
+@login_required
+@admin_required
+def admin_bootstrap():
+    """
+    Everything the admin console loads up front, in one request.
+
+    ?sections=users,vehicles picks sections (default: all of
+    ADMIN_BOOTSTRAP_SECTIONS); ?limit= sizes the paged ones. ?cursor= (the
+    users section's next_cursor) pages through users; the vehicles section
+    covers ?user_ids=1,2,3, or else the users on that same users page.
+    Sections run concurrently, each on its own pooled connection, so the
+    response takes as long as the slowest one; unlike /api/dashboard they
+    don't share a snapshot. The request itself holds no connection while it
+    waits, and the section threads are shared by all bootstraps in the
+    worker. So concurrent bootstraps queue for a thread instead of draining
+    the pool and then waiting on each other's connections.
+    """
+    names, error = requested_sections(ADMIN_BOOTSTRAP_SECTIONS)
+    if error:
+        return error
+    limit = request.args.get("limit")
+    users_cursor = request.args.get("cursor")
+    try:
+        page_params({"cursor": users_cursor}, ("id",))
+    except InvalidPageRequest as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    # The cursor belongs to the users page; the other paged sections start at their first page
+    section_args = {
+        name: {"limit": limit, "cursor": users_cursor if name in ("users", "vehicles") else None}
+        for name in names
+    }
+    raw_user_ids = request.args.get("user_ids")
+    if raw_user_ids:
+        try:
+            user_ids = sorted({int(u) for u in raw_user_ids.split(",") if u.strip()})
+        except ValueError:
+            return jsonify({"status": "error", "message": "'user_ids' must be comma-separated integers"}), 400
+        if len(user_ids) > MAX_PAGE_LIMIT:
+            return (
+                jsonify({"status": "error", "message": f"At most {MAX_PAGE_LIMIT} user_ids per request"}),
+                400,
+            )
+        for args in section_args.values():
+            args["user_ids"] = user_ids
+
+    # Sections record their statements separately, since QueryStats isn't
+    # thread-safe; they're folded into the request's stats once finished
+    release_db_connection()  # load_user may have borrowed one for this request
+    section_stats = {name: QueryStats() for name in names}
+    futures = {
+        name: admin_bootstrap_executor().submit(
+            load_section_on_pooled_connection,
+            ADMIN_BOOTSTRAP_SECTIONS[name],
+            section_args[name],
+            section_stats[name],
+        )
+        for name in names
+    }
+    payload = {"status": "success"}
+    try:
+        for name, future in futures.items():
+            payload[name] = future.result()
+        return json_response(payload)
+    except Exception as e:
+        app.logger.error(f"Error loading admin bootstrap: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+    finally:
+        wait(futures.values())
+        stats = request_query_stats()
+        for name in futures:
+            stats.merge(section_stats[name])
+
+
+# ADMIN EXPORTS
+
+
+@app.route("/api/export/<dataset>", methods=["GET"])
+@login_required
+@admin_required
+def export_dataset(dataset):
+    """
+    Streams a full dataset (users, vehicles, invoices or payments) as NDJSON or CSV.
+    Optional query params: format=ndjson|csv, from/to (ISO dates), status.
+    """
+    if dataset not in EXPORT_DATASETS:
+        return jsonify({"status": "error", "message": "Unknown export dataset"}), 404
+
+    fmt = request.args.get("format", "ndjson").lower()
+    if fmt not in EXPORT_FORMATS:
+        return (
+            jsonify({"status": "error", "message": "format must be ndjson or csv"}),
+            400,
+        )
+
+    try:
+        date_from = request.args.get("from")
+        date_to = request.args.get("to")
+        date_from = datetime.fromisoformat(date_from) if date_from else None
+        date_to = datetime.fromisoformat(date_to) if date_to else None
+    except ValueError:
+        return (
+            jsonify({"status": "error", "message": "from/to must be ISO 8601 dates"}),
+            400,
+        )
+
+    status = request.args.get("status") or None
+    if status and EXPORT_DATASETS[dataset]["status_column"] is None:
+        return (
+            jsonify(
+                {
+                    "status": "error",
+                    "message": f"The {dataset} export does not support a status filter",
+                }
+            ),
+            400,
+        )
+
+    conn = get_db_connection()
+    conn.rollback()  # Start a fresh transaction for the server-side cursor
+    filename = f"{dataset}-{datetime.now():%Y%m%d-%H%M%S}.{fmt}"
+
+    # stream_with_context keeps the request (and its pooled connection) alive until
+    # the last chunk is sent; teardown then returns the connection as usual
+    return Response(
+        stream_with_context(
+            stream_export(conn, dataset, fmt, date_from, date_to, status)
+        ),
+        mimetype=EXPORT_FORMATS[fmt],
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
+
+
 # APPLICATION ENTRY POINT
 
 if __name__ == "__main__":
@@ -0,0 +1 @@
+"""Benchmarks and stress tests for the Express Auto API (run from backend/ with python -m)"""
@@ -0,0 +1,96 @@
+"""
+Exercise /api/send-sms/bulk against the local Twilio stand-in.
+
+Sends an unpaid-invoice reminder for --messages seeded invoices through the
+real endpoint and dispatcher. The fake Twilio enforces --twilio-limit
+messages per second with 429s and rejects --fail of the numbers as invalid.
+The output shows whether the dispatcher held its SMS_RATE_PER_SECOND budget,
+retried the 429s, and recorded a SID or an error for every message.
+
+Usage (from backend/, after `python -m benchmarks.seed`):
+    python -m benchmarks.bulk_sms --messages 200 --rate 20 --twilio-limit 20
+"""
+
+import argparse
+import os
+import time
+
+from benchmarks.fakes import FakeServices
+from benchmarks.seed import ADMIN_EMAIL, BENCH_PASSWORD
+from migrate import connect
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--rate", type=float, default=20, help="SMS_RATE_PER_SECOND for the app")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--twilio-limit", type=int, default=25, help="fake Twilio messages/second")
+    parser.add_argument("--fail", type=int, default=3, help="numbers the fake rejects as invalid")
+    parser.add_argument("--twilio-latency", type=float, default=150)
+    args = parser.parse_args()
+
+    conn = connect()
+    with conn.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT i.invoice_id, u.phone FROM invoices i JOIN users u ON u.user_id = i.user_id
+            WHERE i.invoice_number LIKE 'BN-%%' AND i.status = 'unpaid'
+            ORDER BY i.invoice_id LIMIT %s
+            """,
+            (args.messages,),
+        )
+        rows = cursor.fetchall()
+    conn.close()
+    if not rows:
+        raise SystemExit("No seeded unpaid invoices; run `python -m benchmarks.seed` first")
+    invoice_ids = [row["invoice_id"] for row in rows]
+    fail_numbers = {row["phone"] for row in rows[: args.fail]}
+
+    with FakeServices(
+        {"twilio": args.twilio_latency},
+        fail_numbers=fail_numbers,
+        twilio_rate_limit=args.twilio_limit,
+    ) as fakes:
+        os.environ.update(fakes.env())
+        os.environ["SMS_RATE_PER_SECOND"] = str(args.rate)
+        os.environ["SMS_BULK_CONCURRENCY"] = str(args.concurrency)
+        from app import app  # reads the environment at import
+
+        client = app.test_client()
+        client.post("/api/login", json={"email": ADMIN_EMAIL, "password": BENCH_PASSWORD})
+
+        started = time.perf_counter()
+        response = client.post(
+            "/api/send-sms/bulk",
+            json={
+                "template": "Hi {first_name}, invoice {invoice_number} for ${total_amount} "
+                "was due {due_date}. Reply STOP to opt out.",
+                "invoice_filter": {"invoice_ids": invoice_ids},
+            },
+        )
+        accepted = time.perf_counter() - started
+        if response.status_code != 202:
+            raise SystemExit(f"Bulk send rejected: {response.status_code} {response.get_json()}")
+        job_id = response.get_json()["job_id"]
+
+        while True:
+            job = client.get(f"/api/sms-jobs/{job_id}?limit=1").get_json()["job"]
+            if job["done"]:
+                break
+            time.sleep(0.2)
+        elapsed = time.perf_counter() - started
+        failures = client.get(f"/api/sms-jobs/{job_id}?status=failed").get_json()["messages"]
+        twilio = fakes.servers["twilio"]
+
+    counts = job["counts"]
+    print(f"job {job_id}: {job['total']} messages accepted in {accepted * 1000:.0f}ms")
+    print(f"sent {counts['sent']}, failed {counts['failed']}, still queued {counts['queued']}")
+    print(f"finished in {elapsed:.2f}s -> {counts['sent'] / elapsed:.1f} msg/s (budget {args.rate}/s)")
+    print(f"fake Twilio: {twilio.calls} calls, {twilio.rejected} answered 429")
+    for message in failures[:5]:
+        print(f"  failed {message['to_number']}: {message['error']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,491 @@
+"""
+Local stand-ins for every external service the API calls.
+
+Each fake is a small threaded server on 127.0.0.1 with a configurable
+per-request latency, so benchmarks exercise the app's real client code paths
+(boto3, stripe, twilio, requests, Flask-Mail) without leaving the machine:
+
+    s3        - path-style S3: PUT/GET (with Range)/HEAD/DELETE object, multipart uploads,
+                browser POST uploads (policy conditions enforced, signature not checked),
+                multi-object delete, ListObjectsV2
+    stripe    - POST /v1/payment_intents
+    twilio    - POST /2010-04-01/Accounts/<sid>/Messages.json, with an optional 429 rate limit
+    places    - Google Places details JSON with a handful of reviews
+    hcaptcha  - siteverify that always succeeds
+    smtp      - plain SMTP that accepts and discards every message
+
+FakeServices.env() returns the environment variables that point app.py at them.
+"""
+
+import base64
+import hashlib
+import json
+import re
+import socketserver
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timezone
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from xml.sax.saxutils import escape
+
+DEFAULT_LATENCY_MS = {
+    "s3": 30,
+    "stripe": 250,
+    "twilio": 150,
+    "places": 300,
+    "hcaptcha": 120,
+    "smtp": 80,
+}
+
+
+class _FakeHandler(BaseHTTPRequestHandler):
+    """Base handler: applies the service latency and silences request logging"""
+
+    protocol_version = "HTTP/1.1"
+    service = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _delay(self):
+        time.sleep(self.server.latency_ms / 1000.0)
+        with self.server.lock:
+            self.server.calls += 1
+
+    def _read_body(self):
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().split(b";")[0].strip() or b"0", 16)
+                if size == 0:
+                    # Consume trailers (botocore may send checksum trailers) up to the blank line
+                    while self.rfile.readline() not in (b"\r\n", b"\n", b""):
+                        pass
+                    break
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+            return b"".join(chunks)
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _send(self, status, body=b"", content_type="application/json", headers=None):
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode()
+        elif isinstance(body, str):
+            body = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+
+class FakeS3Handler(_FakeHandler):
+    def _split(self):
+        parsed = urlparse(self.path)
+        parts = parsed.path.lstrip("/").split("/", 1)
+        bucket = parts[0]
+        key = parts[1] if len(parts) > 1 else ""
+        return bucket, key, parse_qs(parsed.query, keep_blank_values=True)
+
+    def do_PUT(self):
+        body = self._read_body()
+        self._delay()
+        bucket, key, query = self._split()
+        if "uploadId" in query:
+            etag = '"%s"' % hashlib.md5(body).hexdigest()
+            with self.server.lock:
+                parts = self.server.uploads.get(query["uploadId"][0])
+                if parts is None:
+                    return self._send(404, "<Error><Code>NoSuchUpload</Code></Error>", "application/xml")
+                parts[int(query["partNumber"][0])] = body
+            return self._send(200, b"", headers={"ETag": etag})
+        etag = '"%s"' % hashlib.md5(body).hexdigest()
+        with self.server.lock:
+            self.server.objects[(bucket, key)] = (body, self.headers.get("Content-Type"), etag)
+        self._send(200, b"", headers={"ETag": etag})
+
+    def do_GET(self):
+        self._delay()
+        bucket, key, query = self._split()
+        if not key:
+            return self._list_objects(bucket, query)
+        with self.server.lock:
+            obj = self.server.objects.get((bucket, key))
+        if obj is None:
+            return self._send(404, "<Error><Code>NoSuchKey</Code></Error>", "application/xml")
+        body, content_type, etag = obj
+        headers = {"ETag": etag}
+        match = re.match(r"bytes=(\d+)-(\d*)$", self.headers.get("Range", ""))
+        if match and body:
+            start = int(match.group(1))
+            end = min(int(match.group(2) or len(body) - 1), len(body) - 1)
+            headers["Content-Range"] = f"bytes {start}-{end}/{len(body)}"
+            return self._send(206, body[start : end + 1], content_type or "application/octet-stream", headers)
+        self._send(200, body, content_type or "application/octet-stream", headers)
+
+    do_HEAD = do_GET
+
+    def do_DELETE(self):
+        self._delay()
+        bucket, key, query = self._split()
+        with self.server.lock:
+            if "uploadId" in query:
+                self.server.uploads.pop(query["uploadId"][0], None)
+            else:
+                self.server.objects.pop((bucket, key), None)
+        self._send(204, b"", "application/xml")
+
+    def do_POST(self):
+        body = self._read_body()
+        self._delay()
+        bucket, key, query = self._split()
+        if self.headers.get("Content-Type", "").startswith("multipart/form-data"):
+            return self._post_object(bucket, body)
+        if "uploads" in query:
+            return self._create_multipart_upload(bucket, key)
+        if "uploadId" in query:
+            return self._complete_multipart_upload(bucket, key, query["uploadId"][0])
+        if "delete" not in query:
+            return self._send(400, "<Error><Code>NotImplemented</Code></Error>", "application/xml")
+        keys = re.findall(r"<Key>(.*?)</Key>", body.decode())
+        with self.server.lock:
+            for key in keys:
+                self.server.objects.pop((bucket, key), None)
+        deleted = "".join(f"<Deleted><Key>{k}</Key></Deleted>" for k in keys)
+        self._send(
+            200,
+            f'<?xml version="1.0" encoding="UTF-8"?><DeleteResult>{deleted}</DeleteResult>',
+            "application/xml",
+        )
+
+    def _create_multipart_upload(self, bucket, key):
+        upload_id = uuid.uuid4().hex
+        with self.server.lock:
+            self.server.uploads[upload_id] = {}
+            self.server.upload_types[upload_id] = self.headers.get("Content-Type")
+        self._send(
+            200,
+            '<?xml version="1.0" encoding="UTF-8"?><InitiateMultipartUploadResult>'
+            f"<Bucket>{bucket}</Bucket><Key>{escape(key)}</Key><UploadId>{upload_id}</UploadId>"
+            "</InitiateMultipartUploadResult>",
+            "application/xml",
+        )
+
+    def _complete_multipart_upload(self, bucket, key, upload_id):
+        with self.server.lock:
+            parts = self.server.uploads.pop(upload_id, None)
+            if parts is None:
+                return self._send(404, "<Error><Code>NoSuchUpload</Code></Error>", "application/xml")
+            data = b"".join(parts[n] for n in sorted(parts))
+            etag = '"%s-%d"' % (hashlib.md5(data).hexdigest(), len(parts))
+            content_type = self.server.upload_types.pop(upload_id, None)
+            self.server.objects[(bucket, key)] = (data, content_type, etag)
+        self._send(
+            200,
+            '<?xml version="1.0" encoding="UTF-8"?><CompleteMultipartUploadResult>'
+            f"<Bucket>{bucket}</Bucket><Key>{escape(key)}</Key><ETag>{etag}</ETag>"
+            "</CompleteMultipartUploadResult>",
+            "application/xml",
+        )
+
+    def _post_object(self, bucket, body):
+        """Presigned POST upload: checks the policy's conditions, then stores the file"""
+        message = BytesParser(policy=HTTP).parsebytes(
+            b"Content-Type: " + self.headers["Content-Type"].encode() + b"\r\n\r\n" + body
+        )
+        fields, data = {}, None
+        for part in message.iter_parts():
+            name = part.get_param("name", header="content-disposition")
+            if name == "file":
+                data = part.get_payload(decode=True) or b""
+            else:
+                fields[name.lower()] = part.get_content().strip()
+        if data is None or "policy" not in fields:
+            return self._send(400, "<Error><Code>InvalidArgument</Code></Error>", "application/xml")
+        policy = json.loads(base64.b64decode(fields["policy"]))
+        expires = datetime.strptime(policy["expiration"], "%Y-%m-%dT%H:%M:%SZ")
+        if expires.replace(tzinfo=timezone.utc) < datetime.now(timezone.utc):
+            return self._send(403, "<Error><Code>AccessDenied</Code></Error>", "application/xml")
+        fields["bucket"] = bucket
+        for condition in policy["conditions"]:
+            if isinstance(condition, dict):
+                ok = all(fields.get(k.lower()) == v for k, v in condition.items())
+            elif condition[0] == "content-length-range":
+                ok = condition[1] <= len(data) <= condition[2]
+            else:  # ["eq" | "starts-with", "$field", value]
+                value = fields.get(condition[1].lstrip("$").lower(), "")
+                ok = value.startswith(condition[2]) if condition[0] == "starts-with" else value == condition[2]
+            if not ok:
+                with self.server.lock:
+                    self.server.rejected += 1
+                return self._send(403, "<Error><Code>AccessDenied</Code></Error>", "application/xml")
+        checksum = fields.get("x-amz-checksum-sha256")
+        if checksum and base64.b64decode(checksum) != hashlib.sha256(data).digest():
+            return self._send(400, "<Error><Code>BadDigest</Code></Error>", "application/xml")
+        etag = '"%s"' % hashlib.md5(data).hexdigest()
+        with self.server.lock:
+            self.server.objects[(bucket, fields["key"])] = (data, fields.get("content-type"), etag)
+        self._send(204, b"", "application/xml", {"ETag": etag})
+
+    def _list_objects(self, bucket, query):
+        prefix = query.get("prefix", [""])[0]
+        max_keys = int(query.get("max-keys", ["1000"])[0])
+        after = query.get("continuation-token", query.get("start-after", [""]))[0]
+        with self.server.lock:
+            keys = sorted(
+                (k, v[0], v[2])
+                for (b, k), v in self.server.objects.items()
+                if b == bucket and k.startswith(prefix) and k > after
+            )
+        page, truncated = keys[:max_keys], len(keys) > max_keys
+        contents = "".join(
+            f"<Contents><Key>{escape(k)}</Key><Size>{len(body)}</Size><ETag>{etag}</ETag>"
+            f"<LastModified>2020-01-01T00:00:00.000Z</LastModified></Contents>"
+            for k, body, etag in page
+        )
+        token = (
+            f"<NextContinuationToken>{escape(page[-1][0])}</NextContinuationToken>"
+            if truncated
+            else ""
+        )
+        self._send(
+            200,
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<ListBucketResult xmlns="http://s3.amazonaws.com/doc/2006-03-01/">'
+            f"<Name>{bucket}</Name><Prefix>{escape(prefix)}</Prefix><KeyCount>{len(page)}</KeyCount>"
+            f"<MaxKeys>{max_keys}</MaxKeys><IsTruncated>{str(truncated).lower()}</IsTruncated>"
+            f"{contents}{token}</ListBucketResult>",
+            "application/xml",
+        )
+
+
+class FakeStripeHandler(_FakeHandler):
+    def do_POST(self):
+        form = parse_qs(self._read_body().decode())
+        self._delay()
+        if not self.path.startswith("/v1/payment_intents"):
+            return self._send(404, {"error": {"message": "Unrecognized request URL"}})
+        intent_id = "pi_fake_" + uuid.uuid4().hex[:24]
+        metadata = {
+            m.group(1): v[0]
+            for k, v in form.items()
+            if (m := re.match(r"metadata\[(\w+)\]", k))
+        }
+        self._send(
+            200,
+            {
+                "id": intent_id,
+                "object": "payment_intent",
+                "amount": int(form.get("amount", ["0"])[0]),
+                "currency": form.get("currency", ["usd"])[0],
+                "client_secret": f"{intent_id}_secret_{uuid.uuid4().hex[:16]}",
+                "status": "requires_payment_method",
+                "metadata": metadata,
+                "created": int(time.time()),
+            },
+        )
+
+
+class FakeTwilioHandler(_FakeHandler):
+    def do_POST(self):
+        form = parse_qs(self._read_body().decode())
+        self._delay()
+        if not self.path.endswith("/Messages.json"):
+            return self._send(404, {"message": "Not found", "status": 404})
+        to_number = form.get("To", [""])[0]
+        if self.server.rate_limit:
+            with self.server.lock:
+                now = time.monotonic()
+                while self.server.accepted_at and now - self.server.accepted_at[0] >= 1.0:
+                    self.server.accepted_at.popleft()
+                limited = len(self.server.accepted_at) >= self.server.rate_limit
+                if limited:
+                    self.server.rejected += 1
+                else:
+                    self.server.accepted_at.append(now)
+            if limited:
+                return self._send(429, {"code": 20429, "message": "Too Many Requests", "status": 429})
+        if self.server.fail_numbers and to_number in self.server.fail_numbers:
+            return self._send(
+                400, {"code": 21211, "message": f"The 'To' number {to_number} is not valid.", "status": 400}
+            )
+        self._send(
+            201,
+            {
+                "sid": "SM" + uuid.uuid4().hex,
+                "status": "queued",
+                "to": to_number,
+                "from": form.get("From", [""])[0],
+                "body": form.get("Body", [""])[0],
+                "num_segments": "1",
+            },
+        )
+
+
+class FakePlacesHandler(_FakeHandler):
+    def do_GET(self):
+        self._delay()
+        reviews = [
+            {"author_name": f"Customer {i}", "rating": 5 - (i % 3), "text": "Great service.", "time": 1700000000 + i}
+            for i in range(5)
+        ]
+        self._send(
+            200,
+            {
+                "status": "OK",
+                "result": {"name": "Express Auto", "formatted_address": "Local", "reviews": reviews},
+            },
+        )
+
+
+class FakeHCaptchaHandler(_FakeHandler):
+    def do_POST(self):
+        self._read_body()
+        self._delay()
+        self._send(200, {"success": True})
+
+
+class FakeSMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP for smtplib: EHLO, MAIL, RCPT, DATA, RSET, NOOP, QUIT"""
+
+    def _reply(self, line):
+        self.wfile.write((line + "\r\n").encode())
+
+    def handle(self):
+        self._reply("220 fake-smtp ready")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors="replace").strip().upper()
+            if command.startswith("EHLO"):
+                self.wfile.write(b"250-fake-smtp\r\n250 8BITMIME\r\n")
+            elif command.startswith("HELO"):
+                self._reply("250 fake-smtp")
+            elif command.startswith(("MAIL", "RCPT", "RSET", "NOOP")):
+                self._reply("250 OK")
+            elif command == "DATA":
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                while self.rfile.readline() not in (b".\r\n", b".\n", b""):
+                    pass
+                time.sleep(self.server.latency_ms / 1000.0)
+                with self.server.lock:
+                    self.server.calls += 1
+                self._reply("250 OK queued")
+            elif command == "QUIT":
+                self._reply("221 Bye")
+                return
+            else:
+                self._reply("502 Command not implemented")
+
+
+class _ThreadingSMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+HANDLERS = {
+    "s3": FakeS3Handler,
+    "stripe": FakeStripeHandler,
+    "twilio": FakeTwilioHandler,
+    "places": FakePlacesHandler,
+    "hcaptcha": FakeHCaptchaHandler,
+}
+
+
+class FakeServices:
+    """Starts every fake on an ephemeral port; use as a context manager"""
+
+    def __init__(self, latency_ms=None, fail_numbers=(), twilio_rate_limit=None):
+        self.latency_ms = dict(DEFAULT_LATENCY_MS, **(latency_ms or {}))
+        self.fail_numbers = set(fail_numbers)
+        self.twilio_rate_limit = twilio_rate_limit  # messages per second before 429s
+        self.servers = {}
+        self._threads = []
+
+    def _prepare(self, server, name):
+        server.latency_ms = self.latency_ms[name]
+        server.lock = threading.Lock()
+        server.calls = 0
+        server.objects = {}
+        server.uploads = {}  # multipart upload id -> {part number: bytes}
+        server.upload_types = {}  # multipart upload id -> Content-Type from CreateMultipartUpload
+        server.fail_numbers = self.fail_numbers
+        server.rate_limit = self.twilio_rate_limit if name == "twilio" else None
+        server.accepted_at = deque()
+        server.rejected = 0
+        server.daemon_threads = True
+        self.servers[name] = server
+        thread = threading.Thread(target=server.serve_forever, name=f"fake-{name}", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def start(self):
+        for name, handler in HANDLERS.items():
+            self._prepare(ThreadingHTTPServer(("127.0.0.1", 0), handler), name)
+        self._prepare(_ThreadingSMTPServer(("127.0.0.1", 0), FakeSMTPHandler), "smtp")
+        return self
+
+    def stop(self):
+        for server in self.servers.values():
+            server.shutdown()
+            server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def url(self, name):
+        return f"http://127.0.0.1:{self.servers[name].server_address[1]}"
+
+    def calls(self):
+        return {name: server.calls for name, server in self.servers.items()}
+
+    def env(self):
+        """Environment variables that point app.py at these fakes"""
+        return {
+            "S3_ENDPOINT_URL": self.url("s3"),
+            "S3_BUCKET_NAME": "bench-bucket",
+            "AWS_ACCESS_KEY": "bench",
+            "AWS_SECRET_KEY": "bench",
+            "AWS_REGION": "us-east-1",
+            "STRIPE_API_BASE": self.url("stripe"),
+            "STRIPE_SECRET_KEY": "sk_test_bench",
+            "STRIPE_WEBHOOK_SECRET": "whsec_bench",
+            "TWILIO_API_BASE": self.url("twilio"),
+            "TWILIO_ACCOUNT_SID": "ACbench",
+            "TWILIO_AUTH_TOKEN": "bench",
+            "TWILIO_PHONE_NUMBER": "+15550000000",
+            "GOOGLE_PLACES_DETAILS_URL": self.url("places") + "/maps/api/place/details/json",
+            "GOOGLE_MAPS_API_KEY": "bench",
+            "HCAPTCHA_VERIFY_URL": self.url("hcaptcha") + "/siteverify",
+            "HCAPTCHA_SECRET_KEY": "bench",
+            "MAIL_SERVER": "127.0.0.1",
+            "MAIL_PORT": str(self.servers["smtp"].server_address[1]),
+            "MAIL_USE_TLS": "false",
+            "MAIL_USERNAME": "bench@example.invalid",
+            "MAIL_PASSWORD": "",
+            "MAIL_RECIPIENT": "shop@example.invalid",
+        }
+
+
+def parse_latency(spec):
+    """Parses 's3=30,stripe=200' into {'s3': 30.0, 'stripe': 200.0}"""
+    latency = {}
+    for part in filter(None, (spec or "").split(",")):
+        name, _, value = part.partition("=")
+        if name not in DEFAULT_LATENCY_MS:
+            raise ValueError(f"Unknown service {name!r}; expected one of {sorted(DEFAULT_LATENCY_MS)}")
+        latency[name] = float(value)
+    return latency
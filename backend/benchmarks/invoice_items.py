@@ -0,0 +1,148 @@
+"""
+Latency benchmark for create_invoice: per-item INSERT loop vs the single-statement path.
+
+For 1, 10 and 100 line items, times the old sequence of round trips (user check,
+vehicle check, invoice INSERT, one INSERT per item) against CREATE_INVOICE_SQL
+from app.py. Every iteration runs in a transaction that is rolled back.
+Invoice numbers come from a far-future year (--year), because a rollback
+doesn't undo nextval() and this year's real numbering would be left with
+gaps. That year's sequence is dropped at the end, so the database is left as
+it was. Set DB_HOST to a remote server to see the full
+effect of round-trip latency.
+
+Usage (from backend/):
+    python -m benchmarks.invoice_items --iterations 200
+"""
+
+import argparse
+import statistics
+import time
+
+from psycopg2.extras import Json
+
+from app import CREATE_INVOICE_SQL
+from migrate import connect
+
+
+def make_items(count):
+    return [
+        {
+            "description": f"Line item {i}",
+            "quantity": 1,
+            "unit_price": 10,
+            "discount_amount": 0,
+            "total_price": 10,
+        }
+        for i in range(count)
+    ]
+
+
+def loop_path(cursor, year, user_id, vehicle_id, items):
+    """The original create_invoice: one round trip per check and per item"""
+    cursor.execute("SELECT 1 FROM users WHERE user_id = %s", (user_id,))
+    cursor.fetchone()
+    cursor.execute("SELECT 1 FROM vehicles WHERE vehicle_id = %s", (vehicle_id,))
+    cursor.fetchone()
+    cursor.execute("SELECT next_invoice_number(%s) AS invoice_number", (year,))
+    invoice_number = cursor.fetchone()["invoice_number"]
+    cursor.execute(
+        """
+        INSERT INTO invoices (user_id, vehicle_id, invoice_number, subtotal, tax_amount,
+                              discount_amount, total_amount, status, due_date, notes)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, NOW(), %s) RETURNING invoice_id
+        """,
+        (user_id, vehicle_id, invoice_number, 10, 0, 0, 10, "unpaid", None),
+    )
+    invoice_id = cursor.fetchone()["invoice_id"]
+    for item in items:
+        cursor.execute(
+            """
+            INSERT INTO invoice_items (invoice_id, service_id, history_id, description,
+                                       quantity, unit_price, discount_amount, total_price)
+            VALUES (%s,%s,%s,%s,%s,%s,%s,%s)
+            """,
+            (
+                invoice_id,
+                item.get("service_id"),
+                item.get("history_id"),
+                item["description"],
+                item["quantity"],
+                item["unit_price"],
+                item.get("discount_amount", 0),
+                item.get("total_price"),
+            ),
+        )
+
+
+def batched_path(cursor, year, user_id, vehicle_id, items):
+    """The current create_invoice: one statement regardless of item count"""
+    cursor.execute(
+        CREATE_INVOICE_SQL,
+        {
+            "user_id": user_id,
+            "vehicle_id": vehicle_id,
+            "subtotal": 10,
+            "tax_amount": 0,
+            "discount_amount": 0,
+            "total_amount": 10,
+            "status": "unpaid",
+            "due_date": "2099-01-01",
+            "notes": None,
+            "items": Json(items),
+            "invoice_year": year,
+        },
+    )
+    cursor.fetchone()
+
+
+def time_path(conn, path, year, user_id, vehicle_id, items, iterations):
+    samples = []
+    with conn.cursor() as cursor:
+        for _ in range(iterations):
+            started = time.perf_counter()
+            path(cursor, year, user_id, vehicle_id, items)
+            samples.append((time.perf_counter() - started) * 1000)
+            conn.rollback()
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--year", type=int, default=2997, help="unused invoice year to number from")
+    args = parser.parse_args()
+
+    conn = connect()
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT user_id, vehicle_id FROM vehicles WHERE user_id IS NOT NULL LIMIT 1")
+        row = cursor.fetchone()
+    conn.rollback()
+    if not row:
+        raise SystemExit("Needs at least one vehicle with an owner in the database")
+    with conn.cursor() as cursor:
+        # Create the year's sequence up front, not inside every timed, rolled-back run
+        cursor.execute("SELECT next_invoice_number(%s)", (args.year,))
+    conn.commit()
+
+    print(f"{'items':>6} {'loop p50':>10} {'loop p95':>10} {'batch p50':>10} {'batch p95':>10} {'speedup':>8}")
+    try:
+        for count in (1, 10, 100):
+            items = make_items(count)
+            run = (args.year, row["user_id"], row["vehicle_id"], items, args.iterations)
+            loop = time_path(conn, loop_path, *run)
+            batch = time_path(conn, batched_path, *run)
+            print(
+                f"{count:>6} {loop[0]:>8.2f}ms {loop[1]:>8.2f}ms {batch[0]:>8.2f}ms "
+                f"{batch[1]:>8.2f}ms {loop[0] / batch[0]:>7.1f}x"
+            )
+    finally:
+        conn.rollback()
+        with conn.cursor() as cursor:
+            cursor.execute(f"DROP SEQUENCE IF EXISTS invoice_number_seq_{int(args.year)}")
+        conn.commit()
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
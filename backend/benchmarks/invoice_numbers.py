@@ -0,0 +1,112 @@
+"""
+Concurrent stress test for the per-year invoice number allocator.
+
+Runs many threads that each allocate a number via next_invoice_number() and
+insert an invoice with it, exactly like create_invoice does. Reports any
+duplicate numbers and the allocation latency per batch, so you can see it
+stays flat as the invoices table grows. A far-future year is used and
+everything it creates is removed afterwards; the second year exercises the
+rollover path (a new sequence is created on first use).
+
+Usage (from backend/):
+    python -m benchmarks.invoice_numbers --threads 16 --per-thread 500
+"""
+
+import argparse
+import statistics
+import threading
+import time
+from collections import Counter
+
+from migrate import connect
+
+ALLOCATE_AND_INSERT = """
+    INSERT INTO invoices (invoice_number, subtotal, tax_amount, total_amount, status, issue_date)
+    VALUES (next_invoice_number(%s), 0, 0, 0, 'paid', make_timestamp(%s, 1, 1, 0, 0, 0))
+    RETURNING invoice_number
+"""
+
+
+def worker(year, count, numbers, latencies, errors):
+    conn = connect()
+    try:
+        with conn.cursor() as cursor:
+            for _ in range(count):
+                started = time.perf_counter()
+                try:
+                    cursor.execute(ALLOCATE_AND_INSERT, (year, year))
+                    number = cursor.fetchone()["invoice_number"]
+                    conn.commit()
+                except Exception as e:
+                    conn.rollback()
+                    errors.append(str(e))
+                    continue
+                latencies.append((time.perf_counter(), time.perf_counter() - started))
+                numbers.append(number)
+    finally:
+        conn.close()
+
+
+def run_year(year, threads, per_thread, batches):
+    numbers, latencies, errors = [], [], []
+    pool = [
+        threading.Thread(target=worker, args=(year, per_thread, numbers, latencies, errors))
+        for _ in range(threads)
+    ]
+    started = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    duplicates = [n for n, c in Counter(numbers).items() if c > 1]
+    print(f"\nYear {year}: {len(numbers)} invoices in {elapsed:.2f}s "
+          f"({len(numbers) / elapsed:.0f}/s), {len(errors)} errors, {len(duplicates)} duplicates")
+    if errors:
+        print(f"  first error: {errors[0]}")
+
+    # Latency per batch in completion order; flat numbers mean no dependence on table size
+    latencies.sort()
+    size = max(1, len(latencies) // batches)
+    for i in range(0, len(latencies), size):
+        chunk = [lat * 1000 for _, lat in latencies[i : i + size]]
+        chunk.sort()
+        p95 = chunk[int(len(chunk) * 0.95) - 1] if len(chunk) > 1 else chunk[0]
+        print(f"  rows {i:>7}-{i + len(chunk):<7} p50 {statistics.median(chunk):6.2f} ms  p95 {p95:6.2f} ms")
+
+    first, last = min(numbers, default=None), max(numbers, default=None)
+    print(f"  range {first} .. {last}")
+    return not duplicates and not errors
+
+
+def cleanup(years):
+    conn = connect()
+    conn.autocommit = True
+    with conn.cursor() as cursor:
+        for year in years:
+            cursor.execute("DELETE FROM invoices WHERE invoice_number LIKE %s", (f"INV-{year}-%",))
+            cursor.execute(f"DROP SEQUENCE IF EXISTS invoice_number_seq_{int(year)}")
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--per-thread", type=int, default=500)
+    parser.add_argument("--batches", type=int, default=10)
+    parser.add_argument("--year", type=int, default=2998)
+    args = parser.parse_args()
+
+    years = [args.year, args.year + 1]
+    cleanup(years)
+    try:
+        ok = all(run_year(y, args.threads, args.per_thread, args.batches) for y in years)
+    finally:
+        cleanup(years)
+    print("\nPASS" if ok else "\nFAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,155 @@
+"""
+Benchmark of app CPU time and peak memory per list request, row path vs Postgres-built JSON.
+
+Seeds --rows rows for each of /api/get-users, /api/active-jobs,
+/api/get-unpaid-invoices and /api/get-user-media (benchmarks.seed data plus
+bench-admin media), then starts the app (benchmarks.serve) twice: once with
+PG_JSON_RESPONSES=0 and once with =1. Each endpoint is requested with
+?limit=--rows, --requests times per app. Per request it records the app
+process's CPU time (utime + stime from /proc/<pid>/stat) and its peak RSS
+above the pre-request baseline (VmHWM after clear_refs, as in
+benchmarks.upload_memory). Linux only.
+
+Usage (from backend/):
+    python -m benchmarks.json_responses
+    python -m benchmarks.json_responses --rows 10000 --requests 10
+"""
+
+import argparse
+import os
+import statistics
+import time
+
+import requests
+
+from benchmarks import seed
+from benchmarks.fakes import FakeServices
+from benchmarks.loadtest import start_app
+from benchmarks.upload_memory import memory_kb, reset_peak
+from migrate import connect
+
+ENDPOINTS = ("/api/get-users", "/api/active-jobs", "/api/get-unpaid-invoices", "/api/get-user-media")
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+
+
+def prepare(conn, rows):
+    """Seeds enough bench data that every endpoint has at least `rows` rows to return"""
+    seed.reset(conn)
+    seed.seed(conn, rows)
+    with conn.cursor() as cursor:
+        cursor.execute(
+            """
+            UPDATE vehicles SET vehicle_status = 'Active'
+            WHERE vehicle_id IN (
+                SELECT vehicle_id FROM vehicles WHERE license_plate LIKE 'BN%%' ORDER BY vehicle_id LIMIT %s
+            )
+            """,
+            (rows,),
+        )
+        cursor.execute(
+            """
+            UPDATE invoices SET status = 'unpaid'
+            WHERE invoice_id IN (
+                SELECT invoice_id FROM invoices WHERE invoice_number LIKE 'BN-%%' ORDER BY invoice_id LIMIT %s
+            )
+            """,
+            (rows,),
+        )
+        # The admin's own gallery, spread over 50 vehicles so grouping has work to do
+        cursor.execute(
+            """
+            INSERT INTO media (user_id, vehicle_id, media_type, file_url, title, upload_date, is_public)
+            SELECT a.user_id, v.vehicle_id, 'image',
+                   'https://bench-bucket.s3.us-east-1.amazonaws.com/media_admin_' || g || '.jpg',
+                   'admin photo ' || g, NOW() - (g || ' minutes')::interval, TRUE
+            FROM users a,
+                 generate_series(1, %s) AS g
+                 JOIN LATERAL (
+                     SELECT vehicle_id FROM vehicles WHERE license_plate LIKE 'BN%%'
+                     ORDER BY vehicle_id OFFSET g %% 50 LIMIT 1
+                 ) v ON TRUE
+            WHERE a.email = %s
+            """,
+            (rows, seed.ADMIN_EMAIL),
+        )
+    conn.commit()
+
+
+def cpu_seconds(pid):
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS  # utime, stime
+
+
+def measure(base_url, pid, path, rows, requests_per_endpoint):
+    session = requests.Session()
+    session.post(
+        base_url + "/api/login", json={"email": seed.ADMIN_EMAIL, "password": seed.BENCH_PASSWORD}
+    ).raise_for_status()
+    url = f"{base_url}{path}?limit={rows}"
+    session.get(url, timeout=120).raise_for_status()  # warm up pools and caches
+    cpu, wall, growth = [], [], []
+    size = 0
+    for _ in range(requests_per_endpoint):
+        reset_peak(pid)
+        baseline, _ = memory_kb(pid)
+        cpu_before = cpu_seconds(pid)
+        started = time.perf_counter()
+        response = session.get(url, timeout=120)
+        wall.append(time.perf_counter() - started)
+        cpu.append(cpu_seconds(pid) - cpu_before)
+        _, peak = memory_kb(pid)
+        growth.append(peak - baseline)
+        response.raise_for_status()
+        size = len(response.content)
+    return {
+        "cpu_ms": statistics.median(cpu) * 1000,
+        "wall_ms": statistics.median(wall) * 1000,
+        "peak_mb": max(growth) / 1024,
+        "bytes": size,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=10_000, help="rows per response")
+    parser.add_argument("--requests", type=int, default=5, help="measured requests per endpoint and mode")
+    parser.add_argument("--port", type=int, default=5058)
+    parser.add_argument("--keep", action="store_true", help="leave the bench data in place afterwards")
+    args = parser.parse_args()
+
+    conn = connect()
+    prepare(conn, args.rows)
+    results = {}
+    try:
+        with FakeServices() as fakes:
+            for mode in ("0", "1"):
+                env = dict(os.environ, **fakes.env())
+                env["PG_JSON_RESPONSES"] = mode
+                env["PAGE_LIMIT_MAX"] = str(args.rows)
+                env.pop("PROMETHEUS_MULTIPROC_DIR", None)
+                process, base_url = start_app(env, args.port)
+                try:
+                    for path in ENDPOINTS:
+                        results[(path, mode)] = measure(base_url, process.pid, path, args.rows, args.requests)
+                finally:
+                    process.terminate()
+                    process.wait(timeout=10)
+    finally:
+        if not args.keep:
+            seed.reset(conn)
+        conn.close()
+
+    print(f"{args.rows} rows per response, median of {args.requests} requests (peak: worst request)")
+    print(f"{'endpoint':<26} {'path':<9} {'cpu ms':>8} {'wall ms':>8} {'peak MB':>8} {'KB':>8}")
+    for path in ENDPOINTS:
+        for mode, label in (("0", "rows"), ("1", "postgres")):
+            r = results[(path, mode)]
+            print(
+                f"{path:<26} {label:<9} {r['cpu_ms']:>8.1f} {r['wall_ms']:>8.1f} "
+                f"{r['peak_mb']:>8.1f} {r['bytes'] / 1024:>8.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,498 @@
+"""
+Reproducible load test for the Express Auto API.
+
+`run` starts the local service fakes (benchmarks/fakes.py), seeds synthetic
+data into the configured Postgres (benchmarks/seed.py), launches app.py
+against both, then drives a weighted mix of realistic flows from concurrent
+virtual users:
+
+    dashboard  customer loads the Dashboard page (user, vehicles, invoices, ...)
+    admin      admin loads the AdminPage lists and a few customers' vehicles
+    invoice    admin creates an invoice with several line items
+    payment    customer opens an unpaid invoice and creates a PaymentIntent
+    webhook    Stripe delivers a signed payment_intent.succeeded event
+    reviews    visitor loads Google reviews
+    contact    visitor submits the contact form
+
+Latency percentiles and throughput per endpoint and per flow are printed and
+written to a JSON file named after the current commit, so runs can be diffed
+with `compare`.
+
+Usage (from backend/, with DB_* pointing at a disposable local database):
+    python -m benchmarks.loadtest run --duration 60 --concurrency 16
+    python -m benchmarks.loadtest run --latency stripe=400,s3=80 --mix dashboard=80,admin=20
+    python -m benchmarks.loadtest compare results/old.json results/new.json
+"""
+
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import requests
+
+from benchmarks.fakes import FakeServices, parse_latency
+from benchmarks.seed import ADMIN_EMAIL, BENCH_PASSWORD, bench_accounts, reset, seed
+from migrate import connect
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(BACKEND_DIR, "benchmarks", "results")
+
+DEFAULT_MIX = {
+    "dashboard": 45,
+    "admin": 15,
+    "invoice": 10,
+    "payment": 12,
+    "webhook": 10,
+    "reviews": 5,
+    "contact": 3,
+    "upload": 0,  # opt in with --mix; presign, POST to the fake S3, confirm
+}
+
+UPLOAD_BODY = b"\x89PNG\r\n\x1a\n" + bytes(64 * 1024)
+
+
+# MEASUREMENT
+
+
+class Recorder:
+    """Collects (label, status, seconds) samples from every virtual user"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.endpoints = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.scenarios = defaultdict(list)
+
+    def endpoint(self, label, status, seconds):
+        with self._lock:
+            self.endpoints[label].append(seconds)
+            if status is None or status >= 400:
+                self.errors[label] += 1
+
+    def scenario(self, name, seconds):
+        with self._lock:
+            self.scenarios[name].append(seconds)
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def summarize(samples, elapsed, errors=0):
+    values = sorted(samples)
+    return {
+        "count": len(values),
+        "errors": errors,
+        "throughput_rps": round(len(values) / elapsed, 3) if elapsed else None,
+        "mean_ms": round(sum(values) / len(values) * 1000, 3) if values else None,
+        "p50_ms": round(percentile(values, 50) * 1000, 3) if values else None,
+        "p95_ms": round(percentile(values, 95) * 1000, 3) if values else None,
+        "p99_ms": round(percentile(values, 99) * 1000, 3) if values else None,
+        "max_ms": round(values[-1] * 1000, 3) if values else None,
+    }
+
+
+class VirtualUser:
+    """One simulated browser: a customer session and an admin session"""
+
+    def __init__(self, base_url, recorder, ctx, rng):
+        self.base_url = base_url
+        self.recorder = recorder
+        self.ctx = ctx
+        self.rng = rng
+        self.customer = rng.choice(ctx["customers"])
+        self.customer_session = requests.Session()
+        self.admin_session = requests.Session()
+        self.anonymous = requests.Session()
+        self._login(self.customer_session, self.customer["email"])
+        self._login(self.admin_session, ADMIN_EMAIL)
+
+    def _login(self, session, email):
+        response = session.post(
+            self.base_url + "/api/login", json={"email": email, "password": BENCH_PASSWORD}
+        )
+        response.raise_for_status()
+
+    def call(self, session, method, path, label=None, **kwargs):
+        label = label or f"{method} {path}"
+        started = time.perf_counter()
+        try:
+            response = session.request(method, self.base_url + path, timeout=60, **kwargs)
+            status = response.status_code
+        except requests.RequestException:
+            response, status = None, None
+        self.recorder.endpoint(label, status, time.perf_counter() - started)
+        return response
+
+    # FLOWS
+
+    def dashboard(self):
+        s = self.customer_session
+        for path in (
+            "/api/user",
+            "/api/get-vehicles",
+            "/api/get-user-invoices",
+            "/api/get-notifications",
+            "/api/get-loyalty-points",
+            "/api/get-user-media",
+        ):
+            self.call(s, "GET", path)
+
+    def admin(self):
+        s = self.admin_session
+        self.call(s, "GET", "/api/get-users")
+        self.call(s, "GET", "/api/active-jobs")
+        self.call(s, "GET", "/api/get-unpaid-invoices")
+        for customer in self.rng.sample(self.ctx["customers"], min(3, len(self.ctx["customers"]))):
+            self.call(
+                s, "GET", f"/api/get-vehicles/{customer['user_id']}", "GET /api/get-vehicles/{user_id}"
+            )
+
+    def invoice(self):
+        customer = self.rng.choice(self.ctx["customers"])
+        items = [
+            {"description": f"Labor {i}", "quantity": 1, "unit_price": 45, "total_price": 45}
+            for i in range(self.rng.randint(1, 12))
+        ]
+        subtotal = 45 * len(items)
+        response = self.call(
+            self.admin_session,
+            "POST",
+            "/api/create-invoice",
+            json={
+                "user_id": customer["user_id"],
+                "vehicle_id": customer["vehicle_id"],
+                "subtotal": subtotal,
+                "tax_amount": round(subtotal * 0.07, 2),
+                "total_amount": round(subtotal * 1.07, 2),
+                "status": "unpaid",
+                "due_date": (datetime.now() + timedelta(days=30)).isoformat(),
+                "items": items,
+            },
+        )
+        if response is not None and response.status_code == 201:
+            self.ctx["new_invoices"].append(response.json()["invoice_id"])
+
+    def payment(self):
+        response = self.call(self.customer_session, "GET", "/api/get-user-invoices")
+        invoices = response.json().get("invoices", []) if response is not None and response.ok else []
+        unpaid = [i for i in invoices if str(i.get("status", "")).lower() in ("unpaid", "due")]
+        if unpaid:
+            self.call(
+                self.customer_session,
+                "POST",
+                "/api/create-payment-intent",
+                json={"invoice_id": self.rng.choice(unpaid)["invoice_id"]},
+            )
+
+    def webhook(self):
+        pool = self.ctx["new_invoices"] or self.ctx["unpaid_invoices"]
+        if not pool:
+            return
+        invoice_id = self.rng.choice(pool)
+        now = int(time.time())
+        intent_id = f"pi_bench_{now}_{self.rng.getrandbits(48):x}"
+        payload = json.dumps(
+            {
+                "id": "evt_" + intent_id,
+                "object": "event",
+                "type": "payment_intent.succeeded",
+                "data": {
+                    "object": {
+                        "id": intent_id,
+                        "object": "payment_intent",
+                        "amount_received": 10700,
+                        "created": now,
+                        "metadata": {"invoice_id": str(invoice_id)},
+                    }
+                },
+            }
+        )
+        signature = hmac.new(
+            self.ctx["webhook_secret"].encode(), f"{now}.{payload}".encode(), hashlib.sha256
+        ).hexdigest()
+        self.call(
+            self.anonymous,
+            "POST",
+            "/api/webhook",
+            data=payload,
+            headers={"Stripe-Signature": f"t={now},v1={signature}", "Content-Type": "application/json"},
+        )
+
+    def reviews(self):
+        self.call(self.anonymous, "GET", "/api/reviews")
+
+    def contact(self):
+        self.call(
+            self.anonymous,
+            "POST",
+            "/api/contact",
+            json={
+                "name": "Bench Visitor",
+                "email": "visitor@example.invalid",
+                "message": "Do you do alignments?",
+                "captchaToken": "bench",
+            },
+        )
+
+    def upload(self):
+        s = self.customer_session
+        response = self.call(
+            s, "POST", "/api/uploads/presign", json={"kind": "media", "filename": "bench.png"}
+        )
+        if response is None or response.status_code != 200:
+            return
+        presigned = response.json()
+        started = time.perf_counter()
+        try:
+            status = requests.post(
+                presigned["url"],
+                data=presigned["fields"],
+                files={"file": ("bench.png", UPLOAD_BODY, "image/png")},
+                timeout=60,
+            ).status_code
+        except requests.RequestException:
+            status = None
+        self.recorder.endpoint("POST <s3 presigned>", status, time.perf_counter() - started)
+        self.call(s, "POST", "/api/uploads/media/confirm", json={"key": presigned["key"]})
+
+
+def run_virtual_user(base_url, recorder, ctx, mix, deadline, seed_value, failures):
+    rng = random.Random(seed_value)
+    try:
+        user = VirtualUser(base_url, recorder, ctx, rng)
+    except requests.RequestException as e:
+        failures.append(str(e))
+        return
+    names, weights = zip(*mix.items())
+    while time.monotonic() < deadline:
+        name = rng.choices(names, weights)[0]
+        started = time.perf_counter()
+        getattr(user, name)()
+        recorder.scenario(name, time.perf_counter() - started)
+
+
+# ORCHESTRATION
+
+
+def parse_mix(spec):
+    if not spec:
+        return {k: v for k, v in DEFAULT_MIX.items() if v > 0}
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name not in DEFAULT_MIX:
+            raise SystemExit(f"Unknown flow {name!r}; expected one of {sorted(DEFAULT_MIX)}")
+        mix[name] = float(weight)
+    return {k: v for k, v in mix.items() if v > 0}
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def start_app(env, port):
+    process = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.serve", "--port", str(port)],
+        cwd=BACKEND_DIR,
+        env=env,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit("The app exited during startup")
+        try:
+            if requests.get(base_url + "/api/db-test", timeout=2).ok:
+                return process, base_url
+        except requests.RequestException:
+            pass
+        time.sleep(0.25)
+    process.terminate()
+    raise SystemExit("The app did not become ready within 30s")
+
+
+def run(args):
+    mix = parse_mix(args.mix)
+    latency = parse_latency(args.latency)
+
+    conn = connect()
+    if not args.no_seed:
+        reset(conn)
+        print(f"Seeding {args.customers} customers ...", flush=True)
+        seed(conn, args.customers)
+    admin, customers = bench_accounts(conn)
+    if not admin or not customers:
+        raise SystemExit("No bench data; run without --no-seed first")
+    with conn.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT invoice_id FROM invoices
+            WHERE invoice_number LIKE 'BN-%' AND status = 'unpaid' LIMIT 5000
+            """
+        )
+        unpaid_invoices = [row["invoice_id"] for row in cursor.fetchall()]
+    conn.rollback()
+    conn.close()
+
+    with FakeServices(latency) as fakes:
+        fake_env = fakes.env()
+        process = None
+        if args.app_url:
+            base_url = args.app_url.rstrip("/")
+        else:
+            env = dict(os.environ, **fake_env)
+            env.pop("PROMETHEUS_MULTIPROC_DIR", None)
+            process, base_url = start_app(env, args.port)
+
+        ctx = {
+            "customers": customers,
+            "unpaid_invoices": unpaid_invoices,
+            "new_invoices": [],
+            "webhook_secret": fake_env["STRIPE_WEBHOOK_SECRET"],
+        }
+        recorder = Recorder()
+        failures = []
+        print(
+            f"Running {args.concurrency} virtual users for {args.duration}s against {base_url} ...",
+            flush=True,
+        )
+        started = time.monotonic()
+        deadline = started + args.duration
+        threads = [
+            threading.Thread(
+                target=run_virtual_user,
+                args=(base_url, recorder, ctx, mix, deadline, args.seed + i, failures),
+            )
+            for i in range(args.concurrency)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.monotonic() - started
+        fake_calls = fakes.calls()
+
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=10)
+
+    if failures:
+        print(f"{len(failures)} virtual users failed to log in; first: {failures[0]}")
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "config": {
+            "duration_s": args.duration,
+            "concurrency": args.concurrency,
+            "customers": args.customers,
+            "mix": mix,
+            "seed": args.seed,
+            "fake_latency_ms": fakes.latency_ms,
+        },
+        "elapsed_s": round(elapsed, 3),
+        "totals": summarize(
+            [s for samples in recorder.endpoints.values() for s in samples],
+            elapsed,
+            sum(recorder.errors.values()),
+        ),
+        "endpoints": {
+            label: summarize(samples, elapsed, recorder.errors[label])
+            for label, samples in sorted(recorder.endpoints.items())
+        },
+        "scenarios": {
+            name: summarize(samples, elapsed) for name, samples in sorted(recorder.scenarios.items())
+        },
+        "fake_calls": fake_calls,
+    }
+
+    print_report(report)
+    os.makedirs(args.out, exist_ok=True)
+    path = os.path.join(
+        args.out, f"{datetime.now():%Y%m%d-%H%M%S}-{report['commit']}.json"
+    )
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nSaved {path}")
+
+
+def print_report(report):
+    header = f"{'endpoint':<46} {'count':>7} {'err':>5} {'rps':>8} {'p50':>9} {'p95':>9} {'p99':>9}"
+    for section in ("endpoints", "scenarios"):
+        print("\n" + header.replace("endpoint", section[:-1], 1))
+        for label, s in report[section].items():
+            print(
+                f"{label:<46} {s['count']:>7} {s['errors']:>5} {s['throughput_rps']:>8.1f} "
+                f"{s['p50_ms']:>7.1f}ms {s['p95_ms']:>7.1f}ms {s['p99_ms']:>7.1f}ms"
+            )
+    t = report["totals"]
+    print(f"\nTotal: {t['count']} requests, {t['errors']} errors, {t['throughput_rps']:.1f} req/s")
+
+
+def compare(args):
+    with open(args.baseline) as f:
+        old = json.load(f)
+    with open(args.candidate) as f:
+        new = json.load(f)
+    print(f"baseline {old['commit']} ({old['timestamp']})  vs  candidate {new['commit']} ({new['timestamp']})")
+    print(f"\n{'endpoint':<46} {'p50':>20} {'p95':>20} {'p99':>20} {'rps':>16}")
+    for label in sorted(set(old["endpoints"]) | set(new["endpoints"])):
+        a, b = old["endpoints"].get(label), new["endpoints"].get(label)
+        if not a or not b:
+            print(f"{label:<46} {'only in ' + ('candidate' if b else 'baseline'):>20}")
+            continue
+        cells = []
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            change = (b[key] - a[key]) / a[key] * 100 if a[key] else 0.0
+            cells.append(f"{a[key]:.1f}->{b[key]:.1f} {change:+.0f}%")
+        rps_change = (b["throughput_rps"] - a["throughput_rps"]) / a["throughput_rps"] * 100 if a["throughput_rps"] else 0.0
+        print(f"{label:<46} {cells[0]:>20} {cells[1]:>20} {cells[2]:>20} {rps_change:>+15.0f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = sub.add_parser("run", help="run the load test")
+    run_parser.add_argument("--duration", type=float, default=60)
+    run_parser.add_argument("--concurrency", type=int, default=16)
+    run_parser.add_argument("--customers", type=int, default=5000)
+    run_parser.add_argument("--mix", help="flow weights, e.g. dashboard=50,admin=20,invoice=10")
+    run_parser.add_argument("--latency", help="fake latency in ms, e.g. stripe=250,s3=30")
+    run_parser.add_argument("--seed", type=int, default=1, help="RNG seed for the flow mix")
+    run_parser.add_argument("--no-seed", action="store_true", help="reuse existing bench data")
+    run_parser.add_argument("--port", type=int, default=5055)
+    run_parser.add_argument("--app-url", help="benchmark an already running app instead")
+    run_parser.add_argument("--out", default=RESULTS_DIR)
+
+    compare_parser = sub.add_parser("compare", help="diff two saved runs")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("candidate")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        run(args)
+    else:
+        compare(args)
+
+
+if __name__ == "__main__":
+    main()
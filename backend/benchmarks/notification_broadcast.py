@@ -0,0 +1,110 @@
+"""
+Benchmark for /api/notifications/broadcast vs one /api/send-notification per user.
+
+Creates --recipients throwaway users, then times a single broadcast request
+that targets all of them by user_id. The old path is one HTTP request and one
+single-row INSERT transaction per user. It is measured on a --sample of users
+through /api/send-notification and extrapolated to the full count. Every
+user and notification created here is deleted afterwards.
+
+Usage (from backend/):
+    python -m benchmarks.notification_broadcast --recipients 100000
+"""
+
+import argparse
+import time
+
+from werkzeug.security import generate_password_hash
+
+from app import app
+from migrate import connect
+
+EMAIL_PREFIX = "bench-broadcast-"
+ADMIN_EMAIL = EMAIL_PREFIX + "admin@example.invalid"
+PASSWORD = "bench-password"
+TITLE = "Bench broadcast"
+
+
+def create_users(conn, count):
+    with conn.cursor() as cursor:
+        cursor.execute(
+            """
+            INSERT INTO users (email, password_hash, first_name, last_name, is_admin)
+            VALUES (%s, %s, 'Bench', 'Admin', TRUE)
+            """,
+            (ADMIN_EMAIL, generate_password_hash(PASSWORD)),
+        )
+        cursor.execute(
+            """
+            INSERT INTO users (email, password_hash, first_name, last_name)
+            SELECT %s || g || '@example.invalid', 'x', 'Bench', 'Recipient ' || g
+            FROM generate_series(1, %s) AS g
+            RETURNING user_id
+            """,
+            (EMAIL_PREFIX, count),
+        )
+        user_ids = [row["user_id"] for row in cursor.fetchall()]
+    conn.commit()
+    return user_ids
+
+
+def cleanup(conn):
+    with conn.cursor() as cursor:
+        cursor.execute(
+            """
+            DELETE FROM notifications WHERE user_id IN (
+                SELECT user_id FROM users WHERE email LIKE %s
+            )
+            """,
+            (EMAIL_PREFIX + "%",),
+        )
+        cursor.execute("DELETE FROM users WHERE email LIKE %s", (EMAIL_PREFIX + "%",))
+    conn.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--recipients", type=int, default=100_000)
+    parser.add_argument("--sample", type=int, default=500, help="per-user requests to time")
+    args = parser.parse_args()
+
+    conn = connect()
+    cleanup(conn)  # leftovers from an interrupted run
+    try:
+        user_ids = create_users(conn, args.recipients)
+        client = app.test_client()
+        client.post("/api/login", json={"email": ADMIN_EMAIL, "password": PASSWORD})
+
+        started = time.perf_counter()
+        for user_id in user_ids[: args.sample]:
+            response = client.post(
+                "/api/send-notification",
+                json={"user_id": user_id, "title": TITLE, "message": "Closed Monday."},
+            )
+            assert response.status_code == 201, response.get_json()
+        per_user = (time.perf_counter() - started) / args.sample
+
+        started = time.perf_counter()
+        response = client.post(
+            "/api/notifications/broadcast",
+            json={
+                "target": "user_ids",
+                "user_ids": user_ids,
+                "title": TITLE,
+                "message": "Closed Monday.",
+            },
+        )
+        broadcast = time.perf_counter() - started
+        assert response.status_code == 201, response.get_json()
+        recipients = response.get_json()["recipients"]
+    finally:
+        cleanup(conn)
+        conn.close()
+
+    print(f"per-user requests: {per_user * 1000:.2f}ms each, "
+          f"~{per_user * args.recipients:.1f}s for {args.recipients} recipients (extrapolated)")
+    print(f"broadcast:         {recipients} recipients in one request, {broadcast:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+Synthetic data for benchmarks.
+
+Creates bench-customer-N@example.invalid users (plus bench-admin@example.invalid)
+with vehicles, invoices and items, payments, media, notifications and loyalty
+points, all set-based with generate_series. Every bench user has the password
+BENCH_PASSWORD. reset() removes everything seeded here.
+
+Usage (from backend/):
+    python -m benchmarks.seed --customers 5000
+    python -m benchmarks.seed --reset
+"""
+
+import argparse
+import time
+
+from werkzeug.security import generate_password_hash
+
+from migrate import connect
+
+BENCH_PASSWORD = "bench-password"
+ADMIN_EMAIL = "bench-admin@example.invalid"
+CUSTOMER_EMAIL_PATTERN = "bench-customer-%@example.invalid"
+
+
+def reset(conn):
+    """Deletes all bench rows, children first since most foreign keys don't cascade"""
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT user_id FROM users WHERE email LIKE 'bench-%@example.invalid'")
+        user_ids = [row["user_id"] for row in cursor.fetchall()]
+        if user_ids:
+            for statement in (
+                "DELETE FROM payments WHERE invoice_id IN (SELECT invoice_id FROM invoices WHERE user_id = ANY(%s))",
+                "DELETE FROM invoice_items WHERE invoice_id IN (SELECT invoice_id FROM invoices WHERE user_id = ANY(%s))",
+                "DELETE FROM point_transactions WHERE user_id = ANY(%s)",
+                "DELETE FROM invoices WHERE user_id = ANY(%s)",
+                "DELETE FROM media WHERE user_id = ANY(%s)",
+                "DELETE FROM notifications WHERE user_id = ANY(%s)",
+                "DELETE FROM loyalty_points WHERE user_id = ANY(%s)",
+                "DELETE FROM users WHERE user_id = ANY(%s)",
+            ):
+                cursor.execute(statement, (user_ids,))
+    conn.commit()
+    return len(user_ids)
+
+
+def seed(conn, customers, vehicles_per_customer=2, invoices_per_vehicle=3):
+    """Seeds a dataset shaped like production and returns the row counts"""
+    password_hash = generate_password_hash(BENCH_PASSWORD)
+    with conn.cursor() as cursor:
+        cursor.execute(
+            """
+            INSERT INTO users (email, password_hash, first_name, last_name, phone, is_admin)
+            VALUES (%s, %s, 'Bench', 'Admin', '555-0100', TRUE)
+            """,
+            (ADMIN_EMAIL, password_hash),
+        )
+        cursor.execute(
+            """
+            INSERT INTO users (email, password_hash, first_name, last_name, phone)
+            SELECT 'bench-customer-' || g || '@example.invalid', %s, 'Bench', 'Customer ' || g,
+                   '+1555' || lpad(g::text, 7, '0')
+            FROM generate_series(1, %s) AS g
+            """,
+            (password_hash, customers),
+        )
+        cursor.execute(
+            """
+            INSERT INTO vehicles (user_id, make, model, year, license_plate, mileage, vehicle_status)
+            SELECT u.user_id, (ARRAY['Toyota','Honda','Ford','Subaru'])[1 + g %% 4], 'Model',
+                   2005 + (u.user_id + g) %% 20, 'BN' || u.user_id || '-' || g, 10000 * g,
+                   CASE WHEN random() < 0.05 THEN 'Active'
+                        WHEN random() < 0.05 THEN 'Waiting' ELSE 'OffLot' END
+            FROM users u, generate_series(1, %s) AS g
+            WHERE u.email LIKE %s
+            """,
+            (vehicles_per_customer, CUSTOMER_EMAIL_PATTERN),
+        )
+        cursor.execute(
+            """
+            INSERT INTO invoices (user_id, vehicle_id, invoice_number, subtotal, tax_amount,
+                                  total_amount, status, issue_date, due_date)
+            SELECT v.user_id, v.vehicle_id, 'BN-' || v.vehicle_id || '-' || g, 100 * g, 7 * g, 107 * g,
+                   CASE WHEN random() < 0.15 THEN 'unpaid' ELSE 'paid' END,
+                   NOW() - (g * 20 || ' days')::interval, NOW() + ((30 - g * 20) || ' days')::interval
+            FROM vehicles v, generate_series(1, %s) AS g
+            WHERE v.license_plate LIKE 'BN%%'
+            """,
+            (invoices_per_vehicle,),
+        )
+        cursor.execute(
+            """
+            INSERT INTO invoice_items (invoice_id, description, quantity, unit_price, total_price)
+            SELECT i.invoice_id, 'Bench line ' || g, 1, i.subtotal / 3, i.subtotal / 3
+            FROM invoices i, generate_series(1, 3) AS g
+            WHERE i.invoice_number LIKE 'BN-%'
+            """
+        )
+        cursor.execute(
+            """
+            INSERT INTO payments (invoice_id, payment_method, amount, transaction_id)
+            SELECT invoice_id, 'stripe', total_amount, 'pi_bench_seed_' || invoice_id
+            FROM invoices WHERE invoice_number LIKE 'BN-%' AND status = 'paid'
+            """
+        )
+        cursor.execute(
+            """
+            INSERT INTO media (user_id, vehicle_id, media_type, file_url, title, upload_date, is_public)
+            SELECT v.user_id, v.vehicle_id, 'image',
+                   'https://bench-bucket.s3.us-east-1.amazonaws.com/media_bench_' || v.vehicle_id || '_' || g || '.jpg',
+                   'photo ' || g, NOW() - (g || ' days')::interval, TRUE
+            FROM vehicles v, generate_series(1, 3) AS g
+            WHERE v.license_plate LIKE 'BN%'
+            """
+        )
+        cursor.execute(
+            """
+            INSERT INTO notifications (user_id, title, message, type, is_read, created_at)
+            SELECT u.user_id, 'Bench notice ' || g, 'Your vehicle is ready.', 'info',
+                   random() > 0.3, NOW() - (g || ' hours')::interval
+            FROM users u, generate_series(1, 8) AS g
+            WHERE u.email LIKE %s
+            """,
+            (CUSTOMER_EMAIL_PATTERN,),
+        )
+        cursor.execute(
+            """
+            INSERT INTO loyalty_points (user_id, points_balance, total_points_earned)
+            SELECT user_id, (user_id * 37) %% 500, (user_id * 37) %% 500 + 100
+            FROM users WHERE email LIKE %s
+            """,
+            (CUSTOMER_EMAIL_PATTERN,),
+        )
+        for table in ("users", "vehicles", "invoices", "invoice_items", "payments", "media", "notifications"):
+            cursor.execute(f"ANALYZE {table}")
+
+        cursor.execute(
+            """
+            SELECT (SELECT COUNT(*) FROM users WHERE email LIKE 'bench-%') AS users,
+                   (SELECT COUNT(*) FROM vehicles WHERE license_plate LIKE 'BN%') AS vehicles,
+                   (SELECT COUNT(*) FROM invoices WHERE invoice_number LIKE 'BN-%') AS invoices
+            """
+        )
+        counts = dict(cursor.fetchone())
+    conn.commit()
+    return counts
+
+
+def bench_accounts(conn, limit=2000):
+    """Returns the admin user and a sample of customers with a vehicle, for the load generator"""
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT user_id, email FROM users WHERE email = %s", (ADMIN_EMAIL,))
+        admin = cursor.fetchone()
+        cursor.execute(
+            """
+            SELECT u.user_id, u.email, u.phone, MIN(v.vehicle_id) AS vehicle_id
+            FROM users u JOIN vehicles v ON v.user_id = u.user_id
+            WHERE u.email LIKE %s
+            GROUP BY u.user_id
+            ORDER BY u.user_id
+            LIMIT %s
+            """,
+            (CUSTOMER_EMAIL_PATTERN, limit),
+        )
+        customers = [dict(row) for row in cursor.fetchall()]
+    conn.rollback()
+    return (dict(admin) if admin else None), customers
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--customers", type=int, default=5000)
+    parser.add_argument("--reset", action="store_true", help="only remove bench data")
+    args = parser.parse_args()
+
+    conn = connect()
+    removed = reset(conn)
+    print(f"Removed {removed} existing bench users")
+    if not args.reset:
+        started = time.perf_counter()
+        counts = seed(conn, args.customers)
+        print(f"Seeded {counts} in {time.perf_counter() - started:.1f}s")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
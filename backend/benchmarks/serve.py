@@ -0,0 +1,32 @@
+"""
+Runs app.py on a threaded Werkzeug server for benchmarks.
+
+Configuration comes from the environment (loadtest.py passes the fake service
+URLs and DB settings), so it must be read before app is imported.
+
+Usage (from backend/):
+    python -m benchmarks.serve --port 5055
+"""
+
+import argparse
+import logging
+
+from werkzeug.serving import make_server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5055)
+    args = parser.parse_args()
+
+    from app import app
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server(args.host, args.port, app, threaded=True)
+    print(f"Serving on http://{args.host}:{args.port}", flush=True)
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Benchmark of peak worker RSS and wall time for multipart uploads through Flask.
+
+Starts the app (benchmarks.serve) against the fake S3, logs in as a throwaway
+user and POSTs one file of each --sizes (MB) to /api/upload-<route>. Before
+each upload the app's peak-RSS counter is reset (/proc/<pid>/clear_refs), so
+"peak" is how far above the idle baseline that upload pushed the process.
+Linux only. Tune with UPLOAD_SPOOL_BYTES and S3_MULTIPART_* in the
+environment to compare settings.
+
+Usage (from backend/):
+    python -m benchmarks.upload_memory
+    python -m benchmarks.upload_memory --sizes 1,25,200 --route media --s3-latency 20
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import requests
+from werkzeug.security import generate_password_hash
+
+from benchmarks.fakes import FakeServices
+from benchmarks.loadtest import start_app
+from migrate import connect
+
+EMAIL = "bench-upload@example.invalid"
+PASSWORD = "bench-password"
+MB = 1024 * 1024
+JPEG_HEADER = b"\xff\xd8\xff\xe0\x00\x10JFIF\x00"
+
+
+def create_user(conn):
+    with conn.cursor() as cursor:
+        cursor.execute(
+            """
+            INSERT INTO users (email, password_hash, first_name, last_name)
+            VALUES (%s, %s, 'Bench', 'Uploader')
+            """,
+            (EMAIL, generate_password_hash(PASSWORD)),
+        )
+    conn.commit()
+
+
+def cleanup(conn):
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "DELETE FROM media WHERE user_id IN (SELECT user_id FROM users WHERE email = %s)", (EMAIL,)
+        )
+        cursor.execute("DELETE FROM users WHERE email = %s", (EMAIL,))
+    conn.commit()
+
+
+def write_file(directory, size_mb):
+    path = os.path.join(directory, f"upload-{size_mb}mb.jpg")
+    with open(path, "wb") as f:
+        f.write(JPEG_HEADER)
+        remaining = size_mb * MB - len(JPEG_HEADER)
+        while remaining > 0:
+            chunk = os.urandom(min(remaining, 4 * MB))
+            f.write(chunk)
+            remaining -= len(chunk)
+    return path
+
+
+def memory_kb(pid):
+    """(current RSS, peak RSS) in kB from /proc/<pid>/status"""
+    values = {}
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            name, _, value = line.partition(":")
+            if name in ("VmRSS", "VmHWM"):
+                values[name] = int(value.split()[0])
+    return values["VmRSS"], values["VmHWM"]
+
+
+def reset_peak(pid):
+    with open(f"/proc/{pid}/clear_refs", "w") as f:
+        f.write("5")  # resets VmHWM to the current RSS
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default="1,25,200", help="comma-separated file sizes in MB")
+    parser.add_argument("--route", choices=("vehicle-photo", "media"), default="vehicle-photo")
+    parser.add_argument("--s3-latency", type=float, default=10, help="ms per fake S3 request")
+    parser.add_argument("--port", type=int, default=5057)
+    args = parser.parse_args()
+    sizes = [int(s) for s in args.sizes.split(",")]
+
+    conn = connect()
+    cleanup(conn)  # leftovers from an interrupted run
+    create_user(conn)
+    results = []
+    try:
+        with FakeServices({"s3": args.s3_latency}) as fakes, tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ, **fakes.env())
+            env["MAX_UPLOAD_BYTES"] = str(max(sizes) * MB + MB)  # multipart overhead
+            env.pop("PROMETHEUS_MULTIPROC_DIR", None)
+            process, base_url = start_app(env, args.port)
+            try:
+                session = requests.Session()
+                session.post(
+                    base_url + "/api/login", json={"email": EMAIL, "password": PASSWORD}
+                ).raise_for_status()
+                for size in sizes:
+                    path = write_file(tmp, size)
+                    reset_peak(process.pid)
+                    baseline, _ = memory_kb(process.pid)
+                    started = time.perf_counter()
+                    with open(path, "rb") as f:
+                        response = session.post(
+                            f"{base_url}/api/upload-{args.route}",
+                            files={"file": (os.path.basename(path), f, "image/jpeg")},
+                            timeout=600,
+                        )
+                    elapsed = time.perf_counter() - started
+                    _, peak = memory_kb(process.pid)
+                    results.append((size, response.status_code, elapsed, baseline, peak))
+                    os.remove(path)
+                s3_calls = fakes.calls()["s3"]
+            finally:
+                process.terminate()
+                process.wait(timeout=10)
+    finally:
+        cleanup(conn)
+        conn.close()
+
+    print(f"{'size':>7} {'status':>6} {'seconds':>8} {'baseline MB':>12} {'peak MB':>8} {'growth MB':>10}")
+    for size, status, elapsed, baseline, peak in results:
+        print(
+            f"{size:>5}MB {status:>6} {elapsed:>8.2f} {baseline / 1024:>12.1f} "
+            f"{peak / 1024:>8.1f} {(peak - baseline) / 1024:>10.1f}"
+        )
+    print(f"fake S3 requests: {s3_calls}")
+
+
+if __name__ == "__main__":
+    main()
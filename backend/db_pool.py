@@ -0,0 +1,248 @@
+"""
+Express Auto API - PostgreSQL connection pool
+
+A bounded, thread-safe pool of psycopg2 connections. app.py borrows one
+connection per request (see get_db_connection) and hands it back on teardown,
+so load_user and the view share a single connection instead of each paying for
+a fresh TCP + auth handshake.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+
+import psycopg2
+from psycopg2 import extensions
+
+
+class PoolTimeout(psycopg2.OperationalError):
+    """Raised when no connection became available within the wait timeout"""
+
+
+class ConnectionPool:
+    """Bounded pool that health-checks on checkout and recycles old connections"""
+
+    def __init__(
+        self,
+        connect,
+        min_size=0,
+        max_size=10,
+        timeout=5.0,
+        max_lifetime=1800.0,
+        health_check_after=30.0,
+    ):
+        """
+        connect            - zero-argument callable returning a new psycopg2 connection
+        min_size           - connections opened eagerly and kept idle
+        max_size           - hard cap on connections open at once
+        timeout            - seconds getconn() waits for a free connection
+        max_lifetime       - seconds after which a connection is closed and replaced
+        health_check_after - idle seconds after which a checkout runs SELECT 1 first
+        """
+        if max_size < 1 or min_size > max_size:
+            raise ValueError("Pool requires 0 <= min_size <= max_size and max_size >= 1")
+
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.health_check_after = health_check_after
+
+        self._lock = threading.Condition()
+        self._idle = deque()  # (conn, created_at, returned_at)
+        self._created_at = {}  # id(conn) -> creation time for in-use connections
+        self._size = 0  # open connections, idle + in use
+        self._closed = False
+
+        self._stats = {
+            "checkouts": 0,
+            "connections_opened": 0,
+            "connections_closed": 0,
+            "recycled": 0,
+            "health_check_failures": 0,
+            "waits": 0,
+            "wait_time_total": 0.0,
+            "timeouts": 0,
+            "peak_in_use": 0,
+        }
+
+        for _ in range(min_size):
+            conn = self._open()
+            self._idle.append((conn, time.monotonic(), time.monotonic()))
+
+    # CONNECTION LIFECYCLE
+
+    def _open(self):
+        """Opens a new physical connection; caller must hold the size slot"""
+        conn = self._connect()
+        with self._lock:
+            self._size += 1
+            self._stats["connections_opened"] += 1
+        return conn
+
+    def _discard(self, conn):
+        """Closes a physical connection and frees its size slot"""
+        try:
+            if not conn.closed:
+                conn.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._size -= 1
+            self._stats["connections_closed"] += 1
+            self._created_at.pop(id(conn), None)
+            self._lock.notify()
+
+    def _is_healthy(self, conn, returned_at):
+        """Cheap liveness check; only round-trips if the connection sat idle a while"""
+        if conn.closed:
+            return False
+        if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+            return False
+        if time.monotonic() - returned_at < self.health_check_after:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self, timeout=None):
+        """Borrows a connection, waiting up to `timeout` seconds for one to free up"""
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        waited = False
+
+        while True:
+            with self._lock:
+                if self._closed:
+                    raise psycopg2.InterfaceError("Connection pool is closed")
+
+                candidate = self._idle.pop() if self._idle else None
+                reserve = candidate is None and self._size < self.max_size
+                if reserve:
+                    self._size += 1  # reserve the slot before connecting outside the lock
+
+                if candidate is None and not reserve:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["timeouts"] += 1
+                        raise PoolTimeout(
+                            f"Timed out after {timeout}s waiting for a database connection"
+                        )
+                    if not waited:
+                        self._stats["waits"] += 1
+                        waited = True
+                    started = time.monotonic()
+                    self._lock.wait(remaining)
+                    self._stats["wait_time_total"] += time.monotonic() - started
+                    continue
+
+            if reserve:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._size -= 1
+                        self._lock.notify()
+                    raise
+                created_at = time.monotonic()
+                with self._lock:
+                    self._stats["connections_opened"] += 1
+                return self._checked_out(conn, created_at)
+
+            conn, created_at, returned_at = candidate
+            if time.monotonic() - created_at > self.max_lifetime:
+                self._count("recycled")
+                self._discard(conn)
+                continue
+            if not self._is_healthy(conn, returned_at):
+                self._count("health_check_failures")
+                self._discard(conn)
+                continue
+            return self._checked_out(conn, created_at)
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _checked_out(self, conn, created_at):
+        with self._lock:
+            self._created_at[id(conn)] = created_at
+            self._stats["checkouts"] += 1
+            in_use = self._size - len(self._idle)
+            if in_use > self._stats["peak_in_use"]:
+                self._stats["peak_in_use"] = in_use
+        return conn
+
+    def putconn(self, conn, discard=False):
+        """Returns a borrowed connection, rolling back anything left open"""
+        if not discard and not conn.closed:
+            try:
+                if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+                # Routes such as the Stripe webhook flip autocommit; reset it for the next borrower
+                if conn.autocommit:
+                    conn.autocommit = False
+            except psycopg2.Error:
+                discard = True
+
+        with self._lock:
+            created_at = self._created_at.get(id(conn))
+            expired = (
+                created_at is None or time.monotonic() - created_at > self.max_lifetime
+            )
+            if not discard and not conn.closed and not self._closed and not expired:
+                del self._created_at[id(conn)]
+                self._idle.append((conn, created_at, time.monotonic()))
+                self._lock.notify()
+                return
+            if expired and not discard:
+                self._stats["recycled"] += 1
+
+        self._discard(conn)
+
+    def closeall(self):
+        """Closes every idle connection and refuses further checkouts"""
+        with self._lock:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._lock.notify_all()
+        for conn, _, _ in idle:
+            self._discard(conn)
+
+    # MONITORING
+
+    def stats(self):
+        """Returns a snapshot of pool size, saturation and lifetime counters"""
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot.update(
+                {
+                    "min_size": self.min_size,
+                    "max_size": self.max_size,
+                    "size": self._size,
+                    "idle": len(self._idle),
+                    "in_use": self._size - len(self._idle),
+                    "timeout": self.timeout,
+                    "max_lifetime": self.max_lifetime,
+                }
+            )
+        snapshot["wait_time_total"] = round(snapshot["wait_time_total"], 6)
+        return snapshot
+
+
+def pool_settings_from_env():
+    """Reads pool sizing from DB_POOL_* environment variables"""
+    return {
+        "min_size": int(os.getenv("DB_POOL_MIN_SIZE", "1")),
+        "max_size": int(os.getenv("DB_POOL_MAX_SIZE", "10")),
+        "timeout": float(os.getenv("DB_POOL_TIMEOUT", "5")),
+        "max_lifetime": float(os.getenv("DB_POOL_MAX_LIFETIME", "1800")),
+        "health_check_after": float(os.getenv("DB_POOL_HEALTH_CHECK_AFTER", "30")),
+    }
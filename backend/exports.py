@@ -0,0 +1,162 @@
+"""
+Express Auto API - Streaming admin exports
+
+Each dataset is read through a psycopg2 named (server-side) cursor, so only
+EXPORT_FETCH_SIZE rows are held in memory at a time, and written out as NDJSON
+or CSV chunk by chunk. Memory stays flat whether an export has a thousand rows
+or millions.
+"""
+
+import csv
+import io
+import json
+import os
+from datetime import date, datetime
+from decimal import Decimal
+
+from psycopg2.extras import RealDictCursor
+
+EXPORT_FETCH_SIZE = int(os.getenv("EXPORT_FETCH_SIZE", "2000"))
+
+# name -> query, the column date-range filters apply to, the column ?status= matches
+EXPORT_DATASETS = {
+    "users": {
+        "sql": """
+            SELECT user_id, email, first_name, last_name, phone, address, city, state,
+                   zip_code, date_registered, is_active, is_admin, last_login
+            FROM users
+        """,
+        "date_column": "date_registered",
+        "status_column": None,
+        "order_by": "user_id",
+    },
+    "vehicles": {
+        "sql": """
+            SELECT vehicle_id, user_id, make, model, year, vin, license_plate, color,
+                   mileage, engine_type, transmission, vehicle_status, is_primary, date_added
+            FROM vehicles
+        """,
+        "date_column": "date_added",
+        "status_column": "vehicle_status",
+        "order_by": "vehicle_id",
+    },
+    "invoices": {
+        # Items are aggregated per invoice so each exported record is self-contained
+        "sql": """
+            SELECT i.invoice_id, i.invoice_number, i.user_id, i.vehicle_id, i.subtotal,
+                   i.tax_amount, i.discount_amount, i.total_amount, i.currency, i.status,
+                   i.issue_date, i.due_date, i.notes,
+                   COALESCE(
+                       (SELECT json_agg(json_build_object(
+                                   'item_id', it.item_id,
+                                   'service_id', it.service_id,
+                                   'description', it.description,
+                                   'quantity', it.quantity,
+                                   'unit_price', it.unit_price,
+                                   'discount_amount', it.discount_amount,
+                                   'total_price', it.total_price
+                               ) ORDER BY it.item_id)
+                        FROM invoice_items it WHERE it.invoice_id = i.invoice_id),
+                       '[]'::json
+                   ) AS items
+            FROM invoices i
+        """,
+        "date_column": "i.issue_date",
+        "status_column": "i.status",
+        "order_by": "i.invoice_id",
+    },
+    "payments": {
+        "sql": """
+            SELECT payment_id, invoice_id, payment_method, amount, payment_date,
+                   transaction_id, status, notes
+            FROM payments
+        """,
+        "date_column": "payment_date",
+        "status_column": "status",
+        "order_by": "payment_id",
+    },
+}
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def build_export_query(dataset, date_from=None, date_to=None, status=None):
+    """Returns (sql, params) for a dataset with optional date range and status filters"""
+    spec = EXPORT_DATASETS[dataset]
+    clauses, params = [], []
+    if date_from is not None:
+        clauses.append(f"{spec['date_column']} >= %s")
+        params.append(date_from)
+    if date_to is not None:
+        clauses.append(f"{spec['date_column']} < %s")
+        params.append(date_to)
+    if status is not None:
+        if spec["status_column"] is None:
+            raise ValueError(f"The {dataset} export does not support a status filter")
+        clauses.append(f"{spec['status_column']} = %s")
+        params.append(status)
+
+    sql = spec["sql"]
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    sql += f" ORDER BY {spec['order_by']}"
+    return sql, params
+
+
+def _plain(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def _ndjson_chunk(rows):
+    return "".join(json.dumps(row, default=_plain) + "\n" for row in rows)
+
+
+def _csv_chunk(rows, columns, include_header):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if include_header:
+        writer.writerow(columns)
+    for row in rows:
+        writer.writerow(
+            [
+                json.dumps(v, default=_plain) if isinstance(v, (list, dict)) else _plain(v)
+                for v in row.values()
+            ]
+        )
+    return buffer.getvalue()
+
+
+def stream_export(conn, dataset, fmt, date_from=None, date_to=None, status=None):
+    """
+    Yields the export as text chunks, one per server-side fetch.
+
+    The named cursor only lives inside the connection's current transaction, so
+    the caller must keep the connection borrowed until the generator finishes.
+    """
+    sql, params = build_export_query(dataset, date_from, date_to, status)
+    cursor = conn.cursor(name=f"export_{dataset}", cursor_factory=RealDictCursor)
+    cursor.itersize = EXPORT_FETCH_SIZE
+    try:
+        cursor.execute(sql, params)
+        first = True
+        while True:
+            rows = cursor.fetchmany(EXPORT_FETCH_SIZE)
+            if not rows:
+                if first and fmt == "csv" and cursor.description:
+                    yield _csv_chunk([], [c.name for c in cursor.description], True)
+                break
+            if fmt == "csv":
+                yield _csv_chunk(rows, list(rows[0].keys()), first)
+            else:
+                yield _ndjson_chunk(rows)
+            first = False
+    finally:
+        cursor.close()
+        conn.rollback()  # Read-only export; end the transaction that held the cursor
@@ -0,0 +1,35 @@
+"""
+Gunicorn settings for the Express Auto API.
+
+    PROMETHEUS_MULTIPROC_DIR=/tmp/xpress-metrics gunicorn app:app
+
+When PROMETHEUS_MULTIPROC_DIR is set, every worker writes its metrics to files
+in that directory and /metrics merges them, so a scrape sees all workers.
+/metrics only answers requests that carry "Authorization: Bearer $METRICS_TOKEN"
+(Prometheus: authorization.credentials in the scrape config); without
+METRICS_TOKEN it returns 404.
+"""
+
+import os
+import shutil
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5000")
+workers = int(os.getenv("GUNICORN_WORKERS", "4"))
+# Every open /api/notifications/stream holds a thread, so leave 4 for ordinary
+# requests on top of the SSE cap
+threads = int(os.getenv("GUNICORN_THREADS", 4 + int(os.getenv("SSE_MAX_STREAMS", "16"))))
+
+
+def on_starting(server):
+    # Stale files from a previous run would be merged into the new counters
+    metrics_dir = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if metrics_dir:
+        shutil.rmtree(metrics_dir, ignore_errors=True)
+        os.makedirs(metrics_dir, exist_ok=True)
+
+
+def child_exit(server, worker):
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,78 @@
+"""
+Express Auto API - List pages assembled as JSON by PostgreSQL
+
+The row path (RealDictCursor -> a dict per row -> formatting loop -> jsonify)
+costs Python CPU and memory in proportion to the page size. json_page() hands
+that work to Postgres: page_sql still selects the LIMIT limit + 1 rows, and a
+wrapper query turns the first `limit` of them into one JSON array with
+json_build_object/json_agg (optionally grouped). The result comes back as a
+single text value, which is never parsed in Python.
+
+Routes wrap that text in RawJSON and build their response with
+render_json(), which splices RawJSON values in verbatim and serializes
+everything else normally. Dates come out in ISO 8601 and numerics as JSON
+numbers, as Postgres writes them.
+
+PG_JSON_RESPONSES=0 switches the routes back to the row path, e.g. to compare
+the two with benchmarks.json_responses.
+"""
+
+import json
+import os
+
+from pagination import encode_cursor
+
+PG_JSON_RESPONSES = os.getenv("PG_JSON_RESPONSES", "1") == "1"
+
+# {n} is the row's position in page order; only rows with n <= limit are
+# rendered, and the extra row only tells us whether there is a next page
+JSON_PAGE_SQL = """
+    WITH page AS ({page_sql}),
+    numbered AS (SELECT page.*, row_number() OVER (ORDER BY {order_by}) AS n FROM page),
+    kept AS (SELECT * FROM numbered WHERE n <= {limit}),
+    docs AS (SELECT {doc_position} AS n, {doc} AS doc FROM kept {group_by})
+    SELECT
+        (SELECT COALESCE(json_agg(doc ORDER BY n), '[]'::json) FROM docs)::text AS body,
+        (SELECT count(*) FROM page) > {limit} AS has_more,
+        (SELECT json_build_array({key}) FROM kept ORDER BY n DESC LIMIT 1) AS last_key
+"""
+
+
+class RawJSON(str):
+    """JSON text that render_json() inserts as is"""
+
+
+def json_page(cursor, page_sql, params, limit, order_by, key, doc, group_by=None):
+    """
+    Runs page_sql (which must fetch limit + 1 rows) and has Postgres render the page.
+
+    order_by - page order in terms of page_sql's output columns
+    key      - the sort-key columns next_cursor is built from
+    doc      - JSON expression for one row, or for one group with group_by
+               (kept.n is the row's position; groups keep their first row's place)
+
+    Returns (RawJSON array, next_cursor).
+    """
+    sql = JSON_PAGE_SQL.format(
+        page_sql=page_sql,
+        order_by=order_by,
+        limit=int(limit),
+        doc_position="min(n)" if group_by else "n",
+        doc=doc,
+        group_by=f"GROUP BY {group_by}" if group_by else "",
+        key=key,
+    )
+    cursor.execute(sql, params)
+    row = cursor.fetchone()
+    next_cursor = encode_cursor(row["last_key"]) if row["has_more"] else None
+    return RawJSON(row["body"]), next_cursor
+
+
+def render_json(value, dumps):
+    """Serializes value with dumps, splicing in RawJSON values found in (nested) dicts"""
+    if isinstance(value, RawJSON):
+        return value
+    # Only dicts that hold RawJSON somewhere below are taken apart
+    if isinstance(value, dict) and any(isinstance(v, (RawJSON, dict)) for v in value.values()):
+        return "{" + ",".join(f"{json.dumps(str(k))}:{render_json(v, dumps)}" for k, v in value.items()) + "}"
+    return dumps(value)
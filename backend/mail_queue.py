@@ -0,0 +1,322 @@
+"""
+Express Auto API - Outgoing mail queue
+
+Routes call enqueue_mail() to insert a row into mail_outbox and return right
+away. A MailSender thread in each worker claims due rows in batches
+(FOR UPDATE SKIP LOCKED, so workers never send the same row twice), delivers
+them over one SMTP connection that stays open between batches, and records
+the outcome on the row:
+
+    sent     delivered; sent_at is set
+    queued   transient failure (4xx reply, dropped connection, timeout);
+             retried after an exponential backoff with jitter
+    failed   permanent 5xx rejection, or MAIL_QUEUE_MAX_ATTEMPTS reached
+
+A connection that has sat idle is checked with NOOP before reuse, and it is
+closed after MAIL_SMTP_IDLE_TIMEOUT seconds with nothing to send, before the
+server drops it on its own.
+"""
+
+import logging
+import os
+import random
+import smtplib
+import threading
+import time
+from email.message import EmailMessage
+
+import psycopg2
+
+from metrics import track_dependency
+
+logger = logging.getLogger("xpressauto.mail")
+
+NOOP_AFTER_IDLE = 10.0  # seconds; a connection used more recently than this is assumed alive
+
+
+def enqueue_mail(cursor, kind, recipients, subject, body, sender=None, reply_to=None):
+    """Queues a message on the caller's transaction and returns its mail_id"""
+    cursor.execute(
+        """
+        INSERT INTO mail_outbox (kind, sender, recipients, reply_to, subject, body)
+        VALUES (%s, %s, %s, %s, %s, %s)
+        RETURNING mail_id
+        """,
+        (kind, sender, list(recipients), reply_to, subject, body),
+    )
+    return cursor.fetchone()["mail_id"]
+
+
+CLAIM_SQL = """
+    UPDATE mail_outbox
+    SET status = 'sending', attempts = attempts + 1, claimed_at = CURRENT_TIMESTAMP
+    WHERE mail_id IN (
+        SELECT mail_id FROM mail_outbox
+        WHERE (status = 'queued' AND next_attempt_at <= CURRENT_TIMESTAMP)
+           OR (status = 'sending' AND claimed_at < CURRENT_TIMESTAMP - make_interval(secs => %s))
+        ORDER BY mail_id
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING mail_id, sender, recipients, reply_to, subject, body, attempts
+"""
+
+
+class TransientMailError(Exception):
+    """A delivery failure worth retrying later"""
+
+
+class PermanentMailError(Exception):
+    """A delivery failure that will not succeed on retry"""
+
+
+class SMTPConnection:
+    """One reusable SMTP session, reopened when the server has dropped it"""
+
+    def __init__(self, host, port, use_tls, username=None, password=None, timeout=10.0):
+        self.host = host
+        self.port = port
+        self.use_tls = use_tls
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+        self._smtp = None
+        self.last_used = 0.0
+        self.connects = 0
+
+    def _open(self):
+        with track_dependency("smtp", "connect"):
+            smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            try:
+                if self.use_tls:
+                    smtp.starttls()
+                if self.username and self.password:
+                    smtp.login(self.username, self.password)
+            except Exception:
+                smtp.close()
+                raise
+        self._smtp = smtp
+        self.connects += 1
+
+    def _alive(self):
+        try:
+            return self._smtp.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    def send(self, message):
+        """Sends one EmailMessage, raising TransientMailError or PermanentMailError"""
+        try:
+            idle = time.monotonic() - self.last_used
+            if self._smtp is None or (idle > NOOP_AFTER_IDLE and not self._alive()):
+                self.close()
+                self._open()
+            with track_dependency("smtp", "send"):
+                refused = self._smtp.send_message(message)
+        except smtplib.SMTPRecipientsRefused as e:
+            codes = [code for code, _ in e.recipients.values()]
+            error_class = PermanentMailError if all(c >= 500 for c in codes) else TransientMailError
+            raise error_class(f"All recipients refused: {e.recipients}") from e
+        except smtplib.SMTPResponseException as e:
+            if e.smtp_code >= 500 and not isinstance(e, smtplib.SMTPAuthenticationError):
+                raise PermanentMailError(f"{e.smtp_code} {e.smtp_error!r}") from e
+            self.close()
+            raise TransientMailError(f"{e.smtp_code} {e.smtp_error!r}") from e
+        except (smtplib.SMTPException, OSError) as e:
+            self.close()
+            raise TransientMailError(str(e) or type(e).__name__) from e
+        finally:
+            self.last_used = time.monotonic()
+        if refused:
+            logger.warning("Some recipients were refused: %s", refused)
+
+    def close(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._smtp = None
+
+    @property
+    def is_open(self):
+        return self._smtp is not None
+
+
+def build_message(row):
+    """Turns a claimed mail_outbox row into an EmailMessage"""
+    try:
+        message = EmailMessage()
+        message["Subject"] = row["subject"]
+        message["From"] = row["sender"]
+        message["To"] = ", ".join(row["recipients"])
+        if row["reply_to"]:
+            message["Reply-To"] = row["reply_to"]
+        message.set_content(row["body"])
+    except (ValueError, TypeError) as e:  # e.g. a header containing a newline
+        raise PermanentMailError(f"Invalid message: {e}") from e
+    return message
+
+
+class MailSender:
+    """Background thread that drains mail_outbox over a persistent SMTP connection"""
+
+    def __init__(
+        self,
+        connect_db,
+        smtp,
+        batch_size=20,
+        poll_interval=5.0,
+        idle_timeout=60.0,
+        max_attempts=8,
+        retry_base=30.0,
+        stale_after=300.0,
+    ):
+        self.connect_db = connect_db
+        self.smtp = smtp
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.idle_timeout = idle_timeout
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.stale_after = stale_after
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._conn = None
+        self._stats = {"batches": 0, "sent": 0, "retried": 0, "failed": 0, "errors": 0}
+
+    def ensure_running(self):
+        """Starts the sender thread in this process if it isn't running yet"""
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid != os.getpid() or self._thread is None or not self._thread.is_alive():
+                self._pid = os.getpid()
+                self._conn = None  # never reuse a connection inherited across fork
+                self._thread = threading.Thread(target=self._run, name="mail-sender", daemon=True)
+                self._thread.start()
+
+    def wake(self):
+        """Asks the sender to look for new mail now rather than at the next poll"""
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            try:
+                claimed = self.deliver_batch()
+            except Exception:
+                self._stats["errors"] += 1
+                logger.exception("Mail sender batch failed")
+                self._reset_db()
+                claimed = 0
+            if claimed >= self.batch_size:
+                continue  # more is probably waiting
+            if self.smtp.is_open and time.monotonic() - self.smtp.last_used > self.idle_timeout:
+                self.smtp.close()
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def _db(self):
+        if self._conn is None or self._conn.closed:
+            self._conn = self.connect_db()
+        return self._conn
+
+    def _reset_db(self):
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except psycopg2.Error:
+                pass
+        self._conn = None
+
+    def _retry_delay(self, attempts):
+        delay = self.retry_base * (2 ** (attempts - 1))
+        return min(delay, 6 * 3600) * random.uniform(0.8, 1.2)
+
+    def deliver_batch(self):
+        """Claims, sends and records one batch; returns how many rows were claimed"""
+        conn = self._db()
+        with conn.cursor() as cursor:
+            cursor.execute(CLAIM_SQL, (self.stale_after, self.batch_size))
+            rows = cursor.fetchall()
+        conn.commit()  # the claim must be visible before the slow part starts
+        if not rows:
+            return 0
+
+        sent, outcomes = [], []
+        for row in rows:
+            try:
+                self.smtp.send(build_message(row))
+                sent.append(row["mail_id"])
+            except PermanentMailError as e:
+                outcomes.append(("failed", str(e), 0, row["mail_id"]))
+            except TransientMailError as e:
+                if row["attempts"] >= self.max_attempts:
+                    outcomes.append(("failed", str(e), 0, row["mail_id"]))
+                else:
+                    outcomes.append(
+                        ("queued", str(e), self._retry_delay(row["attempts"]), row["mail_id"])
+                    )
+
+        with conn.cursor() as cursor:
+            if sent:
+                cursor.execute(
+                    """
+                    UPDATE mail_outbox
+                    SET status = 'sent', sent_at = CURRENT_TIMESTAMP, claimed_at = NULL, last_error = NULL
+                    WHERE mail_id = ANY(%s)
+                    """,
+                    (sent,),
+                )
+            if outcomes:
+                cursor.executemany(
+                    """
+                    UPDATE mail_outbox
+                    SET status = %s, last_error = %s, claimed_at = NULL,
+                        next_attempt_at = CURRENT_TIMESTAMP + make_interval(secs => %s)
+                    WHERE mail_id = %s
+                    """,
+                    outcomes,
+                )
+        conn.commit()
+
+        self._stats["batches"] += 1
+        self._stats["sent"] += len(sent)
+        for status, error, _, mail_id in outcomes:
+            self._stats["retried" if status == "queued" else "failed"] += 1
+            logger.warning("Mail %s %s: %s", mail_id, "will be retried" if status == "queued" else "failed", error)
+        return len(rows)
+
+    def stats(self):
+        snapshot = dict(self._stats)
+        snapshot.update(
+            {
+                "running": self._thread is not None and self._thread.is_alive(),
+                "smtp_open": self.smtp.is_open,
+                "smtp_connects": self.smtp.connects,
+            }
+        )
+        return snapshot
+
+
+def mail_sender_from_env(connect_db, host, port, use_tls, username, password):
+    """Builds a MailSender tuned by the MAIL_QUEUE_* and MAIL_SMTP_* environment variables"""
+    smtp = SMTPConnection(
+        host,
+        port,
+        use_tls,
+        username=username,
+        password=password,
+        timeout=float(os.getenv("MAIL_SMTP_TIMEOUT", "10")),
+    )
+    return MailSender(
+        connect_db,
+        smtp,
+        batch_size=int(os.getenv("MAIL_QUEUE_BATCH_SIZE", "20")),
+        poll_interval=float(os.getenv("MAIL_QUEUE_POLL_INTERVAL", "5")),
+        idle_timeout=float(os.getenv("MAIL_SMTP_IDLE_TIMEOUT", "60")),
+        max_attempts=int(os.getenv("MAIL_QUEUE_MAX_ATTEMPTS", "8")),
+        retry_base=float(os.getenv("MAIL_QUEUE_RETRY_BASE", "30")),
+    )
@@ -0,0 +1,445 @@
+"""
+Express Auto API - Thumbnails and responsive WebP variants for media
+
+Every new media row starts with variants_status 'pending'. A
+MediaVariantWorker thread in each gunicorn worker claims pending rows in
+batches (FOR UPDATE SKIP LOCKED). It hands them to a small thread pool, which
+downloads the original from S3 and writes next to it:
+
+    <key>.thumb.webp      fits in THUMBNAIL_SIZE, for gallery tiles
+    <key>.w<width>.webp   one per MEDIA_VARIANT_WIDTHS entry narrower than the original
+
+The worker then fills thumbnail_url and variants ({"thumbnail": ..., "widths":
+[{"width", "height", "url"}, ...]}). Pillow's decode and resample release the
+GIL, so the pool really runs in parallel. None of this is on the request path.
+Unreadable images are marked 'failed' at once. A row that hits an S3 error
+stays 'processing' and is reclaimed once its claim is stale (the same path
+that recovers rows from a dead worker). A stale claim that has already used
+MEDIA_VARIANT_MAX_ATTEMPTS is marked 'failed' instead of being claimed again,
+so an image that keeps killing its worker can't loop forever.
+
+Files stored as content-addressed blobs (migration 0013) are rendered once:
+the first row's variants are saved on media_blobs.variants and every later
+row with the same file_url reuses them without touching S3.
+
+Rows that predate migration 0011 have variants_status NULL; --backfill queues them.
+
+Usage (from backend/):
+    python media_variants.py --backfill                # mark old rows pending for the workers
+    python media_variants.py --backfill --run          # ...and process them in this process
+    python media_variants.py --backfill --dry-run      # only count them
+"""
+
+import argparse
+import io
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import psycopg2
+from botocore.exceptions import BotoCoreError, ClientError
+from PIL import Image, ImageOps, UnidentifiedImageError
+from psycopg2.extras import Json
+
+from metrics import track_dependency
+
+logger = logging.getLogger("xpressauto.media_variants")
+
+THUMBNAIL_SIZE = (320, 320)
+DEFAULT_WIDTHS = (480, 960, 1600)
+WEBP_QUALITY = 80
+VARIANT_CACHE_CONTROL = "public, max-age=31536000, immutable"  # keys never change content
+
+Image.MAX_IMAGE_PIXELS = 50_000_000  # refuse decompression bombs rather than exhaust memory
+
+# Stale claims that are out of attempts; runs just before CLAIM_SQL
+FAIL_EXHAUSTED_SQL = """
+    UPDATE media
+    SET variants_status = 'failed', variants_claimed_at = NULL,
+        variants_error = COALESCE(variants_error, 'worker stopped while processing')
+    WHERE variants_status = 'processing'
+      AND variants_claimed_at < CURRENT_TIMESTAMP - make_interval(secs => %s)
+      AND variants_attempts >= %s
+    RETURNING media_id, variants_attempts, variants_error
+"""
+
+CLAIM_SQL = """
+    UPDATE media
+    SET variants_status = 'processing', variants_attempts = variants_attempts + 1,
+        variants_claimed_at = CURRENT_TIMESTAMP
+    WHERE media_id IN (
+        SELECT media_id FROM media
+        WHERE variants_status = 'pending'
+           OR (variants_status = 'processing'
+               AND variants_claimed_at < CURRENT_TIMESTAMP - make_interval(secs => %s)
+               AND variants_attempts < %s)
+        ORDER BY media_id
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING media_id, file_url, media_type, variants_attempts,
+        (SELECT variants FROM media_blobs b WHERE b.url = media.file_url) AS blob_variants
+"""
+
+BACKFILL_SQL = """
+    WITH batch AS (
+        SELECT media_id FROM media
+        WHERE variants_status IS NULL
+        ORDER BY media_id
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    )
+    UPDATE media m SET variants_status = 'pending'
+    FROM batch b
+    WHERE m.media_id = b.media_id
+"""
+
+
+class UnusableImage(Exception):
+    """The original can't be turned into variants; retrying won't help"""
+
+
+def _encode_webp(image):
+    buffer = io.BytesIO()
+    image.save(buffer, "WEBP", quality=WEBP_QUALITY, method=4)
+    return buffer.getvalue()
+
+
+def render_variants(data, widths=DEFAULT_WIDTHS):
+    """Returns [(label, width, height, webp_bytes)] for one original image"""
+    try:
+        with Image.open(io.BytesIO(data)) as original:
+            # JPEG only: decode at a reduced scale that still covers the largest
+            # variant in either orientation
+            target = max(list(widths) + [max(THUMBNAIL_SIZE)])
+            original.draft("RGB", (target, target))
+            image = ImageOps.exif_transpose(original)
+            image.load()
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError) as e:
+        raise UnusableImage(str(e)) from e
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "A" in image.getbands() or "transparency" in image.info else "RGB")
+
+    variants = []
+    thumbnail = image.copy()
+    thumbnail.thumbnail(THUMBNAIL_SIZE, Image.Resampling.LANCZOS)
+    variants.append(("thumb", thumbnail.width, thumbnail.height, _encode_webp(thumbnail)))
+    for width in sorted(widths):
+        if width >= image.width:
+            break  # never upscale
+        height = max(1, round(image.height * width / image.width))
+        resized = image.resize((width, height), Image.Resampling.LANCZOS, reducing_gap=2.0)
+        variants.append((f"w{width}", width, height, _encode_webp(resized)))
+    return variants
+
+
+class MediaVariantWorker:
+    """Background thread that claims pending media rows and renders them on a thread pool"""
+
+    def __init__(
+        self,
+        connect_db,
+        s3_client,
+        bucket,
+        object_url,
+        object_key,
+        widths=DEFAULT_WIDTHS,
+        concurrency=2,
+        batch_size=8,
+        poll_interval=10.0,
+        max_attempts=3,
+        stale_after=600.0,
+    ):
+        self.connect_db = connect_db
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.object_url = object_url  # key -> public URL
+        self.object_key = object_key  # public URL -> key
+        self.widths = tuple(widths)
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.stale_after = stale_after
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._pool = None
+        self._conn = None
+        self._stats = {
+            "batches": 0,
+            "ready": 0,
+            "retried": 0,
+            "failed": 0,
+            "variants": 0,
+            "reused": 0,
+            "errors": 0,
+        }
+
+    def ensure_running(self):
+        """Starts the worker thread and its pool in this process if they aren't running yet"""
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid != os.getpid() or self._thread is None or not self._thread.is_alive():
+                self._pid = os.getpid()
+                self._conn = None  # never reuse a connection inherited across fork
+                self._pool = None
+                self._thread = threading.Thread(target=self._run, name="media-variants", daemon=True)
+                self._thread.start()
+
+    def wake(self):
+        """Asks the worker to look for new media now rather than at the next poll"""
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            # Cleared before the batch, so a wake() that arrives while it runs isn't lost
+            self._wake.clear()
+            try:
+                claimed = self.process_batch()
+            except Exception:
+                self._stats["errors"] += 1
+                logger.exception("Media variant batch failed")
+                self._reset_db()
+                claimed = 0
+            if claimed >= self.batch_size:
+                continue  # more is probably waiting
+            self._wake.wait(self.poll_interval)
+
+    def _db(self):
+        if self._conn is None or self._conn.closed:
+            self._conn = self.connect_db()
+        return self._conn
+
+    def _reset_db(self):
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except psycopg2.Error:
+                pass
+        self._conn = None
+
+    def _executor(self):
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(self.concurrency, thread_name_prefix="media-variants")
+        return self._pool
+
+    def _render_one(self, row):
+        """Downloads, renders and uploads one row's variants; returns the variants document"""
+        if row["media_type"] != "image":
+            raise UnusableImage(f"media_type {row['media_type']!r} has no image variants")
+        key = self.object_key(row["file_url"])
+        with track_dependency("s3", "get_object"):
+            data = self.s3_client.get_object(Bucket=self.bucket, Key=key)["Body"].read()
+        document = {"thumbnail": None, "widths": []}
+        for label, width, height, body in render_variants(data, self.widths):
+            variant_key = f"{key}.{label}.webp"
+            with track_dependency("s3", "put_object"):
+                self.s3_client.put_object(
+                    Bucket=self.bucket,
+                    Key=variant_key,
+                    Body=body,
+                    ContentType="image/webp",
+                    CacheControl=VARIANT_CACHE_CONTROL,
+                    ACL="public-read",
+                )
+            entry = {"width": width, "height": height, "url": self.object_url(variant_key)}
+            if label == "thumb":
+                document["thumbnail"] = entry
+            else:
+                document["widths"].append(entry)
+        return document
+
+    def process_batch(self):
+        """Claims, renders and records one batch; returns how many rows were claimed"""
+        conn = self._db()
+        with conn.cursor() as cursor:
+            cursor.execute(FAIL_EXHAUSTED_SQL, (self.stale_after, self.max_attempts))
+            exhausted = cursor.fetchall()
+            cursor.execute(CLAIM_SQL, (self.stale_after, self.max_attempts, self.batch_size))
+            rows = cursor.fetchall()
+        conn.commit()  # the claim must be visible before the slow part starts
+        self._stats["failed"] += len(exhausted)
+        for row in exhausted:
+            logger.warning(
+                "Media %s variants failed after %s attempts: %s",
+                row["media_id"],
+                row["variants_attempts"],
+                row["variants_error"],
+            )
+        if not rows:
+            return 0
+
+        ready, failed, retried, rendered = [], [], [], []
+        for row in rows:
+            if row["blob_variants"]:
+                document = row["blob_variants"]
+                ready.append((document["thumbnail"]["url"], Json(document), row["media_id"]))
+                self._stats["reused"] += 1
+        futures = [
+            (row, self._executor().submit(self._render_one, row)) for row in rows if not row["blob_variants"]
+        ]
+        for row, future in futures:
+            try:
+                document = future.result()
+                ready.append((document["thumbnail"]["url"], Json(document), row["media_id"]))
+                rendered.append((Json(document), row["file_url"]))
+                self._stats["variants"] += 1 + len(document["widths"])
+            except UnusableImage as e:
+                failed.append((str(e), row["media_id"]))
+            except (ClientError, BotoCoreError, OSError) as e:
+                if row["variants_attempts"] < self.max_attempts:
+                    retried.append((str(e), row["media_id"]))
+                else:
+                    failed.append((str(e), row["media_id"]))
+            except Exception as e:
+                # A bug or an unexpected library error; fail the row rather than lose the batch
+                logger.exception("Unexpected error rendering media %s", row["media_id"])
+                failed.append((f"{type(e).__name__}: {e}", row["media_id"]))
+
+        with conn.cursor() as cursor:
+            if ready:
+                cursor.executemany(
+                    """
+                    UPDATE media
+                    SET thumbnail_url = %s, variants = %s, variants_status = 'ready',
+                        variants_claimed_at = NULL, variants_error = NULL
+                    WHERE media_id = %s
+                    """,
+                    ready,
+                )
+            if rendered:
+                # Only blob URLs have a media_blobs row; other URLs match nothing
+                cursor.executemany(
+                    "UPDATE media_blobs SET variants = %s WHERE url = %s AND variants IS NULL", rendered
+                )
+            if failed:
+                cursor.executemany(
+                    """
+                    UPDATE media
+                    SET variants_status = 'failed', variants_error = %s, variants_claimed_at = NULL
+                    WHERE media_id = %s
+                    """,
+                    failed,
+                )
+            if retried:
+                # Left 'processing'; the claim goes stale and is picked up again
+                cursor.executemany(
+                    "UPDATE media SET variants_error = %s WHERE media_id = %s", retried
+                )
+        conn.commit()
+
+        self._stats["batches"] += 1
+        self._stats["ready"] += len(ready)
+        self._stats["failed"] += len(failed)
+        self._stats["retried"] += len(retried)
+        for error, media_id in failed:
+            logger.warning("Media %s variants failed: %s", media_id, error)
+        for error, media_id in retried:
+            logger.warning("Media %s variants will be retried: %s", media_id, error)
+        return len(rows)
+
+    def stats(self):
+        snapshot = dict(self._stats)
+        snapshot.update(
+            {
+                "running": self._thread is not None and self._thread.is_alive(),
+                "concurrency": self.concurrency,
+                "widths": list(self.widths),
+            }
+        )
+        return snapshot
+
+
+def media_variant_worker_from_env(connect_db, s3_client, bucket, object_url, object_key):
+    """Builds a MediaVariantWorker tuned by the MEDIA_VARIANT_* environment variables"""
+    widths = os.getenv("MEDIA_VARIANT_WIDTHS")
+    return MediaVariantWorker(
+        connect_db,
+        s3_client,
+        bucket,
+        object_url,
+        object_key,
+        widths=[int(w) for w in widths.split(",")] if widths else DEFAULT_WIDTHS,
+        concurrency=int(os.getenv("MEDIA_VARIANT_CONCURRENCY", "2")),
+        batch_size=int(os.getenv("MEDIA_VARIANT_BATCH_SIZE", "8")),
+        poll_interval=float(os.getenv("MEDIA_VARIANT_POLL_INTERVAL", "10")),
+        max_attempts=int(os.getenv("MEDIA_VARIANT_MAX_ATTEMPTS", "3")),
+    )
+
+
+# BACKFILL
+
+
+def count_backfill(conn):
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT COUNT(*) AS count FROM media WHERE variants_status IS NULL")
+        count = cursor.fetchone()["count"]
+    conn.rollback()
+    return count
+
+
+def queue_backfill(conn, batch_size=1000, pause=0.0):
+    """Marks pre-existing media rows pending, one short transaction per batch; returns the total"""
+    total = 0
+    while True:
+        with conn.cursor() as cursor:
+            cursor.execute(BACKFILL_SQL, (batch_size,))
+            queued = cursor.rowcount
+        conn.commit()
+        total += queued
+        if queued < batch_size:
+            return total
+        if pause:
+            time.sleep(pause)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--backfill", action="store_true", help="queue media rows that have no variants yet")
+    parser.add_argument("--run", action="store_true", help="process the queue here until it is empty")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--pause", type=float, default=0.05, help="seconds between backfill batches")
+    parser.add_argument("--dry-run", action="store_true", help="only count rows to backfill")
+    args = parser.parse_args()
+
+    if not (args.backfill or args.run):
+        parser.error("nothing to do; pass --backfill and/or --run")
+
+    from migrate import connect
+
+    conn = connect()
+    try:
+        if args.dry_run:
+            print(f"{count_backfill(conn)} media rows without variants")
+            return 0
+        if args.backfill:
+            print(f"Queued {queue_backfill(conn, args.batch_size, args.pause)} media rows")
+        if args.run:
+            # app.py owns the S3 client and the key <-> URL mapping
+            from app import S3_BUCKET_NAME, s3_client, s3_key_from_url, s3_object_url
+
+            worker = media_variant_worker_from_env(
+                connect, s3_client, S3_BUCKET_NAME, s3_object_url, s3_key_from_url
+            )
+            started = time.perf_counter()
+            while worker.process_batch():
+                pass
+            stats = worker.stats()
+            print(
+                f"Rendered {stats['ready']} media rows ({stats['variants']} files), "
+                f"{stats['failed']} failed, {stats['retried']} to retry, "
+                f"in {time.perf_counter() - started:.1f}s"
+            )
+        return 0
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+"""
+Express Auto API - Prometheus metrics
+
+Per-endpoint request counters and latency histograms, plus one histogram for
+every external dependency (Postgres, S3, Stripe, Twilio, Google Places,
+hCaptcha, SMTP) so a slow upstream can be told apart from a slow database.
+
+Under gunicorn, set PROMETHEUS_MULTIPROC_DIR to an empty writable directory
+before the workers start; each worker then writes its samples to mmap'd files
+and /metrics aggregates them across workers (see gunicorn.conf.py).
+Observations are a lock plus a float add, i.e. a few microseconds.
+"""
+
+import os
+import time
+from contextlib import contextmanager
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+REQUESTS = Counter(
+    "xpress_http_requests_total",
+    "HTTP requests handled, by Flask endpoint and status code",
+    ["endpoint", "method", "status"],
+)
+REQUEST_ERRORS = Counter(
+    "xpress_http_request_errors_total",
+    "HTTP requests that ended in a 5xx response",
+    ["endpoint", "method"],
+)
+REQUEST_LATENCY = Histogram(
+    "xpress_http_request_duration_seconds",
+    "Time spent handling a request, by Flask endpoint",
+    ["endpoint", "method"],
+    buckets=LATENCY_BUCKETS,
+)
+DEPENDENCY_LATENCY = Histogram(
+    "xpress_dependency_duration_seconds",
+    "Time spent in calls to external dependencies",
+    ["dependency", "operation", "outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+
+
+def observe_request(endpoint, method, status, seconds):
+    REQUESTS.labels(endpoint, method, str(status)).inc()
+    REQUEST_LATENCY.labels(endpoint, method).observe(seconds)
+    if status >= 500:
+        REQUEST_ERRORS.labels(endpoint, method).inc()
+
+
+def observe_dependency(dependency, operation, seconds, outcome="success"):
+    DEPENDENCY_LATENCY.labels(dependency, operation, outcome).observe(seconds)
+
+
+@contextmanager
+def track_dependency(dependency, operation):
+    """Times the wrapped block as one call to `dependency`; exceptions count as errors"""
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "success"
+    finally:
+        observe_dependency(dependency, operation, time.perf_counter() - started, outcome)
+
+
+def observe_sql_statement(seconds, ok):
+    """Statement observer for query_stats: one Postgres observation per statement"""
+    observe_dependency("postgres", "statement", seconds, "success" if ok else "error")
+
+
+def render_metrics():
+    """Returns (body, content type) for the /metrics endpoint"""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
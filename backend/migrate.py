@@ -0,0 +1,410 @@
+"""
+Express Auto API - Schema migration runner
+
+Applies the versioned SQL files in backend/migrations/ in order and records
+each one in schema_migrations. Files whose first line is
+"-- migrate: no-transaction" run statement by statement in autocommit mode,
+which CREATE INDEX CONCURRENTLY requires; everything else runs in a single
+transaction.
+
+Usage (from backend/):
+    python migrate.py status        # list applied and pending migrations
+    python migrate.py up            # apply pending migrations
+    python migrate.py check-plans   # fail if a hot endpoint query plans a Seq Scan
+"""
+
+import argparse
+import os
+import re
+import sys
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+from dotenv import load_dotenv
+
+load_dotenv()
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+NO_TRANSACTION_MARKER = "-- migrate: no-transaction"
+MIGRATION_LOCK_KEY = 74_2025_0001  # pg_advisory_lock key so two deploys can't race
+
+FILENAME_PATTERN = re.compile(r"^(\d{4})_([a-z0-9_]+)\.sql$")
+CONCURRENT_INDEX_PATTERN = re.compile(
+    r"CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+IF\s+NOT\s+EXISTS\s+(\w+)",
+    re.IGNORECASE,
+)
+
+
+def connect():
+    """Opens a connection using the same DB_* settings as app.py"""
+    return psycopg2.connect(
+        dbname=os.getenv("DB_NAME"),
+        user=os.getenv("DB_USER"),
+        password=os.getenv("DB_PASSWORD"),
+        host=os.getenv("DB_HOST"),
+        port=os.getenv("DB_PORT"),
+        cursor_factory=RealDictCursor,
+    )
+
+
+# MIGRATION DISCOVERY
+
+
+def discover_migrations():
+    """Returns [(version, name, path)] for every migration file, in version order"""
+    migrations = []
+    for filename in sorted(os.listdir(MIGRATIONS_DIR)):
+        match = FILENAME_PATTERN.match(filename)
+        if not match:
+            continue
+        migrations.append(
+            (int(match.group(1)), match.group(2), os.path.join(MIGRATIONS_DIR, filename))
+        )
+    versions = [version for version, _, _ in migrations]
+    if len(versions) != len(set(versions)):
+        raise SystemExit("Duplicate migration version numbers in migrations/")
+    return migrations
+
+
+def split_statements(sql):
+    """Splits a no-transaction migration into statements terminated by ';' at end of line"""
+    statements = []
+    for chunk in re.split(r";\s*$", sql, flags=re.MULTILINE):
+        lines = [line for line in chunk.strip().splitlines() if not line.strip().startswith("--")]
+        statement = "\n".join(lines).strip()
+        if statement:
+            statements.append(statement)
+    return statements
+
+
+# APPLYING MIGRATIONS
+
+
+def ensure_migrations_table(conn):
+    with conn.cursor() as cursor:
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                name VARCHAR(100) NOT NULL,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """
+        )
+
+
+def applied_versions(conn):
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT version FROM schema_migrations")
+        return {row["version"] for row in cursor.fetchall()}
+
+
+def drop_invalid_indexes(conn, sql):
+    """Drops indexes left INVALID by an interrupted CREATE INDEX CONCURRENTLY so they get rebuilt"""
+    names = CONCURRENT_INDEX_PATTERN.findall(sql)
+    if not names:
+        return
+    with conn.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT c.relname
+            FROM pg_index i
+            JOIN pg_class c ON c.oid = i.indexrelid
+            WHERE NOT i.indisvalid AND c.relname = ANY(%s)
+            """,
+            (names,),
+        )
+        for row in cursor.fetchall():
+            print(f"  dropping invalid index {row['relname']}")
+            cursor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{row["relname"]}"')
+
+
+def apply_migration(conn, version, name, path):
+    with open(path) as f:
+        sql = f.read()
+
+    if sql.lstrip().startswith(NO_TRANSACTION_MARKER):
+        conn.autocommit = True
+        drop_invalid_indexes(conn, sql)
+        with conn.cursor() as cursor:
+            for statement in split_statements(sql):
+                cursor.execute(statement)
+            cursor.execute(
+                "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                (version, name),
+            )
+        return
+
+    conn.autocommit = False
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(sql)
+            cursor.execute(
+                "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                (version, name),
+            )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.autocommit = True
+
+
+def migrate_up(conn):
+    conn.autocommit = True
+    ensure_migrations_table(conn)
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_KEY,))
+    try:
+        done = applied_versions(conn)
+        pending = [m for m in discover_migrations() if m[0] not in done]
+        if not pending:
+            print("Database is up to date.")
+            return
+        for version, name, path in pending:
+            print(f"Applying {version:04d}_{name} ...")
+            apply_migration(conn, version, name, path)
+        print(f"Applied {len(pending)} migration(s).")
+    finally:
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_KEY,))
+
+
+def migration_status(conn):
+    conn.autocommit = True
+    ensure_migrations_table(conn)
+    done = applied_versions(conn)
+    for version, name, _ in discover_migrations():
+        state = "applied" if version in done else "pending"
+        print(f"{version:04d}_{name:<40} {state}")
+
+
+# QUERY PLAN CHECK
+
+# Each entry is (label, table that must not be sequentially scanned, query).
+# Queries mirror the ones in app.py; %(user_id)s / %(vehicle_id)s / %(transaction_id)s
+# are filled in from the seeded data.
+PLAN_CHECKS = [
+    (
+        "get_users",
+        "users",
+        "SELECT user_id, email FROM users WHERE user_id > %(user_id)s ORDER BY user_id LIMIT 51",
+    ),
+    (
+        "get_vehicles",
+        "vehicles",
+        "SELECT * FROM vehicles WHERE user_id = %(user_id)s",
+    ),
+    (
+        "get_active_jobs",
+        "vehicles",
+        """
+        SELECT v.vehicle_id, v.license_plate, v.make, v.model, v.year,
+               u.user_id, u.first_name, u.last_name, u.email
+        FROM vehicles v
+        JOIN users u ON v.user_id = u.user_id
+        WHERE v.vehicle_status IN ('Waiting', 'Active')
+        ORDER BY v.license_plate, v.vehicle_id
+        LIMIT 51
+        """,
+    ),
+    (
+        "get_user_invoices",
+        "invoices",
+        """
+        SELECT invoice_id, invoice_number, total_amount, status, issue_date, due_date,
+               v.make, v.model, v.year
+        FROM invoices i
+        LEFT JOIN vehicles v ON i.vehicle_id = v.vehicle_id
+        WHERE i.user_id = %(user_id)s
+        ORDER BY i.issue_date DESC, i.invoice_id DESC
+        LIMIT 51
+        """,
+    ),
+    (
+        "get_unpaid_invoices",
+        "invoices",
+        """
+        SELECT i.invoice_id, i.invoice_number, i.total_amount, i.status, i.due_date
+        FROM invoices i
+        WHERE i.status IN ('unpaid', 'overdue')
+        ORDER BY i.due_date ASC, i.invoice_id
+        LIMIT 51
+        """,
+    ),
+    (
+        "get_notifications",
+        "notifications",
+        """
+        SELECT * FROM notifications
+        WHERE user_id = %(user_id)s AND is_read = FALSE
+        ORDER BY created_at DESC, notification_id DESC
+        LIMIT 51
+        """,
+    ),
+    (
+        "get_user_media",
+        "media",
+        """
+        SELECT m.media_id, m.file_url, m.upload_date, v.make, v.model
+        FROM media m
+        LEFT JOIN vehicles v ON m.vehicle_id = v.vehicle_id
+        WHERE m.user_id = %(user_id)s
+        ORDER BY m.upload_date DESC, m.media_id DESC
+        LIMIT 51
+        """,
+    ),
+    (
+        "get_vehicle_photos",
+        "media",
+        """
+        SELECT media_id, file_url, title, description
+        FROM media
+        WHERE vehicle_id = %(vehicle_id)s
+        ORDER BY upload_date DESC
+        """,
+    ),
+    (
+        "stripe_webhook_idempotency",
+        "payments",
+        "SELECT 1 FROM payments WHERE transaction_id = %(transaction_id)s",
+    ),
+]
+
+
+def seed_plan_check_data(cursor, users):
+    """Inserts a synthetic dataset shaped like production (mostly paid / read / off-lot)"""
+    cursor.execute(
+        """
+        INSERT INTO users (email, password_hash, first_name, last_name, phone)
+        SELECT 'plancheck-' || g || '@example.invalid', 'x', 'Seed', 'User' || g, '555-0100'
+        FROM generate_series(1, %s) AS g
+        """,
+        (users,),
+    )
+    cursor.execute(
+        """
+        INSERT INTO vehicles (user_id, make, model, year, license_plate, vehicle_status)
+        SELECT u.user_id, 'Make', 'Model', 2000 + (g % 25), 'PC' || u.user_id || '-' || g,
+               CASE WHEN random() < 0.01 THEN 'Active' ELSE 'OffLot' END
+        FROM users u, generate_series(1, 2) AS g
+        WHERE u.email LIKE 'plancheck-%'
+        """
+    )
+    cursor.execute(
+        """
+        INSERT INTO invoices (user_id, vehicle_id, invoice_number, subtotal, tax_amount,
+                              total_amount, status, issue_date, due_date)
+        SELECT v.user_id, v.vehicle_id, 'PC-' || v.vehicle_id || '-' || g, 100, 7, 107,
+               CASE WHEN random() < 0.02 THEN 'unpaid' ELSE 'paid' END,
+               NOW() - (g || ' days')::interval, NOW() + ((30 - g) || ' days')::interval
+        FROM vehicles v, generate_series(1, 3) AS g
+        WHERE v.license_plate LIKE 'PC%'
+        """
+    )
+    cursor.execute(
+        """
+        INSERT INTO payments (invoice_id, payment_method, amount, transaction_id)
+        SELECT invoice_id, 'stripe', total_amount, 'pi_plancheck_' || invoice_id
+        FROM invoices WHERE invoice_number LIKE 'PC-%' AND status = 'paid'
+        """
+    )
+    cursor.execute(
+        """
+        INSERT INTO notifications (user_id, title, message, type, is_read, created_at)
+        SELECT u.user_id, 'Seed', 'Seed notification', 'info', random() > 0.05,
+               NOW() - (g || ' hours')::interval
+        FROM users u, generate_series(1, 10) AS g
+        WHERE u.email LIKE 'plancheck-%'
+        """
+    )
+    cursor.execute(
+        """
+        INSERT INTO media (user_id, vehicle_id, media_type, file_url, upload_date)
+        SELECT v.user_id, v.vehicle_id, 'image', 'https://example.invalid/' || v.vehicle_id || '-' || g,
+               NOW() - (g || ' days')::interval
+        FROM vehicles v, generate_series(1, 3) AS g
+        WHERE v.license_plate LIKE 'PC%'
+        """
+    )
+    for table in ("users", "vehicles", "invoices", "payments", "notifications", "media"):
+        cursor.execute(f"ANALYZE {table}")
+
+
+def find_seq_scans(plan, table):
+    """Walks an EXPLAIN (FORMAT JSON) plan tree looking for Seq Scan nodes on `table`"""
+    hits = []
+    if plan.get("Node Type") == "Seq Scan" and plan.get("Relation Name") == table:
+        hits.append(plan)
+    for child in plan.get("Plans", []):
+        hits.extend(find_seq_scans(child, table))
+    return hits
+
+
+def check_plans(conn, users):
+    """Seeds data inside a transaction, EXPLAINs every hot query, then rolls everything back"""
+    conn.autocommit = False
+    failures = []
+    try:
+        with conn.cursor() as cursor:
+            print(f"Seeding {users} users and related rows (rolled back afterwards) ...")
+            seed_plan_check_data(cursor, users)
+            cursor.execute(
+                """
+                SELECT v.user_id, v.vehicle_id FROM vehicles v
+                WHERE v.license_plate LIKE 'PC%' ORDER BY v.vehicle_id LIMIT 1
+                """
+            )
+            sample = cursor.fetchone()
+            params = {
+                "user_id": sample["user_id"],
+                "vehicle_id": sample["vehicle_id"],
+                "transaction_id": "pi_plancheck_missing",
+            }
+            for label, table, query in PLAN_CHECKS:
+                cursor.execute("EXPLAIN (FORMAT JSON) " + query, params)
+                plan = cursor.fetchone()["QUERY PLAN"][0]["Plan"]
+                seq_scans = find_seq_scans(plan, table)
+                state = "SEQ SCAN" if seq_scans else "ok"
+                print(f"  {label:<30} {table:<14} {state}")
+                if seq_scans:
+                    failures.append(label)
+    finally:
+        conn.rollback()
+        conn.autocommit = True
+
+    if failures:
+        print(f"Sequential scans planned for: {', '.join(failures)}")
+        return 1
+    print("All hot queries use indexes.")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Express Auto schema migrations")
+    parser.add_argument("command", choices=["status", "up", "check-plans"])
+    parser.add_argument(
+        "--seed-users",
+        type=int,
+        default=20000,
+        help="users to seed for check-plans (each gets vehicles, invoices, media, notifications)",
+    )
+    args = parser.parse_args(argv)
+
+    conn = connect()
+    try:
+        if args.command == "status":
+            migration_status(conn)
+        elif args.command == "up":
+            migrate_up(conn)
+        else:
+            return check_plans(conn, args.seed_users)
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,21 @@
+-- Columns app.py already reads and writes but the original DDL never created.
+
+ALTER TABLE users ADD COLUMN IF NOT EXISTS is_admin BOOLEAN NOT NULL DEFAULT FALSE;
+
+ALTER TABLE vehicles ADD COLUMN IF NOT EXISTS vehicle_status VARCHAR(20) NOT NULL DEFAULT 'OffLot';
+ALTER TABLE vehicles ADD COLUMN IF NOT EXISTS vehicle_image_url VARCHAR(255);
+
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint WHERE conname = 'vehicles_vehicle_status_check'
+    ) THEN
+        -- NOT VALID: enforced for new and updated rows at once; existing rows
+        -- are checked by 0016, so an unexpected legacy status can't block this
+        ALTER TABLE vehicles ADD CONSTRAINT vehicles_vehicle_status_check
+            CHECK (vehicle_status IN ('Waiting', 'Active', 'OffLot')) NOT VALID;
+    END IF;
+END
+$$;
+
+ALTER TABLE invoices ADD COLUMN IF NOT EXISTS currency VARCHAR(3) NOT NULL DEFAULT 'usd';
@@ -0,0 +1,36 @@
+-- migrate: no-transaction
+-- Secondary indexes for the predicates the API filters and sorts on.
+-- Built CONCURRENTLY so writes keep flowing while they are created.
+
+-- /api/get-vehicles, /api/get-vehicles/<user_id>, ON DELETE CASCADE from users
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_vehicles_user_id
+    ON vehicles (user_id);
+
+-- /api/active-jobs only ever asks for vehicles on the lot, ordered by plate
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_vehicles_on_lot
+    ON vehicles (license_plate)
+    WHERE vehicle_status IN ('Waiting', 'Active');
+
+-- /api/get-user-invoices
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_invoices_user_issue_date
+    ON invoices (user_id, issue_date DESC);
+
+-- /api/get-unpaid-invoices
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_invoices_status_due_date
+    ON invoices (status, due_date);
+
+-- /api/get-notifications
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_notifications_user_unread_created
+    ON notifications (user_id, is_read, created_at DESC);
+
+-- /api/get-user-media
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_media_user_upload_date
+    ON media (user_id, upload_date DESC);
+
+-- /api/get-vehicle-photos
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_media_vehicle_upload_date
+    ON media (vehicle_id, upload_date DESC);
+
+-- Stripe webhook idempotency check
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_payments_transaction_id
+    ON payments (transaction_id);
@@ -0,0 +1,29 @@
+-- Invoice numbers (INV-YYYY-NNNN) come from one sequence per calendar year.
+-- nextval() never blocks other transactions, so concurrent create_invoice
+-- calls no longer collide on the UNIQUE constraint or scan the invoices table.
+-- A rolled-back invoice leaves a gap in that year's numbering.
+
+CREATE OR REPLACE FUNCTION next_invoice_number(for_year INTEGER)
+RETURNS VARCHAR AS $$
+DECLARE
+    seq_name TEXT := 'invoice_number_seq_' || for_year;
+    start_at BIGINT;
+    n BIGINT;
+BEGIN
+    IF to_regclass(seq_name) IS NULL THEN
+        -- First invoice of the year. Serialise creation of the sequence and
+        -- continue after any numbers already issued under the old COUNT(*) scheme.
+        PERFORM pg_advisory_xact_lock(hashtext(seq_name));
+        SELECT COALESCE(MAX(substring(invoice_number FROM '(\d+)$')::BIGINT), 0) + 1
+          INTO start_at
+          FROM invoices
+         WHERE invoice_number LIKE 'INV-' || for_year || '-%';
+        EXECUTE format('CREATE SEQUENCE IF NOT EXISTS %I START WITH %s', seq_name, start_at);
+    END IF;
+
+    n := nextval(seq_name);
+
+    RETURN 'INV-' || for_year || '-' ||
+           CASE WHEN n < 10000 THEN lpad(n::TEXT, 4, '0') ELSE n::TEXT END;
+END;
+$$ LANGUAGE plpgsql;
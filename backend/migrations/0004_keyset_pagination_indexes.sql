@@ -0,0 +1,26 @@
+-- migrate: no-transaction
+-- List endpoints page with keyset cursors whose sort key ends in the primary key.
+-- These indexes match each ORDER BY exactly so a page is a single index range scan,
+-- and replace the 0002 indexes they extend.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_invoices_user_issue_date_id
+    ON invoices (user_id, issue_date DESC, invoice_id DESC);
+DROP INDEX CONCURRENTLY IF EXISTS idx_invoices_user_issue_date;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_invoices_unpaid_due_date_id
+    ON invoices (due_date, invoice_id)
+    WHERE status IN ('unpaid', 'overdue');
+DROP INDEX CONCURRENTLY IF EXISTS idx_invoices_status_due_date;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_notifications_user_unread_created_id
+    ON notifications (user_id, is_read, created_at DESC, notification_id DESC);
+DROP INDEX CONCURRENTLY IF EXISTS idx_notifications_user_unread_created;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_media_user_upload_date_id
+    ON media (user_id, upload_date DESC, media_id DESC);
+DROP INDEX CONCURRENTLY IF EXISTS idx_media_user_upload_date;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_vehicles_on_lot_plate_id
+    ON vehicles (license_plate, vehicle_id)
+    WHERE vehicle_status IN ('Waiting', 'Active');
+DROP INDEX CONCURRENTLY IF EXISTS idx_vehicles_on_lot;
@@ -0,0 +1,30 @@
+-- Outgoing email is queued here and delivered by the background sender in
+-- mail_queue.py, so /api/contact no longer waits on an SMTP session.
+-- Senders in every worker claim rows with FOR UPDATE SKIP LOCKED; a row left
+-- in 'sending' by a crashed worker is reclaimed once claimed_at is stale.
+
+CREATE TABLE IF NOT EXISTS mail_outbox (
+    mail_id SERIAL PRIMARY KEY,
+    kind VARCHAR(50) NOT NULL,
+    sender VARCHAR(255),
+    recipients TEXT[] NOT NULL,
+    reply_to VARCHAR(255),
+    subject TEXT NOT NULL,
+    body TEXT NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'queued'
+        CHECK (status IN ('queued', 'sending', 'sent', 'failed')),
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    next_attempt_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    claimed_at TIMESTAMP,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    sent_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_mail_outbox_due
+    ON mail_outbox (next_attempt_at, mail_id)
+    WHERE status = 'queued';
+
+CREATE INDEX IF NOT EXISTS idx_mail_outbox_sending
+    ON mail_outbox (claimed_at)
+    WHERE status = 'sending';
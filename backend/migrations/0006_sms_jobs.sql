@@ -0,0 +1,34 @@
+-- Bulk SMS jobs (POST /api/send-sms/bulk). A job's messages are rendered and
+-- stored up front; sms_dispatch.py sends the queued ones and records each
+-- Twilio SID or error, so progress survives a poll landing on another worker.
+
+CREATE TABLE IF NOT EXISTS sms_jobs (
+    job_id SERIAL PRIMARY KEY,
+    created_by INTEGER REFERENCES users(user_id) ON DELETE SET NULL,
+    template TEXT NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'queued'
+        CHECK (status IN ('queued', 'running', 'completed')),
+    total INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP,
+    heartbeat_at TIMESTAMP,
+    finished_at TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS sms_messages (
+    message_id SERIAL PRIMARY KEY,
+    job_id INTEGER NOT NULL REFERENCES sms_jobs(job_id) ON DELETE CASCADE,
+    user_id INTEGER REFERENCES users(user_id) ON DELETE SET NULL,
+    invoice_id INTEGER REFERENCES invoices(invoice_id) ON DELETE SET NULL,
+    to_number VARCHAR(32) NOT NULL,
+    body TEXT NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'queued'
+        CHECK (status IN ('queued', 'sent', 'failed')),
+    attempts INTEGER NOT NULL DEFAULT 0,
+    twilio_sid VARCHAR(64),
+    error TEXT,
+    sent_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_sms_messages_job_status
+    ON sms_messages (job_id, status, message_id);
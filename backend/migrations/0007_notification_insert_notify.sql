@@ -0,0 +1,29 @@
+-- Every INSERT into notifications (send_notification, broadcasts, any other
+-- writer) sends one NOTIFY per statement on 'notifications_inserted' with the
+-- id range it created. The SSE listener in notification_stream.py fetches
+-- that range for the users connected to its worker. A 100k-row broadcast is a
+-- single NOTIFY rather than 100k.
+
+CREATE OR REPLACE FUNCTION notify_notifications_inserted()
+RETURNS trigger AS $$
+DECLARE
+    lo INTEGER;
+    hi INTEGER;
+BEGIN
+    SELECT MIN(notification_id), MAX(notification_id) INTO lo, hi FROM new_rows;
+    IF lo IS NOT NULL THEN
+        PERFORM pg_notify(
+            'notifications_inserted',
+            json_build_object('min_id', lo, 'max_id', hi)::text
+        );
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS notifications_inserted_notify ON notifications;
+CREATE TRIGGER notifications_inserted_notify
+    AFTER INSERT ON notifications
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION notify_notifications_inserted();
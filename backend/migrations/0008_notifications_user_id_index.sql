@@ -0,0 +1,6 @@
+-- migrate: no-transaction
+-- Last-Event-ID replay for /api/notifications/stream reads a user's rows after
+-- a given notification_id.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_notifications_user_id_notification_id
+    ON notifications (user_id, notification_id);
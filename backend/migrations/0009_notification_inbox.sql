@@ -0,0 +1,110 @@
+-- Unread notification counts per user, kept current by statement-level
+-- triggers so the header badge is a primary-key lookup and a 100k-row
+-- broadcast costs one grouped upsert. Transition tables may only serve one
+-- event per trigger, hence three. Rows are upserted in user_id order so
+-- concurrent statements lock counters in the same order.
+--
+-- No foreign key to users: deleting a user deletes their notifications
+-- after the users row is gone, and the trigger must still be able to run.
+
+CREATE TABLE IF NOT EXISTS notification_counters (
+    user_id INTEGER PRIMARY KEY,
+    unread_count INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE OR REPLACE FUNCTION notification_counters_apply_insert()
+RETURNS trigger AS $$
+BEGIN
+    INSERT INTO notification_counters (user_id, unread_count)
+    SELECT user_id, COUNT(*)
+    FROM new_rows
+    WHERE user_id IS NOT NULL AND is_read = FALSE
+    GROUP BY user_id
+    ORDER BY user_id
+    ON CONFLICT (user_id) DO UPDATE
+        SET unread_count = notification_counters.unread_count + EXCLUDED.unread_count;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION notification_counters_apply_update()
+RETURNS trigger AS $$
+BEGIN
+    INSERT INTO notification_counters (user_id, unread_count)
+    SELECT user_id, SUM(delta)
+    FROM (
+        SELECT user_id, 1 AS delta FROM new_rows
+        WHERE user_id IS NOT NULL AND is_read = FALSE
+        UNION ALL
+        SELECT user_id, -1 AS delta FROM old_rows
+        WHERE user_id IS NOT NULL AND is_read = FALSE
+    ) AS changes
+    GROUP BY user_id
+    HAVING SUM(delta) <> 0
+    ORDER BY user_id
+    ON CONFLICT (user_id) DO UPDATE
+        SET unread_count = notification_counters.unread_count + EXCLUDED.unread_count;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION notification_counters_apply_delete()
+RETURNS trigger AS $$
+BEGIN
+    UPDATE notification_counters c
+    SET unread_count = c.unread_count - d.removed
+    FROM (
+        SELECT user_id, COUNT(*) AS removed
+        FROM old_rows
+        WHERE user_id IS NOT NULL AND is_read = FALSE
+        GROUP BY user_id
+        ORDER BY user_id
+    ) AS d
+    WHERE c.user_id = d.user_id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Hold off writers while the counters are backfilled
+LOCK TABLE notifications IN SHARE ROW EXCLUSIVE MODE;
+
+DROP TRIGGER IF EXISTS notification_counters_insert ON notifications;
+CREATE TRIGGER notification_counters_insert
+    AFTER INSERT ON notifications
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION notification_counters_apply_insert();
+
+DROP TRIGGER IF EXISTS notification_counters_update ON notifications;
+CREATE TRIGGER notification_counters_update
+    AFTER UPDATE ON notifications
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION notification_counters_apply_update();
+
+DROP TRIGGER IF EXISTS notification_counters_delete ON notifications;
+CREATE TRIGGER notification_counters_delete
+    AFTER DELETE ON notifications
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION notification_counters_apply_delete();
+
+INSERT INTO notification_counters (user_id, unread_count)
+SELECT user_id, COUNT(*)
+FROM notifications
+WHERE user_id IS NOT NULL AND is_read = FALSE
+GROUP BY user_id
+ON CONFLICT (user_id) DO UPDATE SET unread_count = EXCLUDED.unread_count;
+
+-- Old read notifications moved out by notification_retention.py --mode archive
+CREATE TABLE IF NOT EXISTS notifications_archive (
+    notification_id INTEGER PRIMARY KEY,
+    user_id INTEGER,
+    title VARCHAR(100) NOT NULL,
+    message TEXT NOT NULL,
+    type VARCHAR(30) NOT NULL,
+    related_id INTEGER,
+    is_read BOOLEAN,
+    created_at TIMESTAMP,
+    archived_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,7 @@
+-- migrate: no-transaction
+-- notification_retention.py walks old read notifications oldest first, in
+-- (created_at, notification_id) order (BATCH_SQL), which this index serves.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_notifications_read_created_id
+    ON notifications (created_at, notification_id)
+    WHERE is_read = TRUE;
@@ -0,0 +1,14 @@
+-- Thumbnails and WebP width variants for media (media_variants.py). New rows
+-- default to variants_status 'pending' and are picked up by the background
+-- workers; rows that existed before this migration stay NULL until
+-- `python media_variants.py --backfill` queues them.
+
+ALTER TABLE media ADD COLUMN IF NOT EXISTS variants JSONB;
+ALTER TABLE media ADD COLUMN IF NOT EXISTS variants_status VARCHAR(20)
+    CHECK (variants_status IN ('pending', 'processing', 'ready', 'failed'));
+ALTER TABLE media ADD COLUMN IF NOT EXISTS variants_attempts INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE media ADD COLUMN IF NOT EXISTS variants_claimed_at TIMESTAMP;
+ALTER TABLE media ADD COLUMN IF NOT EXISTS variants_error TEXT;
+
+-- Set after the ADD COLUMN so existing rows keep NULL
+ALTER TABLE media ALTER COLUMN variants_status SET DEFAULT 'pending';
@@ -0,0 +1,7 @@
+-- migrate: no-transaction
+-- The variant workers claim pending rows and reclaim stale 'processing' ones;
+-- both are a tiny slice of media.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_media_variants_queue
+    ON media (variants_status, media_id)
+    WHERE variants_status IN ('pending', 'processing');
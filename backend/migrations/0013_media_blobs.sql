@@ -0,0 +1,96 @@
+-- Content-addressed upload storage. An uploaded image is stored once under
+-- blobs/<sha256[:2]>/<sha256>.<ext>, and every media, vehicles and users row
+-- that uses it holds the same URL. refcount counts those rows and is kept
+-- current by statement-level triggers. A blob whose refcount has been 0 since
+-- released_at is removed, object and variants included, by s3_cleanup.py
+-- after a grace period. Routes never delete blob objects themselves.
+--
+-- variants holds the thumbnail/WebP document rendered for the first media row
+-- that used the blob, so later rows copy it instead of rendering again.
+
+CREATE TABLE IF NOT EXISTS media_blobs (
+    sha256 CHAR(64) PRIMARY KEY,
+    url VARCHAR(255) NOT NULL UNIQUE,
+    content_type VARCHAR(100) NOT NULL,
+    size BIGINT,
+    refcount INTEGER NOT NULL DEFAULT 0,
+    variants JSONB,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    released_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_media_blobs_unreferenced
+    ON media_blobs (released_at)
+    WHERE refcount = 0;
+
+-- TG_ARGV[0] names the URL column of the table the trigger is on. UPDATE
+-- triggers can't be limited to that column (not allowed with transition
+-- tables), so unchanged URLs cancel out in the SUM and touch nothing.
+CREATE OR REPLACE FUNCTION media_blobs_refcount()
+RETURNS trigger AS $$
+DECLARE
+    changes TEXT;
+BEGIN
+    changes := CASE TG_OP
+        WHEN 'INSERT' THEN format('SELECT %I AS url, 1 AS delta FROM new_rows', TG_ARGV[0])
+        WHEN 'DELETE' THEN format('SELECT %I AS url, -1 AS delta FROM old_rows', TG_ARGV[0])
+        ELSE format(
+            'SELECT %1$I AS url, 1 AS delta FROM new_rows UNION ALL SELECT %1$I, -1 FROM old_rows',
+            TG_ARGV[0]
+        )
+    END;
+    EXECUTE format($sql$
+        UPDATE media_blobs b
+        SET refcount = b.refcount + d.delta,
+            released_at = CASE WHEN d.delta < 0 THEN CURRENT_TIMESTAMP ELSE b.released_at END
+        FROM (
+            SELECT url, SUM(delta) AS delta
+            FROM (%s) AS changes
+            WHERE url LIKE '%%/blobs/%%'
+            GROUP BY url
+            HAVING SUM(delta) <> 0
+        ) AS d
+        WHERE b.url = d.url
+    $sql$, changes);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS media_blobs_refcount_insert ON media;
+CREATE TRIGGER media_blobs_refcount_insert
+    AFTER INSERT ON media REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION media_blobs_refcount('file_url');
+DROP TRIGGER IF EXISTS media_blobs_refcount_update ON media;
+CREATE TRIGGER media_blobs_refcount_update
+    AFTER UPDATE ON media REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION media_blobs_refcount('file_url');
+DROP TRIGGER IF EXISTS media_blobs_refcount_delete ON media;
+CREATE TRIGGER media_blobs_refcount_delete
+    AFTER DELETE ON media REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION media_blobs_refcount('file_url');
+
+DROP TRIGGER IF EXISTS media_blobs_refcount_insert ON vehicles;
+CREATE TRIGGER media_blobs_refcount_insert
+    AFTER INSERT ON vehicles REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION media_blobs_refcount('vehicle_image_url');
+DROP TRIGGER IF EXISTS media_blobs_refcount_update ON vehicles;
+CREATE TRIGGER media_blobs_refcount_update
+    AFTER UPDATE ON vehicles REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION media_blobs_refcount('vehicle_image_url');
+DROP TRIGGER IF EXISTS media_blobs_refcount_delete ON vehicles;
+CREATE TRIGGER media_blobs_refcount_delete
+    AFTER DELETE ON vehicles REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION media_blobs_refcount('vehicle_image_url');
+
+DROP TRIGGER IF EXISTS media_blobs_refcount_insert ON users;
+CREATE TRIGGER media_blobs_refcount_insert
+    AFTER INSERT ON users REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION media_blobs_refcount('profile_picture_url');
+DROP TRIGGER IF EXISTS media_blobs_refcount_update ON users;
+CREATE TRIGGER media_blobs_refcount_update
+    AFTER UPDATE ON users REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION media_blobs_refcount('profile_picture_url');
+DROP TRIGGER IF EXISTS media_blobs_refcount_delete ON users;
+CREATE TRIGGER media_blobs_refcount_delete
+    AFTER DELETE ON users REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION media_blobs_refcount('profile_picture_url');
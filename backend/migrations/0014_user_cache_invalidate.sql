@@ -0,0 +1,26 @@
+-- load_user caches (user_id, email, is_admin) in every worker process. Any
+-- change to those columns, and any delete, sends a NOTIFY on
+-- 'user_cache_invalidate' with the user_id. Each worker's listener in
+-- user_cache.py drops the entry, so make-admin, delete-user and profile
+-- changes take effect on all workers at commit, not after USER_CACHE_TTL.
+
+CREATE OR REPLACE FUNCTION notify_user_cache_invalidate()
+RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('user_cache_invalidate', OLD.user_id::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS users_cache_invalidate_update ON users;
+CREATE TRIGGER users_cache_invalidate_update
+    AFTER UPDATE OF email, is_admin ON users
+    FOR EACH ROW
+    WHEN (OLD.email IS DISTINCT FROM NEW.email OR OLD.is_admin IS DISTINCT FROM NEW.is_admin)
+    EXECUTE FUNCTION notify_user_cache_invalidate();
+
+DROP TRIGGER IF EXISTS users_cache_invalidate_delete ON users;
+CREATE TRIGGER users_cache_invalidate_delete
+    AFTER DELETE ON users
+    FOR EACH ROW
+    EXECUTE FUNCTION notify_user_cache_invalidate();
@@ -0,0 +1,12 @@
+-- One shared token bucket for Twilio sends. Every gunicorn worker runs its
+-- own SmsDispatcher, so a per-process limiter let N workers send at N times
+-- SMS_RATE_PER_SECOND. RateLimiter in sms_dispatch.py instead reserves the
+-- next send slot by advancing next_slot in this row; the row lock orders
+-- reservations from all workers.
+
+CREATE TABLE IF NOT EXISTS sms_rate_limit (
+    name VARCHAR(32) PRIMARY KEY,
+    next_slot TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO sms_rate_limit (name) VALUES ('twilio') ON CONFLICT (name) DO NOTHING;
@@ -0,0 +1,22 @@
+-- Validates the vehicle_status CHECK that 0001 added NOT VALID. VALIDATE only
+-- takes a SHARE UPDATE EXCLUSIVE lock, so writes carry on while it scans.
+-- Rows with a status outside the CHECK leave the constraint NOT VALID (new
+-- writes are still checked) and are reported instead of failing the deploy;
+-- fix them and run the ALTER TABLE ... VALIDATE CONSTRAINT below by hand.
+
+DO $$
+DECLARE
+    invalid BIGINT;
+BEGIN
+    SELECT count(*) INTO invalid
+      FROM vehicles
+     WHERE vehicle_status NOT IN ('Waiting', 'Active', 'OffLot');
+    IF invalid = 0 THEN
+        ALTER TABLE vehicles VALIDATE CONSTRAINT vehicles_vehicle_status_check;
+    ELSE
+        RAISE WARNING '% vehicles have a vehicle_status other than Waiting, Active or OffLot', invalid
+            USING HINT = 'vehicles_vehicle_status_check stays NOT VALID; fix those rows, then run '
+                || 'ALTER TABLE vehicles VALIDATE CONSTRAINT vehicles_vehicle_status_check';
+    END IF;
+END
+$$;
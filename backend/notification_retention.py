@@ -0,0 +1,124 @@
+"""
+Express Auto API - Notification retention job
+
+Read notifications older than --older-than-days are either moved to
+notifications_archive (--mode archive) or deleted (--mode delete). Each batch
+is one statement and one short transaction, so the job never holds many row
+locks or a long snapshot. Rows already being touched by another transaction
+are skipped and picked up on the next run. Unread notifications are never
+removed.
+
+Usage (from backend/, e.g. nightly from cron):
+    python notification_retention.py --older-than-days 90
+    python notification_retention.py --older-than-days 30 --mode delete --batch-size 5000
+    python notification_retention.py --older-than-days 90 --dry-run
+"""
+
+import argparse
+import sys
+import time
+
+from migrate import connect
+
+BATCH_SQL = """
+    WITH batch AS (
+        SELECT notification_id FROM notifications
+        WHERE is_read = TRUE AND created_at < CURRENT_TIMESTAMP - make_interval(days => %(days)s)
+        ORDER BY created_at, notification_id
+        LIMIT %(batch_size)s
+        FOR UPDATE SKIP LOCKED
+    ),
+    removed AS (
+        DELETE FROM notifications n
+        USING batch b
+        WHERE n.notification_id = b.notification_id
+        RETURNING n.notification_id, n.user_id, n.title, n.message, n.type,
+                  n.related_id, n.is_read, n.created_at
+    )
+"""
+
+ARCHIVE_SQL = BATCH_SQL.rstrip() + """,
+    archived AS (
+        INSERT INTO notifications_archive (notification_id, user_id, title, message, type,
+                                           related_id, is_read, created_at)
+        SELECT * FROM removed
+        ON CONFLICT (notification_id) DO NOTHING
+    )
+    SELECT COUNT(*) AS count FROM removed
+"""
+
+DELETE_SQL = BATCH_SQL + """
+    SELECT COUNT(*) AS count FROM removed
+"""
+
+
+def count_eligible(conn, days):
+    with conn.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT COUNT(*) AS count FROM notifications
+            WHERE is_read = TRUE AND created_at < CURRENT_TIMESTAMP - make_interval(days => %s)
+            """,
+            (days,),
+        )
+        count = cursor.fetchone()["count"]
+    conn.rollback()
+    return count
+
+
+def run_retention(conn, days, mode="archive", batch_size=1000, pause=0.0, max_batches=None):
+    """Archives or deletes eligible notifications batch by batch; returns the total removed"""
+    sql = ARCHIVE_SQL if mode == "archive" else DELETE_SQL
+    params = {"days": days, "batch_size": batch_size}
+    total = batches = 0
+    while max_batches is None or batches < max_batches:
+        with conn.cursor() as cursor:
+            cursor.execute(sql, params)
+            removed = cursor.fetchone()["count"]
+        conn.commit()
+        total += removed
+        batches += 1
+        if removed < batch_size:
+            break
+        if pause:
+            time.sleep(pause)  # leave room for replication and foreground traffic
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--older-than-days", type=int, required=True)
+    parser.add_argument("--mode", choices=("archive", "delete"), default="archive")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--pause", type=float, default=0.05, help="seconds between batches")
+    parser.add_argument("--max-batches", type=int, help="stop after this many batches")
+    parser.add_argument("--dry-run", action="store_true", help="only count eligible rows")
+    args = parser.parse_args()
+
+    if args.older_than_days < 1:
+        print("--older-than-days must be at least 1", file=sys.stderr)
+        return 2
+
+    conn = connect()
+    try:
+        if args.dry_run:
+            print(f"{count_eligible(conn, args.older_than_days)} read notifications eligible")
+            return 0
+        started = time.perf_counter()
+        total = run_retention(
+            conn,
+            args.older_than_days,
+            args.mode,
+            args.batch_size,
+            args.pause,
+            args.max_batches,
+        )
+        verb = "Archived" if args.mode == "archive" else "Deleted"
+        print(f"{verb} {total} notifications in {time.perf_counter() - started:.1f}s")
+        return 0
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,283 @@
+"""
+Express Auto API - Server-Sent Events for notifications
+
+Each worker keeps one Postgres connection LISTENing on
+'notifications_inserted' (the trigger from migration 0007 fires once per
+INSERT statement with the new id range). On every NOTIFY the listener thread
+runs a single query for that range, restricted to the users that currently
+have a stream open on this worker, and puts the rows on their queues.
+Streams themselves hold no database connection.
+
+Streams send a comment line every SSE_HEARTBEAT seconds so proxies keep the
+connection open and dead clients are noticed. Each stream is also closed after
+SSE_MAX_STREAM_SECONDS, and when its queue overflows. The browser's
+EventSource then reconnects with Last-Event-ID, and the route replays anything
+newer from the table. A worker serves at most SSE_MAX_STREAMS streams, since
+each one occupies a request thread.
+
+Ids are taken at INSERT but become visible at COMMIT, so rows can show up out
+of id order: a broadcast that started first commits after a single
+notification with a higher id. Nothing here treats an id as a high-water mark
+for what has been seen. A stream remembers the ids it has sent and skips only
+those. Replay and the listener's catch-up also resend anything created in the
+last SSE_REPLAY_LOOKBACK seconds, which must exceed the longest transaction
+that inserts notifications. The browser drops ids it already has.
+"""
+
+import json
+import logging
+import os
+import queue
+import select
+import threading
+import time
+from datetime import date, datetime
+from decimal import Decimal
+
+logger = logging.getLogger("xpressauto.sse")
+
+CHANNEL = "notifications_inserted"
+
+NOTIFICATION_COLUMNS = "notification_id, user_id, title, message, type, related_id, is_read, created_at"
+
+REPLAY_LOOKBACK = float(os.getenv("SSE_REPLAY_LOOKBACK", "600"))
+
+# Rows after an id the client or listener has seen, plus recent rows below it
+# that may have committed late; %(after_id)s, %(lookback)s and %(user_ids)s
+MISSED_ROWS_SQL = f"""
+    SELECT {NOTIFICATION_COLUMNS} FROM notifications
+    WHERE user_id = ANY(%(user_ids)s)
+      AND (notification_id > %(after_id)s
+           OR created_at > CURRENT_TIMESTAMP - make_interval(secs => %(lookback)s))
+    ORDER BY notification_id
+"""
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def format_event(row):
+    """Renders a notification row as one SSE 'notification' event"""
+    data = json.dumps(row, default=_json_default, separators=(",", ":"))
+    return f"id: {row['notification_id']}\nevent: notification\ndata: {data}\n\n"
+
+
+class Subscription:
+    """One open stream: the user it belongs to and the queue the listener feeds"""
+
+    __slots__ = ("user_id", "queue", "sent_ids")
+
+    def __init__(self, user_id, max_queued):
+        self.user_id = user_id
+        self.queue = queue.Queue(maxsize=max_queued)
+        self.sent_ids = set()  # every notification_id already sent on this stream
+
+
+class NotificationHub:
+    """Per-worker fan-out from one LISTEN connection to every open stream"""
+
+    def __init__(
+        self,
+        connect_db,
+        max_streams=16,
+        heartbeat=15.0,
+        max_stream_seconds=1800.0,
+        max_queued=100,
+    ):
+        self.connect_db = connect_db
+        self.max_streams = max_streams
+        self.heartbeat = heartbeat
+        self.max_stream_seconds = max_stream_seconds
+        self.max_queued = max_queued
+        self._lock = threading.Lock()
+        self._subscriptions = {}  # user_id -> set of Subscription
+        self._count = 0
+        self._listener = None
+        self._listener_pid = None
+        self._max_seen_id = None  # for catching up after the LISTEN connection drops
+        self._stats = {"notifies": 0, "delivered": 0, "overflows": 0, "rejected": 0, "reconnects": 0}
+
+    # SUBSCRIPTIONS
+
+    def subscribe(self, user_id):
+        """Registers a stream for user_id, or returns None when the worker is at its cap"""
+        self._ensure_listener()
+        with self._lock:
+            if self._count >= self.max_streams:
+                self._stats["rejected"] += 1
+                return None
+            subscription = Subscription(user_id, self.max_queued)
+            self._subscriptions.setdefault(user_id, set()).add(subscription)
+            self._count += 1
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions and subscription in subscriptions:
+                subscriptions.discard(subscription)
+                self._count -= 1
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+
+    def stream(self, subscription, replay):
+        """Yields the SSE body: replayed rows, then live rows and heartbeats"""
+        try:
+            yield "retry: 3000\n\n"
+            for row in replay:
+                subscription.sent_ids.add(row["notification_id"])
+                yield format_event(row)
+            deadline = time.monotonic() + self.max_stream_seconds
+            while time.monotonic() < deadline:
+                try:
+                    row = subscription.queue.get(timeout=self.heartbeat)
+                except queue.Empty:
+                    yield ": heartbeat\n\n"
+                    continue
+                if row is None:
+                    return  # overflowed; the client reconnects and replays
+                if row["notification_id"] in subscription.sent_ids:
+                    continue  # already sent, e.g. during replay
+                subscription.sent_ids.add(row["notification_id"])
+                yield format_event(row)
+        finally:
+            self.unsubscribe(subscription)
+
+    # LISTENER
+
+    def _ensure_listener(self):
+        if (
+            self._listener_pid == os.getpid()
+            and self._listener is not None
+            and self._listener.is_alive()
+        ):
+            return
+        with self._lock:
+            if (
+                self._listener_pid != os.getpid()
+                or self._listener is None
+                or not self._listener.is_alive()
+            ):
+                self._listener_pid = os.getpid()
+                self._listener = threading.Thread(
+                    target=self._listen_forever, name="sse-listener", daemon=True
+                )
+                self._listener.start()
+
+    def _listen_forever(self):
+        backoff = 1.0
+        while True:
+            conn = None
+            try:
+                conn = self.connect_db()
+                conn.autocommit = True
+                with conn.cursor() as cursor:
+                    cursor.execute(f"LISTEN {CHANNEL}")
+                    if self._max_seen_id is not None:
+                        self._catch_up(cursor)  # rows inserted while we weren't listening
+                    else:
+                        cursor.execute("SELECT COALESCE(MAX(notification_id), 0) AS id FROM notifications")
+                        self._max_seen_id = cursor.fetchone()["id"]
+                backoff = 1.0
+                while True:
+                    if select.select([conn], [], [], 30.0) == ([], [], []):
+                        continue
+                    conn.poll()
+                    ranges = []
+                    while conn.notifies:
+                        payload = json.loads(conn.notifies.pop(0).payload)
+                        ranges.append((payload["min_id"], payload["max_id"]))
+                    if ranges:
+                        self._stats["notifies"] += len(ranges)
+                        with conn.cursor() as cursor:
+                            self._deliver(cursor, ranges)
+            except Exception:
+                logger.exception("Notification listener failed; reconnecting in %.0fs", backoff)
+                self._stats["reconnects"] += 1
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+            finally:
+                if conn is not None and not conn.closed:
+                    conn.close()
+
+    def _connected_users(self):
+        with self._lock:
+            return list(self._subscriptions)
+
+    def _deliver(self, cursor, ranges):
+        self._max_seen_id = max([self._max_seen_id or 0] + [hi for _, hi in ranges])
+        user_ids = self._connected_users()
+        if not user_ids:
+            return
+        lo = min(lo for lo, _ in ranges)
+        hi = max(hi for _, hi in ranges)
+        cursor.execute(
+            f"""
+            SELECT {NOTIFICATION_COLUMNS} FROM notifications
+            WHERE notification_id BETWEEN %s AND %s AND user_id = ANY(%s)
+            ORDER BY notification_id
+            """,
+            (lo, hi, user_ids),
+        )
+        self._fan_out(cursor.fetchall())
+
+    def _catch_up(self, cursor):
+        user_ids = self._connected_users()
+        if user_ids:
+            cursor.execute(
+                MISSED_ROWS_SQL,
+                {"after_id": self._max_seen_id, "lookback": REPLAY_LOOKBACK, "user_ids": user_ids},
+            )
+            self._fan_out(cursor.fetchall())
+        cursor.execute("SELECT COALESCE(MAX(notification_id), 0) AS id FROM notifications")
+        self._max_seen_id = cursor.fetchone()["id"]
+
+    def _fan_out(self, rows):
+        for row in rows:
+            row = dict(row)
+            with self._lock:
+                subscriptions = list(self._subscriptions.get(row["user_id"], ()))
+            for subscription in subscriptions:
+                try:
+                    subscription.queue.put_nowait(row)
+                    self._stats["delivered"] += 1
+                except queue.Full:
+                    # A stuck client; end its stream so it reconnects and replays
+                    self._stats["overflows"] += 1
+                    self._close_subscription(subscription)
+
+    def _close_subscription(self, subscription):
+        try:
+            while True:
+                subscription.queue.get_nowait()
+        except queue.Empty:
+            pass
+        subscription.queue.put_nowait(None)
+
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot.update(
+                {
+                    "streams": self._count,
+                    "users": len(self._subscriptions),
+                    "max_streams": self.max_streams,
+                    "listening": self._listener is not None and self._listener.is_alive(),
+                }
+            )
+        return snapshot
+
+
+def notification_hub_from_env(connect_db):
+    """Builds the worker's NotificationHub from the SSE_* environment variables"""
+    return NotificationHub(
+        connect_db,
+        max_streams=int(os.getenv("SSE_MAX_STREAMS", "16")),
+        heartbeat=float(os.getenv("SSE_HEARTBEAT", "15")),
+        max_stream_seconds=float(os.getenv("SSE_MAX_STREAM_SECONDS", "1800")),
+    )
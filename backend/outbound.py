@@ -0,0 +1,274 @@
+"""
+Express Auto API - Outbound HTTP clients
+
+One pooled keep-alive requests.Session per upstream (Google Places, hCaptcha,
+Stripe, Twilio) instead of a new TCP+TLS handshake per call. Every session
+mounts an UpstreamAdapter that:
+
+- applies the upstream's (connect, read) timeout when the caller passes none,
+- retries with exponential backoff and jitter, using urllib3's Retry. Only
+  connection failures are retried for non-idempotent POSTs. Stripe retries
+  through its SDK instead, since the SDK adds idempotency keys.
+- runs every call through the upstream's CircuitBreaker. After
+  `failure_threshold` consecutive failures (connection errors, timeouts or 5xx)
+  the breaker opens and calls fail immediately with CircuitOpenError for
+  `reset_timeout` seconds. Then a single probe is let through to decide
+  whether to close it again.
+
+CircuitOpenError subclasses requests.ConnectionError, so existing
+`except requests.exceptions.RequestException` handlers and Stripe's
+APIConnectionError wrapping already cover it.
+
+Settings per upstream can be overridden with OUTBOUND_<NAME>_<SETTING>, e.g.
+OUTBOUND_STRIPE_READ_TIMEOUT=20 or OUTBOUND_TWILIO_FAILURE_THRESHOLD=3.
+Sessions are created per process, so nothing is shared across a gunicorn fork.
+"""
+
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised instead of calling an upstream whose breaker is open"""
+
+
+UPSTREAM_DEFAULTS = {
+    "connect_timeout": 3.05,
+    "read_timeout": 10.0,
+    "retries": 2,
+    "backoff_factor": 0.2,
+    "backoff_jitter": 0.2,
+    "retry_posts": False,  # POSTs are only retried when the request never reached the server
+    "pool_maxsize": 10,
+    "failure_threshold": 5,
+    "reset_timeout": 30.0,
+}
+
+UPSTREAMS = {
+    "google_places": {"read_timeout": 5.0},
+    "hcaptcha": {"read_timeout": 5.0},
+    # The Stripe SDK retries with idempotency keys itself (stripe.max_network_retries)
+    "stripe": {"read_timeout": 30.0, "retries": 0},
+    "twilio": {"read_timeout": 10.0},
+}
+
+
+def upstream_settings(name):
+    """Returns the defaults for `name` merged with any OUTBOUND_<NAME>_* overrides"""
+    settings = dict(UPSTREAM_DEFAULTS, **UPSTREAMS.get(name, {}))
+    for key, default in settings.items():
+        value = os.getenv(f"OUTBOUND_{name.upper()}_{key.upper()}")
+        if value is None:
+            continue
+        if isinstance(default, bool):
+            settings[key] = value.lower() == "true"
+        else:
+            settings[key] = type(default)(value)
+    return settings
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker: closed -> open -> half-open probe -> closed"""
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._stats = {"successes": 0, "failures": 0, "rejected": 0, "opened": 0}
+
+    def before_call(self):
+        """Raises CircuitOpenError unless a call may go out now"""
+        with self._lock:
+            if self._state == "closed":
+                return
+            if self._state == "open" and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._state = "half_open"
+            if self._state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return
+            self._stats["rejected"] += 1
+        raise CircuitOpenError(f"{self.name} circuit is open; failing fast")
+
+    def record_success(self):
+        with self._lock:
+            self._stats["successes"] += 1
+            self._failures = 0
+            self._state = "closed"
+            self._probe_in_flight = False
+
+    def release_probe(self):
+        """Lets another call probe when this one ended without a success or failure verdict"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._stats["failures"] += 1
+            self._failures += 1
+            self._probe_in_flight = False
+            if self._state == "half_open" or self._failures >= self.failure_threshold:
+                if self._state != "open":
+                    self._stats["opened"] += 1
+                self._state = "open"
+                self._opened_at = time.monotonic()
+
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot.update(
+                {
+                    "state": self._state,
+                    "consecutive_failures": self._failures,
+                    "failure_threshold": self.failure_threshold,
+                    "reset_timeout": self.reset_timeout,
+                }
+            )
+            if self._state == "open":
+                snapshot["retry_in_seconds"] = round(
+                    max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at)), 1
+                )
+        return snapshot
+
+
+class UpstreamAdapter(HTTPAdapter):
+    """HTTPAdapter with a default timeout and a circuit breaker around every send"""
+
+    def __init__(self, breaker, timeout, **kwargs):
+        self.breaker = breaker
+        self.default_timeout = timeout
+        super().__init__(**kwargs)
+
+    def send(self, request, timeout=None, **kwargs):
+        self.breaker.before_call()
+        outcome = None
+        try:
+            response = super().send(request, timeout=timeout or self.default_timeout, **kwargs)
+            # 4xx means the upstream is up, just unhappy with us
+            outcome = "failure" if response.status_code >= 500 else "success"
+            return response
+        except requests.exceptions.RequestException:
+            outcome = "failure"
+            raise
+        finally:
+            if outcome == "success":
+                self.breaker.record_success()
+            elif outcome == "failure":
+                self.breaker.record_failure()
+            else:
+                # Anything else (a hook, a decode error) says nothing about the
+                # upstream, but a half-open probe must not stay in flight forever
+                self.breaker.release_probe()
+
+    def pool_stats(self):
+        """Connection counts for every host this adapter has talked to"""
+        pools = {}
+        for key in list(self.poolmanager.pools.keys()):
+            pool = self.poolmanager.pools.get(key)
+            if pool is None:
+                continue
+            pools[f"{pool.scheme}://{pool.host}:{pool.port}"] = {
+                "connections_opened": pool.num_connections,
+                "requests": pool.num_requests,
+                "idle": pool.pool.qsize() if pool.pool is not None else 0,
+                "maxsize": pool.pool.maxsize if pool.pool is not None else 0,
+            }
+        return pools
+
+
+class _Upstream:
+    __slots__ = ("settings", "session", "adapter", "breaker")
+
+    def __init__(self, name):
+        self.settings = s = upstream_settings(name)
+        self.breaker = CircuitBreaker(name, s["failure_threshold"], s["reset_timeout"])
+        retry = Retry(
+            total=s["retries"],
+            connect=s["retries"],
+            read=s["retries"],
+            status=s["retries"],
+            status_forcelist=(502, 503, 504),
+            allowed_methods=Retry.DEFAULT_ALLOWED_METHODS | ({"POST"} if s["retry_posts"] else set()),
+            backoff_factor=s["backoff_factor"],
+            backoff_jitter=s["backoff_jitter"],
+            raise_on_status=False,  # hand the final 5xx to the caller like an unretried call
+        )
+        self.adapter = UpstreamAdapter(
+            self.breaker,
+            (s["connect_timeout"], s["read_timeout"]),
+            pool_connections=1,
+            pool_maxsize=s["pool_maxsize"],
+            max_retries=retry,
+        )
+        self.session = requests.Session()
+        self.session.mount("https://", self.adapter)
+        self.session.mount("http://", self.adapter)
+
+
+_upstreams = {}
+_upstreams_pid = None
+_upstreams_lock = threading.Lock()
+
+
+def _upstream(name):
+    global _upstreams, _upstreams_pid
+    if _upstreams_pid != os.getpid():
+        with _upstreams_lock:
+            if _upstreams_pid != os.getpid():
+                _upstreams = {}
+                _upstreams_pid = os.getpid()
+    upstream = _upstreams.get(name)
+    if upstream is None:
+        with _upstreams_lock:
+            upstream = _upstreams.get(name)
+            if upstream is None:
+                upstream = _upstreams[name] = _Upstream(name)
+    return upstream
+
+
+def upstream_session(name):
+    """Returns the pooled session for upstream `name` in this process"""
+    return _upstream(name).session
+
+
+def configure_stripe(stripe_module):
+    """Points the Stripe SDK at the pooled `stripe` session"""
+    s = _upstream("stripe").settings
+    stripe_module.default_http_client = stripe_module.RequestsClient(
+        timeout=(s["connect_timeout"], s["read_timeout"]), session=upstream_session("stripe")
+    )
+    stripe_module.max_network_retries = int(os.getenv("STRIPE_MAX_NETWORK_RETRIES", "2"))
+
+
+def twilio_http_client():
+    """Returns a Twilio HTTP client that sends through the pooled `twilio` session"""
+    from twilio.http.http_client import TwilioHttpClient
+
+    s = _upstream("twilio").settings
+    http_client = TwilioHttpClient(pool_connections=True, timeout=s["read_timeout"])
+    http_client.session = upstream_session("twilio")
+    return http_client
+
+
+def outbound_stats():
+    """Returns breaker state and connection pool usage for every upstream used so far"""
+    with _upstreams_lock:
+        upstreams = dict(_upstreams) if _upstreams_pid == os.getpid() else {}
+    return {
+        name: {
+            "breaker": upstream.breaker.stats(),
+            "pools": upstream.adapter.pool_stats(),
+            "timeout": [upstream.settings["connect_timeout"], upstream.settings["read_timeout"]],
+            "retries": upstream.settings["retries"],
+        }
+        for name, upstream in sorted(upstreams.items())
+    }
@@ -0,0 +1,117 @@
+"""
+Express Auto API - Keyset (cursor) pagination helpers
+
+List endpoints return one page at a time, ordered by a sort key that always
+ends in the row's primary key so it is unique. The client gets an opaque
+next_cursor holding the last row's sort key and passes it back as ?cursor= to
+resume right after that row. Unlike OFFSET, a deep page costs the same as the
+first because the database seeks straight to the key in the index.
+"""
+
+import base64
+import json
+import os
+from datetime import date, datetime
+
+DEFAULT_PAGE_LIMIT = int(os.getenv("PAGE_LIMIT_DEFAULT", "50"))
+MAX_PAGE_LIMIT = int(os.getenv("PAGE_LIMIT_MAX", "200"))
+
+
+class InvalidPageRequest(ValueError):
+    """Raised for a malformed limit or cursor; routes turn it into a 400"""
+
+
+def encode_cursor(values):
+    """Packs a row's sort-key values into an opaque URL-safe string"""
+    plain = [v.isoformat() if isinstance(v, (datetime, date)) else v for v in values]
+    raw = json.dumps(plain, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _valid_key_value(value, kind):
+    if kind == "id":
+        return isinstance(value, int) and not isinstance(value, bool)
+    if value is None:
+        return True  # nullable sort columns sort NULLs last
+    if kind == "datetime":
+        try:
+            datetime.fromisoformat(value)  # also accepts plain dates
+        except (TypeError, ValueError):
+            return False
+        return True
+    return isinstance(value, str)  # "text"
+
+
+def decode_cursor(cursor, key_kinds):
+    """
+    Unpacks a cursor produced by encode_cursor.
+
+    key_kinds names each sort-key value's kind: "id" (an int), "datetime" (an
+    ISO date or datetime string) or "text"; non-id values may be null. A
+    cursor that doesn't match raises InvalidPageRequest before it reaches SQL.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise InvalidPageRequest("Invalid cursor")
+    if not isinstance(values, list) or len(values) != len(key_kinds):
+        raise InvalidPageRequest("Invalid cursor")
+    if not all(_valid_key_value(v, kind) for v, kind in zip(values, key_kinds)):
+        raise InvalidPageRequest("Invalid cursor")
+    return values
+
+
+def page_params(args, key_kinds):
+    """Reads ?limit= and ?cursor= from request args; returns (limit, cursor values or None)"""
+    raw_limit = args.get("limit")
+    if raw_limit in (None, ""):
+        limit = DEFAULT_PAGE_LIMIT
+    else:
+        try:
+            limit = int(raw_limit)
+        except ValueError:
+            raise InvalidPageRequest("'limit' must be an integer")
+        if limit < 1:
+            raise InvalidPageRequest("'limit' must be at least 1")
+    limit = min(limit, MAX_PAGE_LIMIT)
+
+    cursor = args.get("cursor")
+    return limit, (decode_cursor(cursor, key_kinds) if cursor else None)
+
+
+def keyset_after(sort_column, id_column, after, descending=False, nullable=False):
+    """
+    Builds the WHERE fragment selecting rows that come after `after` = [sort, id].
+
+    Returns (sql, params). With nullable=True the sort column is treated as
+    ORDER BY sort ASC NULLS LAST, id ASC (PostgreSQL's default for ASC).
+    """
+    if after is None:
+        return "TRUE", ()
+    sort_value, id_value = after
+
+    if not nullable:
+        op = "<" if descending else ">"
+        return f"({sort_column}, {id_column}) {op} (%s, %s)", (sort_value, id_value)
+
+    if descending:
+        raise ValueError("nullable keyset columns are only supported ascending")
+    if sort_value is None:
+        return f"({sort_column} IS NULL AND {id_column} > %s)", (id_value,)
+    return (
+        f"(({sort_column}, {id_column}) > (%s, %s) OR {sort_column} IS NULL)",
+        (sort_value, id_value),
+    )
+
+
+def paginate(rows, limit, key):
+    """
+    Trims a result fetched with LIMIT limit + 1 and builds next_cursor.
+
+    `key` maps a row to its sort-key values. next_cursor is None on the last page.
+    """
+    if len(rows) <= limit:
+        return rows, None
+    page = rows[:limit]
+    return page, encode_cursor(key(page[-1]))
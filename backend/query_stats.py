@@ -0,0 +1,213 @@
+"""
+Express Auto API - Per-request SQL instrumentation
+
+open_db_connection() creates InstrumentedConnection objects. Every cursor they
+hand out times execute()/executemany() and reports into the connection's
+current `recorder` (a QueryStats the request installs when it borrows the
+connection). app.py turns that into a Server-Timing header, a structured
+slow-query log line, and per-route aggregates.
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+from psycopg2 import extensions
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+
+slow_query_logger = logging.getLogger("xpressauto.slow_query")
+
+_WHITESPACE = re.compile(r"\s+")
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s")
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?(?![\w.])")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+
+
+def normalize_sql(sql):
+    """Reduces a statement to its shape: literals and placeholders become ?, whitespace collapses"""
+    if isinstance(sql, bytes):
+        sql = sql.decode("utf-8", "replace")
+    elif not isinstance(sql, str):
+        sql = str(sql)  # psycopg2.sql.Composed and friends
+    sql = _PLACEHOLDER.sub("?", sql)
+    sql = _STRING_LITERAL.sub("?", sql)
+    sql = _NUMBER_LITERAL.sub("?", sql)
+    sql = _IN_LIST.sub("(...)", sql)
+    return _WHITESPACE.sub(" ", sql).strip()
+
+
+class QueryStats:
+    """Statement count, total time and slowest statement for one request"""
+
+    __slots__ = ("count", "total", "slowest_sql", "slowest_time", "slow")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.slowest_sql = None
+        self.slowest_time = 0.0
+        self.slow = []  # (normalized sql, seconds) above SLOW_QUERY_MS
+
+    def record(self, sql, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds >= self.slowest_time:
+            self.slowest_time = seconds
+            self.slowest_sql = sql
+        if seconds * 1000 >= SLOW_QUERY_MS:
+            self.slow.append((normalize_sql(sql), seconds))
+
+    def merge(self, other):
+        """Adds the statements another QueryStats recorded, e.g. on a helper thread's connection"""
+        self.count += other.count
+        self.total += other.total
+        if other.slowest_sql is not None and other.slowest_time >= self.slowest_time:
+            self.slowest_time = other.slowest_time
+            self.slowest_sql = other.slowest_sql
+        self.slow.extend(other.slow)
+
+
+_statement_observer = None
+
+
+def set_statement_observer(observer):
+    """Registers observer(seconds, ok), called for every statement on any connection"""
+    global _statement_observer
+    _statement_observer = observer
+
+
+_timed_factories = {}
+_timed_factories_lock = threading.Lock()
+
+
+def _timed_cursor_class(base):
+    """Returns (and caches) a subclass of `base` whose execute calls are timed"""
+    cls = _timed_factories.get(base)
+    if cls is not None:
+        return cls
+
+    def _timed(method):
+        def wrapper(self, query, vars=None):
+            recorder = getattr(self.connection, "recorder", None)
+            observer = _statement_observer
+            if recorder is None and observer is None:
+                return method(self, query, vars)
+            started = time.perf_counter()
+            ok = False
+            try:
+                result = method(self, query, vars)
+                ok = True
+                return result
+            finally:
+                elapsed = time.perf_counter() - started
+                if recorder is not None:
+                    recorder.record(query, elapsed)
+                if observer is not None:
+                    observer(elapsed, ok)
+
+        return wrapper
+
+    with _timed_factories_lock:
+        cls = _timed_factories.get(base)
+        if cls is None:
+            cls = type(
+                "Timed" + base.__name__,
+                (base,),
+                {"execute": _timed(base.execute), "executemany": _timed(base.executemany)},
+            )
+            _timed_factories[base] = cls
+    return cls
+
+
+class InstrumentedConnection(extensions.connection):
+    """psycopg2 connection whose cursors report their statement timings to `recorder`"""
+
+    recorder = None
+
+    def cursor(self, *args, **kwargs):
+        factory = kwargs.get("cursor_factory") or self.cursor_factory or extensions.cursor
+        kwargs["cursor_factory"] = _timed_cursor_class(factory)
+        return super().cursor(*args, **kwargs)
+
+
+class RouteQueryAggregates:
+    """Process-wide per-endpoint totals, so regressions show up as a route's numbers move"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {}
+
+    def add(self, endpoint, stats, request_seconds):
+        with self._lock:
+            route = self._routes.get(endpoint)
+            if route is None:
+                route = self._routes[endpoint] = {
+                    "requests": 0,
+                    "statements": 0,
+                    "db_time_total_ms": 0.0,
+                    "db_time_max_ms": 0.0,
+                    "request_time_total_ms": 0.0,
+                    "slow_queries": 0,
+                    "slowest_sql": None,
+                    "slowest_ms": 0.0,
+                }
+            db_ms = stats.total * 1000
+            route["requests"] += 1
+            route["statements"] += stats.count
+            route["db_time_total_ms"] += db_ms
+            route["db_time_max_ms"] = max(route["db_time_max_ms"], db_ms)
+            route["request_time_total_ms"] += request_seconds * 1000
+            route["slow_queries"] += len(stats.slow)
+            if stats.slowest_time * 1000 > route["slowest_ms"]:
+                route["slowest_ms"] = stats.slowest_time * 1000
+                route["slowest_sql"] = normalize_sql(stats.slowest_sql)
+
+    def snapshot(self):
+        with self._lock:
+            routes = {name: dict(values) for name, values in self._routes.items()}
+        for values in routes.values():
+            n = values["requests"]
+            values["avg_statements"] = round(values["statements"] / n, 2)
+            values["avg_db_time_ms"] = round(values["db_time_total_ms"] / n, 3)
+            values["avg_request_time_ms"] = round(values["request_time_total_ms"] / n, 3)
+            for key in ("db_time_total_ms", "db_time_max_ms", "request_time_total_ms", "slowest_ms"):
+                values[key] = round(values[key], 3)
+        return routes
+
+    def reset(self):
+        with self._lock:
+            self._routes.clear()
+
+
+def log_slow_queries(endpoint, method, path, stats):
+    """Emits one structured log line per slow statement in the request"""
+    for sql, seconds in stats.slow:
+        slow_query_logger.warning(
+            json.dumps(
+                {
+                    "event": "slow_query",
+                    "endpoint": endpoint,
+                    "method": method,
+                    "path": path,
+                    "duration_ms": round(seconds * 1000, 3),
+                    "threshold_ms": SLOW_QUERY_MS,
+                    "sql": sql,
+                    "request_statements": stats.count,
+                    "request_db_time_ms": round(stats.total * 1000, 3),
+                }
+            )
+        )
+
+
+def server_timing_header(stats, request_seconds):
+    """Formats the Server-Timing header value for the browser's network panel"""
+    return (
+        f'db;dur={stats.total * 1000:.2f};desc="{stats.count} queries", '
+        f"db-slowest;dur={stats.slowest_time * 1000:.2f}, "
+        f"app;dur={request_seconds * 1000:.2f}"
+    )
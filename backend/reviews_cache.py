@@ -0,0 +1,207 @@
+"""
+Express Auto API - Stale-while-revalidate cache for upstream payloads
+
+Used for the Google Places reviews behind /api/reviews, which change a few
+times a month but were fetched on every page view. Entries are fresh for
+`ttl` seconds. After that they are still served, marked stale, for up to
+`stale_ttl` more seconds while one background thread refreshes them. Only a
+cold or fully expired entry makes a caller wait on the upstream, and
+concurrent callers for the same key share that single fetch (single-flight).
+If a fetch fails, whatever value is cached keeps being served, however old,
+and the refresh is retried after `retry_after` seconds. With nothing cached,
+callers get the failure itself re-raised for those `retry_after` seconds
+rather than a fresh upstream call each, so an outage isn't hammered by cold
+requests.
+
+Each worker process has its own copy. When `shared_path` is set, entries are
+also written to that JSON file, and refreshes take an flock on
+`<shared_path>.lock`, so all gunicorn workers on a host share one upstream
+call per expiry and a restarted worker starts warm.
+"""
+
+import fcntl
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger("xpressauto.reviews_cache")
+
+
+class _Entry:
+    __slots__ = ("value", "fetched_at")
+
+    def __init__(self, value, fetched_at):
+        self.value = value
+        self.fetched_at = fetched_at  # wall clock, so ages agree across processes
+
+
+class _Flight:
+    """One in-progress load that other callers can wait on"""
+
+    __slots__ = ("done", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.error = None
+
+
+class StaleWhileRevalidateCache:
+    """Thread-safe SWR cache; get() returns (value, age_seconds, state)"""
+
+    def __init__(self, ttl=900.0, stale_ttl=86400.0, retry_after=30.0, shared_path=None):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.retry_after = retry_after
+        self.shared_path = shared_path
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._flights = {}
+        self._retry_at = {}  # key -> monotonic time before which no refresh is attempted
+        self._last_errors = {}  # key -> the failure that set _retry_at, re-raised on cold misses
+        self._stats = {
+            "hits": 0,
+            "stale_hits": 0,
+            "misses": 0,
+            "collapsed": 0,
+            "refreshes": 0,
+            "refresh_errors": 0,
+            "backoff_errors": 0,
+        }
+
+    def get(self, key, loader):
+        """Returns the cached value for key, calling loader(key) only when needed"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            age = now - entry.fetched_at if entry else None
+            if entry and age < self.ttl:
+                self._stats["hits"] += 1
+                return entry.value, age, "hit"
+            if entry and age < self.ttl + self.stale_ttl:
+                self._stats["stale_hits"] += 1
+                self._start_background_refresh(key, loader)
+                return entry.value, age, "stale"
+            flight = self._flights.get(key)
+            if flight is None and time.monotonic() < self._retry_at.get(key, 0):
+                self._stats["backoff_errors"] += 1
+                raise self._last_errors[key]
+            if flight is None:
+                flight = self._flights[key] = _Flight()
+                leader = True
+                self._stats["misses"] += 1
+            else:
+                leader = False
+                self._stats["collapsed"] += 1
+
+        if leader:
+            self._load(key, loader, flight)
+        else:
+            flight.done.wait()
+
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            raise flight.error
+        age = time.time() - entry.fetched_at
+        return entry.value, age, "miss" if flight.error is None else "stale"
+
+    def _start_background_refresh(self, key, loader):
+        # Caller holds self._lock
+        if key in self._flights or time.monotonic() < self._retry_at.get(key, 0):
+            return
+        flight = self._flights[key] = _Flight()
+        threading.Thread(
+            target=self._load, args=(key, loader, flight), name=f"swr-refresh-{key}", daemon=True
+        ).start()
+
+    def _load(self, key, loader, flight):
+        """Runs loader for key and publishes the result; always resolves the flight"""
+        try:
+            entry = self._load_shared(key, loader) if self.shared_path else _Entry(loader(key), time.time())
+            with self._lock:
+                self._entries[key] = entry
+                self._retry_at.pop(key, None)
+                self._last_errors.pop(key, None)
+                self._stats["refreshes"] += 1
+        except Exception as e:
+            flight.error = e
+            logger.warning("Refreshing %s failed: %s", key, e)
+            with self._lock:
+                self._retry_at[key] = time.monotonic() + self.retry_after
+                self._last_errors[key] = e
+                self._stats["refresh_errors"] += 1
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    def _load_shared(self, key, loader):
+        """Loads under a cross-process lock, reusing another worker's fresh result if present"""
+        with open(self.shared_path + ".lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                stored = self._read_shared().get(key)
+                if stored and time.time() - stored["fetched_at"] < self.ttl:
+                    return _Entry(stored["value"], stored["fetched_at"])
+                entry = _Entry(loader(key), time.time())
+                self._write_shared(key, entry)
+                return entry
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_shared(self):
+        try:
+            with open(self.shared_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_shared(self, key, entry):
+        data = self._read_shared()
+        data[key] = {"value": entry.value, "fetched_at": entry.fetched_at}
+        directory = os.path.dirname(os.path.abspath(self.shared_path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".reviews-cache-")
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.shared_path)  # readers never see a half-written file
+
+    def warm_from_shared(self):
+        """Loads whatever the shared file holds, so a new worker can serve without fetching"""
+        if not self.shared_path:
+            return
+        with self._lock:
+            for key, stored in self._read_shared().items():
+                self._entries.setdefault(key, _Entry(stored["value"], stored["fetched_at"]))
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def stats(self):
+        """Returns counters plus the age of every cached key"""
+        now = time.time()
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["entries"] = {
+                key: round(now - entry.fetched_at, 1) for key, entry in self._entries.items()
+            }
+            snapshot["refreshing"] = sorted(self._flights)
+        snapshot.update(
+            {"ttl": self.ttl, "stale_ttl": self.stale_ttl, "shared_path": self.shared_path}
+        )
+        return snapshot
+
+
+def reviews_cache_from_env():
+    """Builds the reviews cache from the REVIEWS_CACHE_* environment variables"""
+    cache = StaleWhileRevalidateCache(
+        ttl=float(os.getenv("REVIEWS_CACHE_TTL", "900")),
+        stale_ttl=float(os.getenv("REVIEWS_CACHE_STALE_TTL", "86400")),
+        retry_after=float(os.getenv("REVIEWS_CACHE_RETRY_AFTER", "30")),
+        shared_path=os.getenv("REVIEWS_CACHE_FILE") or None,
+    )
+    cache.warm_from_shared()
+    return cache
@@ -0,0 +1,275 @@
+"""
+Express Auto API - Batched S3 deletes and the orphaned-object sweeper
+
+delete_keys() removes objects with DeleteObjects, at most 1000 keys per
+request. Routes call it after their DB commit. A failure there leaves an
+object that nothing references, never a row pointing at a missing object.
+The sweeper collects whatever those failures (and older code paths) left
+behind.
+
+The sweeper first loads every object URL the database references into one
+Python set. That covers media file, thumbnail and variant URLs,
+vehicles.vehicle_image_url and users.profile_picture_url, read through a
+server-side cursor. It then pages through ListObjectsV2 and checks each key
+against the set, with no per-key queries. Unreferenced keys older than
+--min-age-hours are deleted in batches. The age check keeps it away from
+presigned uploads that haven't been confirmed yet and from rows written after
+the snapshot.
+
+Before the sweep it collects released blobs. A media_blobs row whose refcount
+has been 0 for --blob-grace-hours is locked, its object and variants are
+deleted, and only then is the row deleted and committed. An upload of the
+same file waits on that lock in claim_blob() and stores the file again. A
+failed S3 delete keeps the row for the next run.
+
+Usage (from backend/, e.g. nightly from cron):
+    python s3_cleanup.py --dry-run                 # list what would be deleted
+    python s3_cleanup.py --min-age-hours 48
+    python s3_cleanup.py --prefix media/ --max-deletes 10000
+"""
+
+import argparse
+import logging
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+from metrics import track_dependency
+
+logger = logging.getLogger("xpressauto.s3_cleanup")
+
+MAX_DELETE_KEYS = 1000  # DeleteObjects limit
+
+# One row per referenced URL; UNION drops duplicates before they cross the wire
+REFERENCED_URLS_SQL = """
+    SELECT file_url AS url FROM media
+    UNION SELECT thumbnail_url FROM media WHERE thumbnail_url IS NOT NULL
+    UNION SELECT w ->> 'url' FROM media, jsonb_array_elements(variants -> 'widths') AS w
+        WHERE variants IS NOT NULL
+    UNION SELECT vehicle_image_url FROM vehicles WHERE vehicle_image_url IS NOT NULL
+    UNION SELECT profile_picture_url FROM users WHERE profile_picture_url IS NOT NULL
+    UNION SELECT url FROM media_blobs
+    UNION SELECT variants -> 'thumbnail' ->> 'url' FROM media_blobs WHERE variants IS NOT NULL
+    UNION SELECT w ->> 'url' FROM media_blobs, jsonb_array_elements(variants -> 'widths') AS w
+        WHERE variants IS NOT NULL
+"""
+
+RELEASED_BLOBS_SQL = """
+    SELECT sha256, url, variants FROM media_blobs
+    WHERE refcount = 0 AND released_at < CURRENT_TIMESTAMP - make_interval(secs => %s)
+    ORDER BY released_at
+    LIMIT %s
+    FOR UPDATE SKIP LOCKED
+"""
+
+
+def delete_keys(s3_client, bucket, keys):
+    """Deletes keys in DeleteObjects batches; returns (deleted, [(key, error), ...])"""
+    keys = list(dict.fromkeys(k for k in keys if k))
+    deleted, errors = 0, []
+    for start in range(0, len(keys), MAX_DELETE_KEYS):
+        batch = keys[start : start + MAX_DELETE_KEYS]
+        with track_dependency("s3", "delete_objects"):
+            response = s3_client.delete_objects(
+                Bucket=bucket,
+                Delete={"Objects": [{"Key": k} for k in batch], "Quiet": True},
+            )
+        # Quiet mode only reports failures
+        failed = [(e["Key"], e.get("Message") or e.get("Code")) for e in response.get("Errors", [])]
+        deleted += len(batch) - len(failed)
+        errors.extend(failed)
+    return deleted, errors
+
+
+def referenced_keys(conn, object_key, url_prefix):
+    """Every key in our bucket that some row references, as a set"""
+    keys = set()
+    with conn.cursor(name="s3_cleanup_referenced") as cursor:
+        cursor.itersize = 10_000
+        cursor.execute(REFERENCED_URLS_SQL)
+        for row in cursor:
+            url = row["url"]
+            if url and url.startswith(url_prefix):
+                keys.add(object_key(url))
+    conn.rollback()
+    return keys
+
+
+def blob_object_urls(row):
+    """The stored file and every rendered variant of one media_blobs row"""
+    variants = row["variants"] or {}
+    urls = [row["url"]]
+    if variants.get("thumbnail"):
+        urls.append(variants["thumbnail"]["url"])
+    urls.extend(w["url"] for w in variants.get("widths", []))
+    return urls
+
+
+def collect_released_blobs(conn, s3_client, bucket, object_key, grace, batch_size=1000, dry_run=False):
+    """Deletes blobs released for longer than grace; returns {"released", "deleted", "errors"}"""
+    stats = {"released": 0, "deleted": 0, "errors": 0}
+    if dry_run:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT count(*) AS n FROM media_blobs
+                WHERE refcount = 0 AND released_at < CURRENT_TIMESTAMP - make_interval(secs => %s)
+                """,
+                (grace.total_seconds(),),
+            )
+            stats["released"] = cursor.fetchone()["n"]
+        conn.rollback()
+        return stats
+
+    while True:
+        with conn.cursor() as cursor:
+            cursor.execute(RELEASED_BLOBS_SQL, (grace.total_seconds(), batch_size))
+            rows = cursor.fetchall()
+            if not rows:
+                conn.rollback()
+                return stats
+            row_keys = {row["sha256"]: [object_key(url) for url in blob_object_urls(row)] for row in rows}
+            # Objects go first, while the rows are still locked
+            deleted, errors = delete_keys(s3_client, bucket, [k for keys in row_keys.values() for k in keys])
+            failed_keys = {key for key, _ in errors}
+            for key, error in errors:
+                logger.warning("Could not delete %s: %s", key, error)
+            collected = [sha for sha, keys in row_keys.items() if not failed_keys.intersection(keys)]
+            cursor.execute("DELETE FROM media_blobs WHERE sha256 = ANY(%s)", (collected,))
+        conn.commit()
+        stats["released"] += len(rows)
+        stats["deleted"] += len(collected)
+        stats["errors"] += len(errors)
+        if len(rows) < batch_size or len(collected) < len(rows):
+            # A short batch is the last one; a failed delete would come back at once
+            return stats
+
+
+class OrphanSweeper:
+    """Lists the bucket page by page and deletes objects no row references"""
+
+    def __init__(self, s3_client, bucket, min_age=timedelta(hours=24), dry_run=False, page_size=1000):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.min_age = min_age
+        self.dry_run = dry_run
+        self.page_size = page_size
+        self.stats = {
+            "listed": 0,
+            "referenced": 0,
+            "too_new": 0,
+            "orphans": 0,
+            "orphan_bytes": 0,
+            "deleted": 0,
+            "errors": 0,
+        }
+
+    def _pages(self, prefix):
+        paginator = self.s3_client.get_paginator("list_objects_v2")
+        pages = paginator.paginate(
+            Bucket=self.bucket, Prefix=prefix, PaginationConfig={"PageSize": self.page_size}
+        )
+        while True:
+            with track_dependency("s3", "list_objects_v2"):
+                page = next(pages, None)
+            if page is None:
+                return
+            yield page.get("Contents", [])
+
+    def sweep(self, referenced, prefix="", max_deletes=None, on_orphan=None):
+        """Deletes (or with dry_run only reports) orphans under prefix; returns self.stats"""
+        cutoff = datetime.now(timezone.utc) - self.min_age
+        pending = []
+        for contents in self._pages(prefix):
+            for obj in contents:
+                self.stats["listed"] += 1
+                if obj["Key"] in referenced:
+                    self.stats["referenced"] += 1
+                elif obj["LastModified"] > cutoff:
+                    self.stats["too_new"] += 1
+                else:
+                    if max_deletes is not None and self.stats["orphans"] >= max_deletes:
+                        break
+                    self.stats["orphans"] += 1
+                    self.stats["orphan_bytes"] += obj.get("Size", 0)
+                    if on_orphan:
+                        on_orphan(obj)
+                    pending.append(obj["Key"])
+            if len(pending) >= MAX_DELETE_KEYS:
+                self._flush(pending[:MAX_DELETE_KEYS])
+                del pending[:MAX_DELETE_KEYS]
+            if max_deletes is not None and self.stats["orphans"] >= max_deletes:
+                break
+        while pending:
+            self._flush(pending[:MAX_DELETE_KEYS])
+            del pending[:MAX_DELETE_KEYS]
+        return self.stats
+
+    def _flush(self, keys):
+        if self.dry_run:
+            return
+        deleted, errors = delete_keys(self.s3_client, self.bucket, keys)
+        self.stats["deleted"] += deleted
+        self.stats["errors"] += len(errors)
+        for key, error in errors:
+            logger.warning("Could not delete %s: %s", key, error)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--dry-run", action="store_true", help="report orphans without deleting them")
+    parser.add_argument("--min-age-hours", type=float, default=24.0)
+    parser.add_argument("--prefix", default="", help="only sweep keys under this prefix")
+    parser.add_argument("--max-deletes", type=int, help="stop after this many orphans")
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument("--blob-grace-hours", type=float, default=24.0, help="keep released blobs this long")
+    parser.add_argument("--verbose", action="store_true", help="print every orphan key")
+    args = parser.parse_args()
+
+    # app.py owns the S3 client and the key <-> URL mapping
+    from app import S3_BUCKET_NAME, s3_client, s3_key_from_url, s3_object_url
+    from migrate import connect
+
+    started = time.perf_counter()
+    conn = connect()
+    try:
+        blobs = collect_released_blobs(
+            conn,
+            s3_client,
+            S3_BUCKET_NAME,
+            s3_key_from_url,
+            timedelta(hours=args.blob_grace_hours),
+            dry_run=args.dry_run,
+        )
+        blob_verb = "would delete" if args.dry_run else f"deleted {blobs['deleted']} of"
+        print(f"Released blobs: {blob_verb} {blobs['released']}, {blobs['errors']} errors", flush=True)
+        started = time.perf_counter()
+        referenced = referenced_keys(conn, s3_key_from_url, s3_object_url(""))
+    finally:
+        conn.close()
+    loaded = time.perf_counter()
+    print(f"{len(referenced)} referenced keys loaded in {loaded - started:.1f}s", flush=True)
+
+    sweeper = OrphanSweeper(
+        s3_client,
+        S3_BUCKET_NAME,
+        min_age=timedelta(hours=args.min_age_hours),
+        dry_run=args.dry_run,
+        page_size=args.page_size,
+    )
+    on_orphan = (lambda obj: print(f"  {obj['Key']} ({obj.get('Size', 0)} bytes)")) if args.verbose else None
+    stats = sweeper.sweep(referenced, args.prefix, args.max_deletes, on_orphan)
+    elapsed = time.perf_counter() - loaded
+
+    verb = "would delete" if args.dry_run else f"deleted {stats['deleted']} of"
+    print(
+        f"Listed {stats['listed']} objects in {elapsed:.1f}s ({stats['listed'] / max(elapsed, 1e-6):.0f}/s): "
+        f"{stats['referenced']} referenced, {stats['too_new']} too new, "
+        f"{verb} {stats['orphans']} orphans ({stats['orphan_bytes'] / (1024 * 1024):.1f}MB), "
+        f"{stats['errors']} errors"
+    )
+    return 1 if stats["errors"] or blobs["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
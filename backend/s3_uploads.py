@@ -0,0 +1,242 @@
+"""
+Express Auto API - Direct-to-S3 uploads
+
+Uploads used to come through Flask: a worker thread sat on the request while
+the browser sent the file and then again while upload_fileobj pushed it to S3.
+Now the browser asks /api/uploads/presign for a presigned POST policy and
+sends the file straight to the bucket. It then calls the matching confirm
+endpoint, which only reads the object's size, type and first bytes and
+writes the database row.
+
+A policy is valid for UPLOAD_URL_EXPIRES seconds. It pins the object key
+(always under "<prefix>/<user_id>/"), the Content-Type, the ACL and a
+content-length-range, so S3 itself rejects anything else. Confirm checks the
+stored object again, because the browser chooses which key it reports back.
+That check includes the file's leading bytes, since a policy can't look
+inside the file. An object under the user's prefix that fails the check is
+deleted on the spot. A blob that fails it is left alone, since another
+upload may be about to claim the same key; no media_blobs row refers to it,
+so s3_cleanup's sweeper collects it once it is --min-age-hours old.
+
+sniff_content_type() is also used by the multipart upload routes to reject
+files whose bytes don't match an allowed image type before anything is sent
+to S3.
+
+Uploads are content-addressed. The browser sends the file's SHA-256 with its
+presign request, and the multipart routes hash the file while Werkzeug
+spools it. Both paths store the file once under blob_key(); see migration
+0013 for how media_blobs counts the rows that share it. For a hash that is
+already stored, presign answers {"exists": true} and the browser skips the
+upload. Otherwise the policy carries x-amz-checksum-sha256, so S3 rejects a
+body that doesn't match the hash its key claims.
+"""
+
+import base64
+import os
+import re
+import uuid
+
+from botocore.exceptions import ClientError
+from werkzeug.utils import secure_filename
+
+# extension -> content type; the only files any upload route accepts
+IMAGE_EXTENSIONS = {
+    "png": "image/png",
+    "jpg": "image/jpeg",
+    "jpeg": "image/jpeg",
+    "gif": "image/gif",
+    "webp": "image/webp",
+}
+IMAGE_CONTENT_TYPES = set(IMAGE_EXTENSIONS.values())
+BLOB_EXTENSIONS = {"image/png": "png", "image/jpeg": "jpg", "image/gif": "gif", "image/webp": "webp"}
+
+BLOB_PREFIX = "blobs/"
+BLOB_KEY_PATTERN = re.compile(r"^blobs/([0-9a-f]{2})/(\1[0-9a-f]{62})\.(png|jpg|gif|webp)$")
+SHA256_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+BLOB_CACHE_CONTROL = "public, max-age=31536000, immutable"  # a blob key never changes content
+
+# Takes the blob's row lock for the rest of the transaction, so s3_cleanup
+# can't collect it underneath us; created is true when the caller must store it
+CLAIM_BLOB_SQL = """
+    INSERT INTO media_blobs (sha256, url, content_type, size)
+    VALUES (%(sha256)s, %(url)s, %(content_type)s, %(size)s)
+    ON CONFLICT (sha256) DO UPDATE SET sha256 = EXCLUDED.sha256
+    RETURNING (xmax = 0) AS created
+"""
+
+SNIFF_BYTES = 16
+
+MAGIC_NUMBERS = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+)
+
+CACHE_CONTROL = "public, max-age=86400"
+
+# kind -> key prefix, accepted content types, default size cap in bytes
+UPLOAD_KINDS = {
+    "vehicle_photo": {"prefix": "vehicle", "content_types": IMAGE_CONTENT_TYPES, "max_bytes": 10 * 1024 * 1024},
+    "media": {"prefix": "media", "content_types": IMAGE_CONTENT_TYPES, "max_bytes": 20 * 1024 * 1024},
+    "profile_photo": {"prefix": "profile", "content_types": IMAGE_CONTENT_TYPES, "max_bytes": 5 * 1024 * 1024},
+}
+
+
+class InvalidUpload(Exception):
+    """The upload request or the uploaded object doesn't satisfy the kind's rules"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def sniff_content_type(head):
+    """Content type implied by a file's first SNIFF_BYTES bytes, or None if unrecognised"""
+    for magic, content_type in MAGIC_NUMBERS:
+        if head.startswith(magic):
+            return content_type
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+def sniff_upload(stream):
+    """Sniffs an uploaded file stream without consuming it"""
+    head = stream.read(SNIFF_BYTES)
+    stream.seek(0)
+    return sniff_content_type(head)
+
+
+def content_type_for(filename):
+    """Content type for an accepted image extension, or None"""
+    extension = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+    return IMAGE_EXTENSIONS.get(extension)
+
+
+def blob_key(sha256, content_type):
+    return f"{BLOB_PREFIX}{sha256[:2]}/{sha256}.{BLOB_EXTENSIONS[content_type]}"
+
+
+def blob_sha256(key):
+    """The hash a blob key was stored under, or None for any other key"""
+    match = BLOB_KEY_PATTERN.match(key or "")
+    return match.group(2) if match else None
+
+
+def claim_blob(cursor, sha256, url, content_type, size):
+    """Registers a blob on the caller's transaction; returns True if it wasn't stored yet"""
+    cursor.execute(
+        CLAIM_BLOB_SQL,
+        {"sha256": sha256, "url": url, "content_type": content_type, "size": size},
+    )
+    return cursor.fetchone()["created"]
+
+
+def upload_settings(kind):
+    """Settings for kind, with UPLOAD_<KIND>_MAX_BYTES overriding the size cap"""
+    if kind not in UPLOAD_KINDS:
+        raise InvalidUpload(f"kind must be one of: {', '.join(sorted(UPLOAD_KINDS))}")
+    settings = dict(UPLOAD_KINDS[kind])
+    settings["max_bytes"] = int(os.getenv(f"UPLOAD_{kind.upper()}_MAX_BYTES", settings["max_bytes"]))
+    return settings
+
+
+def user_prefix(kind, user_id):
+    return f"{UPLOAD_KINDS[kind]['prefix']}/{int(user_id)}/"
+
+
+class DirectUploads:
+    """Issues presigned POST policies and checks the objects they produced"""
+
+    def __init__(self, s3_client, bucket, expires_in=300):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.expires_in = expires_in
+
+    def presign(self, kind, user_id, filename, sha256=None):
+        """Returns {url, fields, key, expires_in, max_bytes} for one browser upload
+
+        With sha256 the key is the content-addressed blob key and S3 checks the
+        body against the hash; without it the key is unique to this upload.
+        """
+        settings = upload_settings(kind)
+        name = secure_filename(filename or "")
+        if not name:
+            raise InvalidUpload("filename is required")
+        content_type = content_type_for(name)
+        if content_type not in settings["content_types"]:
+            raise InvalidUpload("File type not allowed")
+
+        if sha256:
+            key = blob_key(sha256, content_type)
+            cache_control = BLOB_CACHE_CONTROL
+            key_condition = {"key": key}
+        else:
+            key = f"{user_prefix(kind, user_id)}{uuid.uuid4().hex}_{name}"
+            cache_control = CACHE_CONTROL
+            key_condition = ["starts-with", "$key", user_prefix(kind, user_id)]
+        fields = {
+            "acl": "public-read",
+            "Content-Type": content_type,
+            "Cache-Control": cache_control,
+        }
+        if sha256:
+            fields["x-amz-checksum-sha256"] = base64.b64encode(bytes.fromhex(sha256)).decode()
+        conditions = [{field: value} for field, value in fields.items()] + [
+            key_condition,
+            ["content-length-range", 1, settings["max_bytes"]],
+        ]
+        post = self.s3_client.generate_presigned_post(
+            self.bucket,
+            key,
+            Fields=fields,
+            Conditions=conditions,
+            ExpiresIn=self.expires_in,
+        )
+        return {
+            "url": post["url"],
+            "fields": post["fields"],
+            "key": key,
+            "expires_in": self.expires_in,
+            "max_bytes": settings["max_bytes"],
+        }
+
+    def verify(self, kind, user_id, key):
+        """Checks key belongs to user_id and kind and holds what it claims; returns (size, content_type)"""
+        settings = upload_settings(kind)
+        if not isinstance(key, str):
+            raise InvalidUpload("key must be a string")
+        if not key or ".." in key or not (key.startswith(user_prefix(kind, user_id)) or blob_sha256(key)):
+            raise InvalidUpload("key does not belong to this upload kind or user", 403)
+        try:
+            # A ranged GET costs the same round trip as HEAD and also returns the magic bytes
+            obj = self.s3_client.get_object(Bucket=self.bucket, Key=key, Range=f"bytes=0-{SNIFF_BYTES - 1}")
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                raise InvalidUpload("Upload not found; it may not have finished yet", 404)
+            raise
+        head = obj["Body"].read(SNIFF_BYTES)
+        content_range = obj.get("ContentRange")  # "bytes 0-15/<total>"
+        size = int(content_range.rsplit("/", 1)[1]) if content_range else obj.get("ContentLength", 0)
+        content_type = obj.get("ContentType")
+        if content_type not in settings["content_types"] or not 0 < size <= settings["max_bytes"]:
+            self._discard(key)
+            raise InvalidUpload("Uploaded object does not match its upload policy")
+        if sniff_content_type(head) != content_type:
+            self._discard(key)
+            raise InvalidUpload("File content does not match its type")
+        return size, content_type
+
+    def _discard(self, key):
+        """Deletes a rejected upload under a user prefix; blobs are left to s3_cleanup"""
+        if blob_sha256(key):
+            return
+        try:
+            self.s3_client.delete_object(Bucket=self.bucket, Key=key)
+        except ClientError:
+            pass  # unreferenced, so the orphan sweeper gets it later
+
+
+def direct_uploads_from_env(s3_client, bucket):
+    return DirectUploads(s3_client, bucket, expires_in=int(os.getenv("UPLOAD_URL_EXPIRES", "300")))
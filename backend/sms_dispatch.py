@@ -0,0 +1,289 @@
+"""
+Express Auto API - Bulk SMS dispatch
+
+POST /api/send-sms/bulk renders one message per recipient, stores the job
+and its messages, and hands the job id to SmsDispatcher. The dispatcher sends
+the job's queued messages from a bounded thread pool. Every send first takes
+a token from RateLimiter (SMS_RATE_PER_SECOND; a Twilio long code accepts
+about 1 message per second, toll-free and short codes more). The bucket
+lives in Postgres (migration 0015), so the rate holds for the whole
+deployment however many gunicorn workers are sending.
+Each outcome (Twilio SID or error) is written back in batches, so the admin
+page can poll GET /api/sms-jobs/<id> for progress from any worker.
+
+429s, 5xx and network errors are retried with backoff up to
+SMS_MAX_ATTEMPTS. Other 4xx replies, such as an invalid or unsubscribed
+number, fail that message immediately. A job whose worker died stops
+heartbeating and can be picked up again through
+POST /api/sms-jobs/<id>/resume; only its still-queued messages are sent.
+"""
+
+import logging
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+
+import psycopg2
+import requests
+
+logger = logging.getLogger("xpressauto.sms")
+
+TEMPLATE_FIELDS = (
+    "name",
+    "first_name",
+    "last_name",
+    "invoice_number",
+    "total_amount",
+    "due_date",
+)
+_PLACEHOLDER = re.compile(r"\{(\w+)\}")
+
+STALE_JOB_SECONDS = 120  # a running job without a heartbeat this long may be resumed
+FLUSH_ATTEMPTS = 3  # tries to record a batch of outcomes before the job stops sending
+
+
+class InvalidTemplate(ValueError):
+    """Raised for a template that uses an unknown {placeholder}"""
+
+
+def check_template(template):
+    """Returns the placeholders used by template, rejecting any that can't be filled"""
+    fields = set(_PLACEHOLDER.findall(template))
+    unknown = fields - set(TEMPLATE_FIELDS)
+    if unknown:
+        raise InvalidTemplate(
+            f"Unknown template fields: {', '.join(sorted(unknown))}; "
+            f"available: {', '.join(TEMPLATE_FIELDS)}"
+        )
+    return fields
+
+
+def render_template(template, values):
+    """Substitutes {field} placeholders; missing values render as empty strings"""
+    return _PLACEHOLDER.sub(lambda m: str(values.get(m.group(1)) or ""), template)
+
+
+# Reserves the next send slot: the bucket's row holds when the slot after the
+# last reservation opens, and an idle bucket refills to `burst` seconds' worth
+RESERVE_SLOT_SQL = """
+    UPDATE sms_rate_limit
+    SET next_slot = GREATEST(next_slot, clock_timestamp() - make_interval(secs => %(burst)s))
+        + make_interval(secs => %(interval)s)
+    WHERE name = %(name)s
+    RETURNING GREATEST(
+        0, EXTRACT(EPOCH FROM next_slot - make_interval(secs => %(interval)s) - clock_timestamp())
+    )::float AS wait
+"""
+
+
+class RateLimiter:
+    """Token bucket shared by every worker process, kept in an sms_rate_limit row"""
+
+    def __init__(self, connect_db, rate, burst=None, name="twilio"):
+        self.connect_db = connect_db
+        self.name = name
+        self.interval = 1.0 / rate
+        self.burst = (max(1.0, burst or rate) - 1) / rate  # seconds of unused slots an idle bucket keeps
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+
+    def _reserve(self):
+        """Takes the next slot; returns how many seconds until it opens"""
+        with self._lock:
+            if self._conn is None or self._conn.closed or self._pid != os.getpid():
+                self._conn = self.connect_db()  # never reuse a connection inherited across fork
+                self._pid = os.getpid()
+            try:
+                with self._conn.cursor() as cursor:
+                    cursor.execute(
+                        RESERVE_SLOT_SQL,
+                        {"name": self.name, "interval": self.interval, "burst": self.burst},
+                    )
+                    row = cursor.fetchone()
+                self._conn.commit()  # release the row lock for the other workers at once
+            except psycopg2.Error:
+                self._conn.close()
+                self._conn = None
+                raise
+        if row is None:
+            raise RuntimeError(f"sms_rate_limit has no {self.name!r} row; run the migrations")
+        return row["wait"]
+
+    def acquire(self):
+        """Blocks until this process's reserved slot opens"""
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+
+def is_transient(error):
+    """429s, 5xx and connection problems are worth another attempt"""
+    status = getattr(error, "status", None)  # TwilioRestException carries the HTTP status
+    if isinstance(status, int):
+        return status == 429 or status >= 500
+    return isinstance(error, (requests.exceptions.RequestException, OSError))
+
+
+class SmsDispatcher:
+    """Sends the queued messages of bulk SMS jobs through `send(to, body) -> sid`"""
+
+    def __init__(
+        self,
+        connect_db,
+        send,
+        concurrency=4,
+        rate=1.0,
+        max_attempts=3,
+        retry_base=1.0,
+        flush_every=50,
+    ):
+        self.connect_db = connect_db
+        self.send = send
+        self.concurrency = concurrency
+        self.limiter = RateLimiter(connect_db, rate)
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.flush_every = flush_every
+
+    def start(self, job_id):
+        """Runs the job on a background thread"""
+        threading.Thread(
+            target=self.run_job, args=(job_id,), name=f"sms-job-{job_id}", daemon=True
+        ).start()
+
+    def run_job(self, job_id):
+        conn = self.connect_db()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    """
+                    UPDATE sms_jobs
+                    SET status = 'running', heartbeat_at = CURRENT_TIMESTAMP,
+                        started_at = COALESCE(started_at, CURRENT_TIMESTAMP)
+                    WHERE job_id = %s
+                      AND (status = 'queued'
+                           OR (status = 'running'
+                               AND heartbeat_at < CURRENT_TIMESTAMP - make_interval(secs => %s)))
+                    RETURNING job_id
+                    """,
+                    (job_id, STALE_JOB_SECONDS),
+                )
+                if cursor.fetchone() is None:
+                    conn.rollback()
+                    return  # finished, or another worker is running it
+                cursor.execute(
+                    """
+                    SELECT message_id, to_number, body, attempts FROM sms_messages
+                    WHERE job_id = %s AND status = 'queued'
+                    ORDER BY message_id
+                    """,
+                    (job_id,),
+                )
+                messages = cursor.fetchall()
+            conn.commit()
+
+            results = []
+            last_flush = time.monotonic()
+            with ThreadPoolExecutor(self.concurrency, thread_name_prefix=f"sms-{job_id}") as pool:
+                futures = [pool.submit(self._send_one, m) for m in messages]
+                pending = set(futures)
+                try:
+                    for future in as_completed(futures):
+                        pending.discard(future)
+                        results.append(future.result())
+                        if len(results) >= self.flush_every or time.monotonic() - last_flush > 1.0:
+                            conn = self._flush(conn, job_id, results)
+                            results, last_flush = [], time.monotonic()
+                except Exception:
+                    # Outcomes can't be recorded: stop sending. Unsent messages stay
+                    # 'queued' for a resume; the ones already sent must not be
+                    # resent, so record them if the database lets us at all.
+                    for future in pending:
+                        future.cancel()
+                    wait(pending)
+                    results += [
+                        f.result() for f in pending if not f.cancelled() and f.exception() is None
+                    ]
+                    conn = self._flush(conn, job_id, results)
+                    raise
+            conn = self._flush(conn, job_id, results)
+
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    """
+                    UPDATE sms_jobs SET status = 'completed', finished_at = CURRENT_TIMESTAMP
+                    WHERE job_id = %s
+                    """,
+                    (job_id,),
+                )
+            conn.commit()
+        except Exception:
+            logger.exception("Bulk SMS job %s stopped", job_id)
+        finally:
+            conn.close()
+
+    def _send_one(self, message):
+        """Returns (status, sid, error, attempts, message_id) for one message"""
+        attempts = message["attempts"]
+        while True:
+            attempts += 1
+            self.limiter.acquire()
+            try:
+                sid = self.send(message["to_number"], message["body"])
+                return ("sent", sid, None, attempts, message["message_id"])
+            except Exception as e:
+                if not is_transient(e) or attempts >= self.max_attempts:
+                    return ("failed", None, str(e), attempts, message["message_id"])
+                time.sleep(self.retry_base * 2 ** (attempts - 1) * random.uniform(0.5, 1.5))
+
+    def _flush(self, conn, job_id, results):
+        """Records results, reconnecting between attempts; returns the connection to go on with"""
+        if not results:
+            return conn
+        for attempt in range(1, FLUSH_ATTEMPTS + 1):
+            try:
+                if conn.closed:
+                    conn = self.connect_db()
+                self._write_results(conn, job_id, results)
+                return conn
+            except psycopg2.Error:
+                try:
+                    conn.close()
+                except psycopg2.Error:
+                    pass
+                if attempt == FLUSH_ATTEMPTS:
+                    raise
+                logger.warning("Recording SMS job %s results failed; retrying", job_id, exc_info=True)
+                time.sleep(self.retry_base * 2 ** (attempt - 1))
+
+    def _write_results(self, conn, job_id, results):
+        with conn.cursor() as cursor:
+            cursor.executemany(
+                """
+                UPDATE sms_messages
+                SET status = %s, twilio_sid = %s, error = %s, attempts = %s,
+                    sent_at = CASE WHEN %s = 'sent' THEN CURRENT_TIMESTAMP END
+                WHERE message_id = %s
+                """,
+                [(s, sid, err, n, s, mid) for s, sid, err, n, mid in results],
+            )
+            cursor.execute(
+                "UPDATE sms_jobs SET heartbeat_at = CURRENT_TIMESTAMP WHERE job_id = %s",
+                (job_id,),
+            )
+        conn.commit()
+
+
+def sms_dispatcher_from_env(connect_db, send):
+    """Builds an SmsDispatcher tuned by the SMS_* environment variables"""
+    return SmsDispatcher(
+        connect_db,
+        send,
+        concurrency=int(os.getenv("SMS_BULK_CONCURRENCY", "4")),
+        rate=float(os.getenv("SMS_RATE_PER_SECOND", "1")),
+        max_attempts=int(os.getenv("SMS_MAX_ATTEMPTS", "3")),
+    )
@@ -0,0 +1,209 @@
+"""
+Express Auto API - In-process cache for Flask-Login users
+
+Flask-Login calls load_user on every request that carries a session cookie,
+including the polling routes. Caching the resulting User objects lets those
+requests skip the users table entirely. Entries expire after a TTL and the
+cache is bounded with LRU eviction; routes that change admin rights, delete
+users or edit profiles invalidate their entry explicitly.
+
+The cache lives in each worker process. Migration 0014 sends a NOTIFY on
+CHANNEL whenever a user's email or is_admin changes or the user is deleted,
+and each worker keeps one connection LISTENing on it (started with the first
+lookup) that drops the entry. So the change reaches every worker at commit,
+whichever worker handled the write. While that connection is down, the
+cache reports every lookup as a miss and is cleared on reconnect, since
+notifications sent in between are lost.
+
+An invalidation can land between a loader's SELECT and its set(), and the
+older row would then be cached for a full TTL. Every invalidate() and
+clear() therefore advances a generation counter. A loader reads
+generation() before its SELECT and passes it to set(), which stores nothing
+if that user has been invalidated since.
+"""
+
+import logging
+import os
+import select
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger("xpressauto.user_cache")
+
+CHANNEL = "user_cache_invalidate"
+
+
+class UserCache:
+    """Thread-safe TTL + LRU cache keyed by user_id"""
+
+    def __init__(self, max_size=1024, ttl=30.0, connect_db=None):
+        """connect_db opens the LISTEN connection; without it invalidations stay local"""
+        self.max_size = max_size
+        self.ttl = ttl
+        self.connect_db = connect_db
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # user_id -> (user, expires_at)
+        self._generation = 0
+        self._invalidated_at = {}  # user_id -> generation of its last invalidation
+        self._cleared_at = 0  # generation of the last clear(); older snapshots are all stale
+        self._listener = None
+        self._listener_pid = None
+        self._listening = False
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "expirations": 0,
+            "evictions": 0,
+            "invalidations": 0,
+            "stale_sets": 0,
+            "notifies": 0,
+            "reconnects": 0,
+        }
+
+    @staticmethod
+    def _key(user_id):
+        # Flask-Login hands us the id as a string, routes use ints
+        return str(user_id)
+
+    def get(self, user_id):
+        """Returns the cached user, or None on a miss or expired entry"""
+        key = self._key(user_id)
+        if self.connect_db is not None:
+            self._ensure_listener()
+        with self._lock:
+            # Without a live LISTEN connection another worker's change could be missed
+            entry = self._entries.get(key) if self._listening or self.connect_db is None else None
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            user, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self._stats["expirations"] += 1
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return user
+
+    def generation(self):
+        """Snapshot to take before loading a user from the database; pass it to set()"""
+        with self._lock:
+            return self._generation
+
+    def set(self, user_id, user, generation=None):
+        """Stores a user, evicting the least recently used entry when full
+
+        With generation (from generation() taken before the user was read),
+        nothing is stored if the user has been invalidated since.
+        """
+        key = self._key(user_id)
+        with self._lock:
+            if generation is not None and (
+                self._cleared_at > generation or self._invalidated_at.get(key, 0) > generation
+            ):
+                self._stats["stale_sets"] += 1
+                return
+            self._entries[key] = (user, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def invalidate(self, user_id):
+        """Drops a single user so the next request reloads it from the database"""
+        key = self._key(user_id)
+        with self._lock:
+            self._generation += 1
+            if len(self._invalidated_at) >= self.max_size:
+                # Keep the map bounded: forgetting per-user generations is safe
+                # once every older snapshot is treated as stale
+                self._invalidated_at.clear()
+                self._cleared_at = self._generation
+            self._invalidated_at[key] = self._generation
+            if self._entries.pop(key, None) is not None:
+                self._stats["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._cleared_at = self._generation
+            self._invalidated_at.clear()
+            self._stats["invalidations"] += len(self._entries)
+            self._entries.clear()
+
+    # LISTENER
+
+    def _ensure_listener(self):
+        if self._listener_pid == os.getpid() and self._listener is not None and self._listener.is_alive():
+            return
+        with self._lock:
+            # Threads don't survive a gunicorn fork, so key the listener by pid
+            if self._listener_pid != os.getpid() or self._listener is None or not self._listener.is_alive():
+                self._listener_pid = os.getpid()
+                self._listening = False
+                self._entries.clear()  # may have been filled before the fork
+                self._generation += 1
+                self._cleared_at = self._generation
+                self._listener = threading.Thread(
+                    target=self._listen_forever, name="user-cache-listener", daemon=True
+                )
+                self._listener.start()
+
+    def _listen_forever(self):
+        backoff = 1.0
+        while True:
+            conn = None
+            try:
+                conn = self.connect_db()
+                conn.autocommit = True
+                with conn.cursor() as cursor:
+                    cursor.execute(f"LISTEN {CHANNEL}")
+                self.clear()  # anything sent while we weren't listening is lost
+                with self._lock:
+                    self._listening = True
+                backoff = 1.0
+                while True:
+                    if select.select([conn], [], [], 30.0) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        with self._lock:
+                            self._stats["notifies"] += 1
+                        self.invalidate(conn.notifies.pop(0).payload)
+            except Exception:
+                logger.exception("User cache listener failed; reconnecting in %.0fs", backoff)
+                with self._lock:
+                    self._listening = False
+                    self._stats["reconnects"] += 1
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+            finally:
+                if conn is not None and not conn.closed:
+                    conn.close()
+
+    def stats(self):
+        """Returns hit/miss/eviction counters and the current size"""
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot.update(
+                {
+                    "size": len(self._entries),
+                    "max_size": self.max_size,
+                    "ttl": self.ttl,
+                    "listening": self._listening,
+                }
+            )
+        lookups = snapshot["hits"] + snapshot["misses"]
+        snapshot["hit_ratio"] = round(snapshot["hits"] / lookups, 4) if lookups else 0.0
+        return snapshot
+
+
+def user_cache_from_env(connect_db=None):
+    """Builds a UserCache sized by the USER_CACHE_* environment variables"""
+    return UserCache(
+        max_size=int(os.getenv("USER_CACHE_MAX_SIZE", "1024")),
+        ttl=float(os.getenv("USER_CACHE_TTL", "30")),
+        connect_db=connect_db,
+    )
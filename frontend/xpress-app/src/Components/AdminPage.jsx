@@ -86,36 +86,72 @@ function AdminPage() {
 
   // Active Jobs state
   const [activeJobs, setActiveJobs] = useState([]);
+  // next_cursor of the last page loaded; null once the list is complete
+  const [activeJobsCursor, setActiveJobsCursor] = useState(null);
+  const [unpaidInvoicesCursor, setUnpaidInvoicesCursor] = useState(null);
+
+  // Appends the next page of a paged list endpoint
+  const loadMore = (path, cursor, key, setItems, setCursor) => {
+    setModalMessage("Loading more...");
+    axios
+      .get(`http://localhost:5000/api/${path}`, {
+        params: { cursor },
+        withCredentials: true,
+      })
+      .then((res) => {
+        if (res.data.status !== "success") {
+          throw new Error(res.data.message || "Unknown error");
+        }
+        setItems((prev) => [...prev, ...res.data[key]]);
+        setCursor(res.data.next_cursor);
+        setModalMessage("");
+      })
+      .catch((err) => {
+        console.error(`Error loading more from ${path}:`, err);
+        setModalMessage(
+          `Error loading more: ${err.response?.data?.message || err.message}`
+        );
+      });
+  };
 
-  // Fetch unpaid invoices (using useCallback to potentially optimize)
-  const fetchUnpaidInvoices = useCallback(async () => {
-    setIsLoadingUnpaidInvoices(true);
-    setUnpaidInvoiceError("");
-    setModalMessage("Loading unpaid invoices..."); // Use modal message
-    try {
-      const res = await axios.get(
-        "http://localhost:5000/api/get-unpaid-invoices",
-        { withCredentials: true }
-      );
-      if (res.data.status === "success") {
-        setUnpaidInvoices(res.data.unpaid_invoices);
-        setModalMessage(""); // Clear loading message on success
-      } else {
-        throw new Error(res.data.message || "Failed to fetch unpaid invoices");
-      }
-    } catch (err) {
-      console.error("Error fetching unpaid invoices:", err);
-      const errorMsg = `Error loading unpaid invoices: ${
-        err.response?.data?.message || err.message
-      }`;
-      setUnpaidInvoiceError(errorMsg);
-      setModalMessage(errorMsg); // Show error in modal
-    } finally {
-      setIsLoadingUnpaidInvoices(false);
-      // Optionally clear general message if only modal message is desired
-      // setMessage("");
+  // Vehicles already loaded, keyed by user_id, so picking a customer doesn't refetch
+  const [vehiclesByUser, setVehiclesByUser] = useState({});
+
+  // Loads several admin sections in one request; the backend runs them concurrently
+  const loadAdminSections = useCallback(async (sections, params = {}) => {
+    const res = await axios.get("http://localhost:5000/api/admin/bootstrap", {
+      params: { sections: sections.join(","), ...params },
+      withCredentials: true,
+    });
+    if (res.data.status !== "success") {
+      throw new Error(res.data.message || "Unknown error");
+    }
+    if (res.data.vehicles) {
+      setVehiclesByUser((prev) => ({
+        ...prev,
+        ...res.data.vehicles.vehicles_by_user,
+      }));
     }
-  }, []); // Empty dependency array means this function is created once
+    return res.data;
+  }, []);
+
+  // Vehicles for one customer, from the bootstrap cache when possible
+  const fetchVehiclesForUser = async (userId) => {
+    if (vehiclesByUser[userId]) {
+      return vehiclesByUser[userId];
+    }
+    const data = await loadAdminSections(["vehicles"], { user_ids: userId });
+    return data.vehicles.vehicles_by_user[userId] || [];
+  };
+
+  // Follows the users next_cursor so pickers and searches see every customer
+  const loadRemainingUsers = async (cursor) => {
+    while (cursor) {
+      const data = await loadAdminSections(["users", "vehicles"], { cursor });
+      setUsers((prev) => [...prev, ...data.users.users]);
+      cursor = data.users.next_cursor;
+    }
+  };
 
   // Open modal and fetch necessary data
   const openModal = (modalName) => {
@@ -123,7 +159,8 @@ function AdminPage() {
     setMessage(""); // Clear general page message
     setModalMessage(""); // Clear previous modal messages
 
-    // Fetch users for relevant modals (keep existing logic)
+    const sections = [];
+    // Users (and their vehicles) for relevant modals
     if (
       modalName === "sendNotifications" ||
       modalName === "addLoyaltyPoints" ||
@@ -133,61 +170,49 @@ function AdminPage() {
       modalName === "sendSms" ||
       modalName === "unpaidInvoices" // Also fetch users if needed for Unpaid Invoice context (e.g., display details)
     ) {
-      axios
-        .get("http://localhost:5000/api/get-users", { withCredentials: true })
-        .then((res) => {
-          if (res.data.status === "success") {
-            setUsers(res.data.users);
-          } else {
-            console.error("Failed to fetch users:", res.data.message);
-            setModalMessage(
-              // Set modal message for errors
-              `Error loading users: ${res.data.message || "Unknown error"}`
-            );
-          }
-        })
-        .catch((err) => {
-          console.error("Error fetching users:", err);
-          setModalMessage(
-            // Set modal message for errors
-            `Error loading users: ${err.response?.data?.message || err.message}`
-          );
-        });
+      sections.push("users", "vehicles");
     }
-
-    // Fetch active jobs (keep existing logic)
     if (modalName === "active-jobs") {
-      axios
-        .get("http://localhost:5000/api/active-jobs", { withCredentials: true })
-        .then((res) => {
-          if (res.data.status === "success") {
-            setActiveJobs(res.data.active_jobs);
-            setModalMessage(""); // Clear message on success
-          } else {
-            console.error("Failed to fetch active jobs:", res.data.message);
-            setModalMessage(
-              // Use modal message
-              `Error loading active jobs: ${
-                res.data.message || "Unknown error"
-              }`
-            );
-          }
-        })
-        .catch((err) => {
-          console.error("Error fetching active jobs:", err);
-          setModalMessage(
-            // Use modal message
-            `Error loading active jobs: ${
-              err.response?.data?.message || err.message
-            }`
-          );
-        });
+      sections.push("active_jobs");
     }
-
-    // --- ADDED: Fetch unpaid invoices when opening the new modal ---
     if (modalName === "unpaidInvoices") {
-      fetchUnpaidInvoices(); // Call the fetch function
+      sections.push("unpaid_invoices");
+      setIsLoadingUnpaidInvoices(true);
+      setUnpaidInvoiceError("");
+      setModalMessage("Loading unpaid invoices..."); // Use modal message
     }
+    if (sections.length === 0) return;
+
+    loadAdminSections(sections)
+      .then((data) => {
+        if (data.users) setUsers(data.users.users);
+        if (data.active_jobs) {
+          setActiveJobs(data.active_jobs.active_jobs);
+          setActiveJobsCursor(data.active_jobs.next_cursor);
+        }
+        if (data.unpaid_invoices) {
+          setUnpaidInvoices(data.unpaid_invoices.unpaid_invoices);
+          setUnpaidInvoicesCursor(data.unpaid_invoices.next_cursor);
+        }
+        setModalMessage(""); // Clear message on success
+        if (data.users) {
+          loadRemainingUsers(data.users.next_cursor).catch((err) => {
+            console.error("Error loading more customers:", err);
+            setModalMessage(
+              `Error loading customers: ${err.response?.data?.message || err.message}`
+            );
+          });
+        }
+      })
+      .catch((err) => {
+        console.error("Error loading admin data:", err);
+        const errorMsg = `Error loading data: ${
+          err.response?.data?.message || err.message
+        }`;
+        if (modalName === "unpaidInvoices") setUnpaidInvoiceError(errorMsg);
+        setModalMessage(errorMsg); // Show error in modal
+      })
+      .finally(() => setIsLoadingUnpaidInvoices(false));
   };
 
   const closeModal = () => {
@@ -221,6 +246,7 @@ function AdminPage() {
     setNewVehicleStatus("OffLot");
     setSelectedUserForVehicleStatus("");
     setVehiclesForSelectedUser([]);
+    setVehiclesByUser({}); // Reloaded with the next modal, so status changes show up
     // setInvoiceEmail(""); // Removed
     setInvoiceVehicleId("");
     // setInvoiceNumber(""); // Removed
@@ -289,21 +315,8 @@ function AdminPage() {
 
     // Fetch vehicles for the selected user
     if (userId) {
-      axios
-        .get(`http://localhost:5000/api/get-vehicles/${userId}`, {
-          withCredentials: true,
-        })
-        .then((res) => {
-          if (res.data.status === "success") {
-            setVehiclesForInvoice(res.data.vehicles);
-          } else {
-            setModalMessage(
-              `Error fetching vehicles for invoice: ${
-                res.data.message || "Unknown error"
-              }`
-            );
-          }
-        })
+      fetchVehiclesForUser(userId)
+        .then((userVehicles) => setVehiclesForInvoice(userVehicles))
         .catch((err) => {
           console.error("Error fetching vehicles for invoice:", err);
           setModalMessage(
@@ -537,19 +550,8 @@ function AdminPage() {
     setSelectedVehicle(null);
     setVehiclesForSelectedUser([]);
     if (userId) {
-      axios
-        .get(`http://localhost:5000/api/get-vehicles/${userId}`, {
-          withCredentials: true,
-        })
-        .then((res) => {
-          if (res.data.status === "success") {
-            setVehiclesForSelectedUser(res.data.vehicles);
-          } else {
-            setModalMessage(
-              `Error fetching vehicles: ${res.data.message || "Unknown error"}`
-            );
-          }
-        })
+      fetchVehiclesForUser(userId)
+        .then((userVehicles) => setVehiclesForSelectedUser(userVehicles))
         .catch((err) => {
           console.error("Error fetching vehicles for user:", err);
           setModalMessage(
@@ -580,21 +582,8 @@ function AdminPage() {
     setVehiclePhotos([]);
     setVehiclesForPhotos([]);
     if (userId) {
-      axios
-        .get(`http://localhost:5000/api/get-vehicles/${userId}`, {
-          withCredentials: true,
-        })
-        .then((res) => {
-          if (res.data.status === "success") {
-            setVehiclesForPhotos(res.data.vehicles);
-          } else {
-            setModalMessage(
-              `Error fetching vehicles for photos: ${
-                res.data.message || "Unknown error"
-              }`
-            );
-          }
-        })
+      fetchVehiclesForUser(userId)
+        .then((userVehicles) => setVehiclesForPhotos(userVehicles))
         .catch((err) => {
           console.error("Error fetching vehicles for photos:", err);
           setModalMessage(
@@ -1264,6 +1253,22 @@ function AdminPage() {
                       ))}
                     </tbody>
                   </table>
+                  {unpaidInvoicesCursor && (
+                    <button
+                      onClick={() =>
+                        loadMore(
+                          "get-unpaid-invoices",
+                          unpaidInvoicesCursor,
+                          "unpaid_invoices",
+                          setUnpaidInvoices,
+                          setUnpaidInvoicesCursor
+                        )
+                      }
+                      disabled={isLoadingUnpaidInvoices}
+                    >
+                      Load more invoices
+                    </button>
+                  )}
                 </div>
               </>
             )}
@@ -1636,7 +1641,8 @@ function AdminPage() {
                       rel="noopener noreferrer"
                     >
                       <img
-                        src={photo.file_url}
+                        src={photo.thumbnail_url || photo.file_url}
+                        loading="lazy"
                         alt={photo.title || "Vehicle photo"}
                       />
                     </a>
@@ -1838,6 +1844,21 @@ function AdminPage() {
                   ))}
                 </tbody>
               </table>
+              {activeJobsCursor && (
+                <button
+                  onClick={() =>
+                    loadMore(
+                      "active-jobs",
+                      activeJobsCursor,
+                      "active_jobs",
+                      setActiveJobs,
+                      setActiveJobsCursor
+                    )
+                  }
+                >
+                  Load more jobs
+                </button>
+              )}
             </div>
           ) : (
             <p style={{ textAlign: "center", margin: "20px" }}>
@@ -13,6 +13,7 @@ import { loadStripe } from "@stripe/stripe-js";
 const stripePublicKey = import.meta.env.VITE_STRIPE_PUBLISHABLE_KEY;
 import { Elements } from "@stripe/react-stripe-js";
 import CheckoutForm from "./CheckoutForm";
+import { directUpload } from "../Services/uploadService";
 import "./cssFiles/Dashboard.css";
 
 // debugging making sure key is loaded
@@ -40,6 +41,10 @@ function Dashboard() {
   const [photoPreview, setPhotoPreview] = useState("");
   const [showInvoicesModal, setShowInvoicesModal] = useState(false);
   const [invoices, setInvoices] = useState([]);
+  // next_cursor of the last page loaded for each paged list; null when it's complete
+  const [invoicesCursor, setInvoicesCursor] = useState(null);
+  const [mediaCursor, setMediaCursor] = useState(null);
+  const [notificationsCursor, setNotificationsCursor] = useState(null);
 
   const [vehiclePhotoFile, setVehiclePhotoFile] = useState(null);
   const [vehiclePhotoPreview, setVehiclePhotoPreview] = useState("");
@@ -68,15 +73,34 @@ function Dashboard() {
     vehicle_image_url: "", // Matching DB column name
   });
 
-  const fetchUserMedia = () => {
+  // Without a cursor loads the first page; with one appends the next page,
+  // merging groups for vehicles that were already on an earlier page
+  const fetchUserMedia = (cursor = null) => {
     setMessage("Loading photos...");
     axios
       .get("http://localhost:5000/api/get-user-media", {
+        params: cursor ? { cursor } : {},
         withCredentials: true,
       })
       .then((res) => {
         if (res.data.status === "success") {
-          setVehiclesMedia(res.data.vehicles_media);
+          const page = res.data.vehicles_media;
+          setVehiclesMedia((prev) => {
+            if (!cursor) return page;
+            const merged = prev.map((group) => ({ ...group }));
+            page.forEach((group) => {
+              const existing = merged.find(
+                (g) => g.vehicle_info.vehicle_id === group.vehicle_info.vehicle_id
+              );
+              if (existing) {
+                existing.media = [...existing.media, ...group.media];
+              } else {
+                merged.push(group);
+              }
+            });
+            return merged;
+          });
+          setMediaCursor(res.data.next_cursor);
           setMessage("");
         } else {
           setMessage("Failed to load photos.");
@@ -116,33 +140,64 @@ function Dashboard() {
       });
   };
 
-  // Fetch loyalty points, notifications, and vehicles on mount
+  // Fetch loyalty points, notifications, and vehicles on mount, in one request
   useEffect(() => {
     if (user) {
       axios
-        .get("http://localhost:5000/api/get-loyalty-points", {
+        .get("http://localhost:5000/api/dashboard", {
+          params: { sections: "loyalty_points,notifications,vehicles" },
           withCredentials: true,
         })
         .then((res) => {
           if (res.data.status === "success") {
-            setLoyaltyPoints(res.data.points);
+            setLoyaltyPoints(res.data.loyalty_points.points);
+            setNotifications(res.data.notifications.notifications);
+            setNotificationsCursor(res.data.notifications.next_cursor);
+            setVehicles(res.data.vehicles.vehicles);
           }
         })
-        .catch((err) => console.error("Error fetching loyalty points", err));
+        .catch((err) => console.error("Error fetching dashboard", err));
+    }
+  }, [user]);
 
-      axios
-        .get("http://localhost:5000/api/get-notifications", {
-          withCredentials: true,
-        })
-        .then((res) => {
-          if (res.data.status === "success") {
-            setNotifications(res.data.notifications);
-          }
-        })
-        .catch((err) => console.error("Error fetching notifications", err));
+  const loadMoreNotifications = () => {
+    axios
+      .get("http://localhost:5000/api/get-notifications", {
+        params: { cursor: notificationsCursor },
+        withCredentials: true,
+      })
+      .then((res) => {
+        if (res.data.status === "success") {
+          setNotifications((prev) => [
+            ...prev,
+            ...res.data.notifications.filter(
+              (n) => !prev.some((p) => p.notification_id === n.notification_id)
+            ),
+          ]);
+          setNotificationsCursor(res.data.next_cursor);
+        }
+      })
+      .catch((err) => console.error("Error fetching notifications", err));
+  };
 
-      fetchVehicles();
-    }
+  // Receive new notifications as they are created instead of polling
+  useEffect(() => {
+    if (!user) return;
+
+    const source = new EventSource(
+      "http://localhost:5000/api/notifications/stream",
+      { withCredentials: true }
+    );
+    source.addEventListener("notification", (event) => {
+      const note = JSON.parse(event.data);
+      setNotifications((prev) =>
+        prev.some((n) => n.notification_id === note.notification_id)
+          ? prev
+          : [note, ...prev]
+      );
+    });
+
+    return () => source.close();
   }, [user]);
 
   const handlePhotoFileChange = (e) => {
@@ -161,23 +216,14 @@ function Dashboard() {
       return;
     }
 
-    const formData = new FormData();
-    formData.append("file", photoFile);
-    formData.append("vehicle_id", selectedVehicleId);
-    formData.append("description", photoDescription || "");
-
     try {
       setMessage("Uploading photo...");
-      const res = await axios.post(
-        "http://localhost:5000/api/upload-media",
-        formData,
-        {
-          withCredentials: true,
-          headers: { "Content-Type": "multipart/form-data" },
-        }
-      );
+      const data = await directUpload("media", photoFile, {
+        vehicle_id: selectedVehicleId,
+        description: photoDescription || "",
+      });
 
-      if (res.data.status === "success") {
+      if (data.status === "success") {
         setMessage("Photo uploaded successfully!");
         fetchUserMedia();
         // Reset form fields
@@ -187,7 +233,7 @@ function Dashboard() {
         setSelectedVehicleId("");
         setShowAddPhotoForm(false);
       } else {
-        setMessage(res.data.message || "Failed to upload photo.");
+        setMessage(data.message || "Failed to upload photo.");
       }
     } catch (error) {
       console.error("Upload error:", error);
@@ -203,41 +249,27 @@ function Dashboard() {
     }
   };
 
-  // Upload Vehicle photo to backend (which uploads to S3 and updates DB)
+  // Upload Vehicle photo straight to S3, then have the backend update the DB
   const handleVehiclePhotoUpload = async () => {
     if (!vehiclePhotoFile) return null; // Return null if no file
 
-    const formData = new FormData();
-    formData.append("file", vehiclePhotoFile);
-
-    // If we have a vehicle ID (for existing vehicles), include it in the request
-    if (vehicleData.vehicle_id) {
-      formData.append("vehicle_id", vehicleData.vehicle_id);
-    }
-
     try {
       setMessage("Uploading photo...");
       console.log("Uploading vehicle photo...");
 
-      const response = await axios.post(
-        "http://localhost:5000/api/upload-vehicle-photo",
-        formData,
-        {
-          withCredentials: true,
-          headers: {
-            "Content-Type": "multipart/form-data",
-          },
-        }
-      );
+      // If we have a vehicle ID (for existing vehicles), include it in the confirm
+      const data = await directUpload("vehicle_photo", vehiclePhotoFile, {
+        vehicle_id: vehicleData.vehicle_id,
+      });
 
-      console.log("Upload response:", response.data);
+      console.log("Upload response:", data);
 
-      if (response.data.status === "success") {
+      if (data.status === "success") {
         setMessage("Vehicle photo uploaded successfully");
-        return response.data.vehicle_image_url; // Return the URL on success
+        return data.vehicle_image_url; // Return the URL on success
       } else {
-        setMessage(response.data.message || "Vehicle photo upload failed");
-        console.error("Upload failed:", response.data.message);
+        setMessage(data.message || "Vehicle photo upload failed");
+        console.error("Upload failed:", data.message);
         return null; // Return null on failure
       }
     } catch (error) {
@@ -258,23 +290,13 @@ function Dashboard() {
       return;
     }
 
-    const formData = new FormData();
-    formData.append("file", photoFile);
-    formData.append("vehicle_id", selectedVehicleId);
-    formData.append("description", photoDescription || "");
-
     try {
       setMessage("Uploading photo...");
-      const res = await axios.post(
-        "http://localhost:5000/api/upload-vehicle-photo",
-        formData,
-        {
-          withCredentials: true,
-          headers: { "Content-Type": "multipart/form-data" },
-        }
-      );
+      const data = await directUpload("vehicle_photo", photoFile, {
+        vehicle_id: selectedVehicleId,
+      });
 
-      if (res.data.status === "success") {
+      if (data.status === "success") {
         setMessage("Photo uploaded successfully!");
         fetchUserMedia();
         // Reset form fields
@@ -284,7 +306,7 @@ function Dashboard() {
         setSelectedVehicleId("");
         setShowAddPhotoForm(false);
       } else {
-        setMessage(res.data.message || "Failed to upload photo.");
+        setMessage(data.message || "Failed to upload photo.");
       }
     } catch (error) {
       console.error("Upload error:", error);
@@ -547,14 +569,19 @@ function Dashboard() {
     // }, 3000); // Close after 3 seconds
   };
 
-  const fetchInvoices = () => {
+  // Without a cursor loads the first page; with one appends the next page
+  const fetchInvoices = (cursor = null) => {
     axios
       .get("http://localhost:5000/api/get-user-invoices", {
+        params: cursor ? { cursor } : {},
         withCredentials: true,
       })
       .then((res) => {
         if (res.data.status === "success") {
-          setInvoices(res.data.invoices);
+          setInvoices((prev) =>
+            cursor ? [...prev, ...res.data.invoices] : res.data.invoices
+          );
+          setInvoicesCursor(res.data.next_cursor);
         } else {
           setMessage("Failed to load invoices.");
         }
@@ -870,6 +897,9 @@ function Dashboard() {
             ) : (
               <p>No notifications</p>
             )}
+            {notificationsCursor && (
+              <button onClick={loadMoreNotifications}>Load more</button>
+            )}
           </div>
         </section>
 
@@ -1367,7 +1397,8 @@ function Dashboard() {
                     }}
                   >
                     <img
-                      src={photo.file_url}
+                      src={photo.thumbnail_url || photo.file_url}
+                      loading="lazy"
                       style={{
                         width: "100%",
                         height: "100px",
@@ -1394,6 +1425,11 @@ function Dashboard() {
               </div>
             </div>
           ))}
+          {mediaCursor && (
+            <button onClick={() => fetchUserMedia(mediaCursor)}>
+              Load more photos
+            </button>
+          )}
         </Modal>
         <Modal
           isOpen={showInvoicesModal}
@@ -1660,6 +1696,14 @@ function Dashboard() {
                   {/* End invoices.map */}
                 </tbody>
               </table>
+              {invoicesCursor && (
+                <button
+                  onClick={() => fetchInvoices(invoicesCursor)}
+                  style={{ marginTop: "10px" }}
+                >
+                  Load more invoices
+                </button>
+              )}
             </div> // End table responsive wrapper
           ) : (
             // Message when no invoices exist
@@ -1,6 +1,7 @@
 //Authors: Joshua, , , , ,
 
 import axios from "axios";
+import { directUpload } from "./uploadService";
 
 // Set the base URL to your Flask backend
 const API_URL = "http://localhost:5000/api";
@@ -133,15 +134,7 @@ export const authService = {
 
   uploadProfilePhoto: async (formData) => {
     try {
-      const response = await axios.post(
-        `${API_URL}/upload-profile-photo`,
-        formData,
-        {
-          headers: { "Content-Type": "multipart/form-data" },
-          withCredentials: true,
-        }
-      );
-      return response.data;
+      return await directUpload("profile_photo", formData.get("file"));
     } catch (error) {
       console.error("Profile photo upload error:", error);
       return {
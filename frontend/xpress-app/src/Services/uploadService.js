@@ -0,0 +1,75 @@
+import axios from "axios";
+
+const API_URL = "http://localhost:5000/api";
+
+// Hex SHA-256 of the file; uploads are stored once per distinct content
+const sha256Hex = async (file) => {
+  const digest = await crypto.subtle.digest("SHA-256", await file.arrayBuffer());
+  return Array.from(new Uint8Array(digest), (b) =>
+    b.toString(16).padStart(2, "0")
+  ).join("");
+};
+
+const presign = async (kind, file, sha256) => {
+  const { data } = await axios.post(
+    `${API_URL}/uploads/presign`,
+    { kind, filename: file.name, sha256 },
+    { withCredentials: true }
+  );
+  return data;
+};
+
+const sendToStorage = async (presigned, file) => {
+  if (file.size > presigned.max_bytes) {
+    throw new Error("File is too large");
+  }
+
+  const form = new FormData();
+  Object.entries(presigned.fields).forEach(([name, value]) =>
+    form.append(name, value)
+  );
+  form.append("file", file); // S3 ignores fields after the file
+
+  // Plain fetch: the bucket must not receive our session cookie
+  const uploaded = await fetch(presigned.url, { method: "POST", body: form });
+  if (!uploaded.ok) {
+    throw new Error("Upload to storage failed");
+  }
+};
+
+// Uploads a file straight to S3 with a presigned POST from the backend, then
+// asks the backend to record it. A file the backend already has is not sent
+// again. kind is "vehicle_photo", "media" or "profile_photo"; extra is sent
+// along with the confirm request.
+export const directUpload = async (kind, file, extra = {}) => {
+  const sha256 = await sha256Hex(file);
+  let presigned = await presign(kind, file, sha256);
+  if (!presigned.exists) {
+    await sendToStorage(presigned, file);
+  }
+
+  const confirmPath = {
+    vehicle_photo: "vehicle-photo",
+    media: "media",
+    profile_photo: "profile-photo",
+  }[kind];
+  const confirm = () =>
+    axios.post(
+      `${API_URL}/uploads/${confirmPath}/confirm`,
+      { key: presigned.key, filename: file.name, ...extra },
+      { withCredentials: true }
+    );
+  try {
+    return (await confirm()).data;
+  } catch (error) {
+    // The stored copy was collected between presign and confirm; send it after all
+    if (!presigned.exists || error.response?.status !== 404) {
+      throw error;
+    }
+    presigned = await presign(kind, file, sha256);
+    if (!presigned.exists) {
+      await sendToStorage(presigned, file);
+    }
+    return (await confirm()).data;
+  }
+};